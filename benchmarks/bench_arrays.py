@@ -0,0 +1,105 @@
+# Bulk array operations against the equivalent scalar `while` loops, on
+# every engine, with and without NumPy (when it is installed).
+#   python -m benchmarks.bench_arrays [n]
+import io
+import sys
+import time
+from contextlib import redirect_stdout
+
+from src import arrays
+from src.lexer import Lexer
+from src.parser import Parser
+from src.main import ENGINES
+
+# (name, scalar loop, array version); both print the same value
+CASES = [
+    ("int a*a+1", """
+i = 0
+s = 0
+while (i < {n}) {{ s = s + i * i + 1 i = i + 1 }}
+print s
+""", """
+r = range({n})
+print sum(r * r + 1)
+"""),
+    ("float x*x", """
+i = 0
+s = 0.0
+while (i < {n}) {{ x = i * 0.5 s = s + x * x i = i + 1 }}
+print s
+""", """
+x = range({n}) * 0.5
+print sum(x * x) + 0.0
+"""),
+    ("float axpy", """
+i = 0
+s = 0.0
+while (i < {n}) {{ x = i * 0.25 s = s + (2.5 * x + x) / 2.0 i = i + 1 }}
+print s
+""", """
+x = range({n}) * 0.25
+print sum((2.5 * x + x) / 2.0) + 0.0
+"""),
+    ("count >", """
+i = 0
+c = 0
+while (i < {n}) {{ if (i * 3 > {n}) {{ c = c + 1 }} i = i + 1 }}
+print c
+""", """
+print sum(range({n}) * 3 > {n})
+"""),
+    ("min/max", """
+i = 0
+lo = 0
+hi = 0
+while (i < {n}) {{
+    v = i * 7 - i * i / {n}
+    if (i == 0) {{ lo = v hi = v }}
+    if (v < lo) {{ lo = v }}
+    if (v > hi) {{ hi = v }}
+    i = i + 1
+}}
+print lo + hi
+""", """
+r = range({n})
+v = r * 7 - r * r / {n}
+print min(v) + max(v)
+"""),
+]
+
+
+def run(engine, src):
+    ast = Parser(Lexer(src).tokenize()).parse()
+    out = io.StringIO()
+    t0 = time.perf_counter()
+    with redirect_stdout(out):
+        ENGINES[engine](ast)
+    return time.perf_counter() - t0, out.getvalue().strip()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    numpy = arrays.numpy
+    modes = [("array", numpy)] + ([("array, no numpy", None)] if numpy is not None else [])
+    engines = sorted(ENGINES)
+    print(f"n = {n}")
+    print(f"{'case':<14}{'engine':<8}{'scalar loop':>14}" + "".join(f"{m:>18}" for m, _ in modes))
+    try:
+        for label, scalar, vector in CASES:
+            for engine in engines:
+                t_loop, expected = run(engine, scalar.format(n=n))
+                cells = []
+                for _, np in modes:
+                    arrays.numpy = np
+                    t, out = run(engine, vector.format(n=n))
+                    # sums of floats are added in a different order
+                    assert abs(float(out) - float(expected)) <= 1e-9 * abs(float(expected)), \
+                        (label, engine, out, expected)
+                    cells.append(f"{t:9.4f}s {t_loop / t:5.0f}x")
+                print(f"{label:<14}{engine:<8}{t_loop:13.4f}s" + "".join(f"{c:>18}" for c in cells))
+    finally:
+        arrays.numpy = numpy
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# Per-call cost as the number of globals grows.
+#   python -m benchmarks.bench_calls
+import time
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.interpreter import Interpreter
+from src.compiler import compile_program
+from src.vm import VM
+
+CALLS = 2000
+
+SOURCE = f"""
+fff f(a, b) {{ c = a + b }}
+i = 0
+while (i < {CALLS}) {{ f(i, 1) i = i + 1 }}
+"""
+
+
+def per_call(engine, program, n_globals):
+    engine.globals.update((f"g{k}", k) for k in range(n_globals))
+    t0 = time.perf_counter()
+    engine.run(program)
+    return (time.perf_counter() - t0) / CALLS * 1e6
+
+
+def main():
+    ast = Parser(Lexer(SOURCE).tokenize()).parse()
+    code = compile_program(ast)
+    print(f"{'globals':>8} {'tree us/call':>13} {'vm (snapshot) us/call':>22}")
+    for n in (10, 100, 1000, 10000, 100000):
+        tree = per_call(Interpreter(), ast, n)
+        vm = per_call(VM(), code, n)
+        print(f"{n:>8} {tree:13.2f} {vm:22.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# Request latency through the daemon (src/server.py) against a cold
+# `python -m src.main` per run: once with the client CLI (still a Python
+# start per request) and once over the socket from a warm process.
+#   python -m benchmarks.bench_daemon [runs]
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+import statistics
+
+from src import client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SMALL = """
+fff fib(n) { if (n < 2) { return n } return fib(n - 1) + fib(n - 2) }
+print fib(12)
+"""
+
+
+def medium(n=2000):
+    # a prelude of helpers and a little work: mostly front end
+    lines = [f"fff f{i}(a, b) {{ c = a * {i} + b return c - {i % 7} }}" for i in range(n)]
+    lines.append(f"print f{n - 1}(2, 3)")
+    return "\n".join(lines) + "\n"
+
+
+def timed(fn, runs):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def cli(*args):
+    subprocess.run([sys.executable, "-m", *args], cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def wait_for(sock, proc):
+    while not os.path.exists(sock):
+        if proc.poll() is not None:
+            raise RuntimeError("the server didn't start")
+        time.sleep(0.05)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    tmp = tempfile.mkdtemp()
+    sock = os.path.join(tmp, "bench.sock")
+    server = subprocess.Popen([sys.executable, "-m", "src.server", "--socket", sock,
+                               "--workers", "2"], cwd=ROOT)
+    try:
+        wait_for(sock, server)
+        print(f"{'program':<10}{'mode':<26}{'median':>10}{'p95':>10}")
+        for label, source in (("small", SMALL), ("medium", medium())):
+            prog = os.path.join(tmp, f"{label}.dam")
+            with open(prog, "w") as f:
+                f.write(source)
+            job = {"path": prog, "engine": "tree", "optimize": False}
+            expected = subprocess.run([sys.executable, "-m", "src.main", "--no-cache", prog],
+                                      cwd=ROOT, check=True, capture_output=True, text=True).stdout
+            out = io.StringIO()
+            assert client.run(job, sock, out) == 0 and out.getvalue() == expected, label
+            modes = [
+                ("cold src.main --no-cache", lambda: cli("src.main", "--no-cache", prog)),
+                ("cold src.main, cached", lambda: cli("src.main", prog)),
+                ("src.client", lambda: cli("src.client", "--socket", sock, prog)),
+                ("socket, warm client", lambda: client.run(job, sock, io.StringIO())),
+            ]
+            for mode, fn in modes:
+                times = sorted(timed(fn, runs))
+                p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+                print(f"{label:<10}{mode:<26}{statistics.median(times) * 1000:8.1f}ms"
+                      f"{p95 * 1000:8.1f}ms")
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
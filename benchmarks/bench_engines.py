@@ -0,0 +1,73 @@
+# Tree-walker vs bytecode VM vs Python code objects on loop-heavy programs.
+#   python -m benchmarks.bench_engines
+import io
+import time
+from contextlib import redirect_stdout
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.interpreter import Interpreter
+from src.compiler import compile_program
+from src.vm import VM
+from src.pycodegen import compile_python, PyCodeRunner
+
+PROGRAMS = {
+    "count": """
+i = 0
+while (i < 200000) { i = i + 1 }
+print i
+""",
+    "arith": """
+i = 0
+s = 0
+while (i < 100000) {
+    s = s + i * 2 - i / 4
+    if (s > 1000000) { s = s - 1000000 } else { s = s + 1 }
+    i = i + 1
+}
+print s
+""",
+    "nested": """
+i = 0
+n = 0
+while (i < 300) {
+    j = 0
+    while (j < 300) {
+        if (j != i) { n = n + 1 }
+        j = j + 1
+    }
+    i = i + 1
+}
+print n
+""",
+    "calls": """
+fff bump(x) { y = x + 1 }
+i = 0
+while (i < 20000) { bump(i) i = i + 1 }
+print i
+""",
+}
+
+
+def timed(fn):
+    out = io.StringIO()
+    t0 = time.perf_counter()
+    with redirect_stdout(out):
+        fn()
+    return time.perf_counter() - t0, out.getvalue()
+
+
+def main():
+    print(f"{'program':<10} {'tree':>9} {'vm':>9} {'pycode':>9} {'vm x':>7} {'pycode x':>9}")
+    for name, src in PROGRAMS.items():
+        ast = Parser(Lexer(src).tokenize()).parse()
+        t_tree, out_tree = timed(lambda: Interpreter().run(ast))
+        t_vm, out_vm = timed(lambda: VM().run(compile_program(ast)))
+        t_py, out_py = timed(lambda: PyCodeRunner().run(compile_python(ast)))
+        assert out_tree == out_vm == out_py, (name, out_tree, out_vm, out_py)
+        print(f"{name:<10} {t_tree:9.3f} {t_vm:9.3f} {t_py:9.3f} "
+              f"{t_tree / t_vm:6.2f}x {t_tree / t_py:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
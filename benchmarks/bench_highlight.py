@@ -0,0 +1,162 @@
+# Keystroke latency of the IDE's syntax highlighting (src/highlight.py) on a
+# large file. Headless, the editor is a list of lines and a keystroke is an
+# edit plus the pass ide.py makes once Tk is idle: lex up to the view, then
+# tokens for the lines in view that changed. It is compared with scanning the
+# whole buffer again on every key. With a display, the same typing is also
+# timed in the IDE itself, Tk included.
+#   python -m benchmarks.bench_highlight [lines]
+import sys
+import time
+import statistics
+
+from src.highlight import Highlighter, scan
+from benchmarks.bench_lexer import generate
+
+VIEW = 40
+MARGIN = 50
+
+
+class Editor:
+    # what DamavandIDE does with the text, without the Tk text widget
+    def __init__(self, text):
+        self.lines = text.split("\n")
+        self.highlighter = Highlighter()
+        self.painted = {}
+        self.top = 0
+        self.tokens = 0
+
+    def lines_of(self, a, b):
+        return self.lines[a:b]
+
+    def type(self, line, col, chars):
+        text = self.lines[line]
+        new = (text[:col] + chars + text[col:]).split("\n")
+        self.lines[line:line + 1] = new
+        added = len(new) - 1
+        self.highlighter.edit(line, 0, added)
+        self.painted = {i if i < line else i + added: s for i, s in self.painted.items()
+                        if i != line}
+
+    def highlight(self):
+        first = max(0, self.top - MARGIN)
+        last = min(len(self.lines) - 1, self.top + VIEW + MARGIN)
+        self.highlighter.lex_to(last, self.lines_of)
+        states = self.highlighter.states
+        old = self.painted
+        painted = {}
+        for i in range(first, last + 1):
+            state = states[i]
+            if i not in old or old[i] != state:
+                self.tokens += len(scan(self.lines[i], state)[0])
+            painted[i] = state
+        self.painted = painted
+
+
+def rescan(lines):
+    # the whole buffer, every time
+    state = None
+    for text in lines:
+        state = scan(text, state)[1]
+
+
+def session(lines):
+    # -> [(what, [seconds per keystroke], lines lexed, keystrokes)]
+    ed = Editor("\n".join(lines))
+    ed.highlight()
+    n = len(ed.lines)
+    results = []
+
+    def plain(line):
+        # the first line from `line` on without a comment to type into
+        while "#" in ed.lines[line]:
+            line += 1
+        return line
+
+    def keys(what, line, word, top=None):
+        ed.top = max(0, line - VIEW // 2) if top is None else top
+        ed.highlight()
+        lexed = ed.highlighter.lexed
+        times = []
+        col = len(ed.lines[line])
+        for ch in word:
+            t0 = time.perf_counter()
+            ed.type(line, col, ch)
+            ed.highlight()
+            times.append(time.perf_counter() - t0)
+            if ch == "\n":
+                line += 1
+                col = 0
+            else:
+                col += 1
+        results.append((what, times, ed.highlighter.lexed - lexed, len(word)))
+
+    text = " x = x + 1  # counting\n" * 5
+    keys("typing, top of file", 5, text)
+    keys("typing, middle", n // 2, text)
+    keys("typing, end", n - 5, text)
+    line = plain(n // 2 + 100)
+    keys('opening a string: "', line, ' "')
+    keys('and closing it: "', line, '"')
+    line = plain(20)
+    keys('opening one at the top, end in view', line, ' "', top=n - VIEW)
+    keys("closing it again", line, '"', top=n - VIEW)
+    return results
+
+
+def tk_session(text, count=200):
+    # the IDE itself, if there is a display
+    import tkinter as tk
+    from ide import DamavandIDE
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"\nno display ({e}); not timing the IDE")
+        return
+    root.geometry("1000x700")
+    app = DamavandIDE(root)
+    editor = app.editor
+    editor.insert("1.0", text)
+    root.update()
+    n = int(editor.index("end-1c").split(".")[0])
+    print(f"\nthe IDE itself, {count} keystrokes, Tk included")
+    for what, line in (("top of file", 5), ("middle", n // 2), ("end", n - 5)):
+        editor.see(f"{line}.0")
+        editor.mark_set("insert", f"{line}.end")
+        root.update()
+        times = []
+        for i in range(count):
+            t0 = time.perf_counter()
+            editor.event_generate("<Key>", keysym="x" if i % 8 else "quotedbl", when="now")
+            root.update_idletasks()
+            times.append(time.perf_counter() - t0)
+        report(what, times)
+    root.destroy()
+
+
+def report(what, times, extra=""):
+    times = sorted(times)
+    p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+    print(f"  {what:<40}{statistics.median(times) * 1e6:9.0f} us{p99 * 1e6:9.0f} us"
+          f"{times[-1] * 1e6:10.0f} us{extra}")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    lines = generate(n * 0.05, seed=1).split("\n")[:n]
+    text = "\n".join(lines)
+    print(f"{len(lines)} lines, {len(text) / 1e6:.1f} MB; view {VIEW} lines, margin {MARGIN}")
+
+    t0 = time.perf_counter()
+    for _ in range(3):
+        rescan(lines)
+    full = (time.perf_counter() - t0) / 3
+    print(f"  {'rescanning everything, per keystroke':<40}{full * 1e6:9.0f} us")
+
+    print(f"  {'':<40}{'p50':>12}{'p99':>12}{'max':>13}  lines lexed per key")
+    for what, times, lexed, keys in session(lines):
+        report(what, times, f"{lexed / keys:10.1f}")
+    tk_session(text)
+
+
+if __name__ == "__main__":
+    main()
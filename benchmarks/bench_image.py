@@ -0,0 +1,105 @@
+# Time to the first statement of a job that needs a big prelude: re-running
+# the prelude every time against starting from an image saved once with
+# --save-image. In-process (the interpreter's own work) and end to end.
+#   python -m benchmarks.bench_image [functions]
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.interpreter import Interpreter
+from src.image import load_image
+from src.main import load_program
+from src.output import CaptureSink
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def prelude(n):
+    # helpers and the tables they build
+    lines = [f"fff f{i}(a, b) {{ c = a * {i % 13 + 1} + b if (c > {i}) {{ return c - {i} }} "
+             f"return c }}" for i in range(n)]
+    lines += [
+        "squares = range(2000) * range(2000)",
+        'names = ""',
+        "i = 0",
+        'while (i < 5000) { names = names + "n" i = i + 1 }',
+        "total = 0",
+        "i = 0",
+        f"while (i < {n}) {{ total = total + i * 3 i = i + 1 }}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def job(n):
+    return f'print "start"\nprint f{n - 1}(2, 3) + f0(1, 1) + total + len(names) + squares[7]\n'
+
+
+def best(fn, runs=5):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def cli(*args):
+    return subprocess.run([sys.executable, "-m", "src.main", *args], cwd=ROOT, check=True,
+                          capture_output=True, text=True).stdout
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    tmp = tempfile.mkdtemp()
+    try:
+        pre, work, both, img = (os.path.join(tmp, name) for name in
+                                ("prelude.dam", "job.dam", "both.dam", "prelude.img"))
+        with open(pre, "w") as f:
+            f.write(prelude(n))
+        with open(work, "w") as f:
+            f.write(job(n))
+        with open(both, "w") as f:
+            f.write(prelude(n) + job(n))
+        cli(pre, "--save-image", img)
+        expected = cli(both)
+        assert cli("--image", img, work) == expected
+        print(f"{n} functions, image {os.path.getsize(img) / 1e6:.1f} MB")
+
+        source = prelude(n)
+        cached = load_program(pre)
+
+        def rerun_parse():
+            Interpreter(out=CaptureSink()).run(Parser(Lexer(source).tokenize()).parse())
+
+        def rerun_cached():
+            Interpreter(out=CaptureSink()).run(load_program(pre))
+
+        def from_image():
+            load_image(Interpreter(out=CaptureSink()), img)
+
+        rows = [
+            ("prelude, parsed", best(rerun_parse)),
+            ("prelude, cached AST", best(rerun_cached)),
+            ("image", best(from_image)),
+        ]
+        print("until the job's first statement, in process")
+        for label, t in rows:
+            print(f"  {label:<24}{t * 1000:9.1f} ms  {rows[0][1] / t:6.1f}x")
+        rows = [
+            ("prelude + job", best(lambda: cli(both), 3)),
+            ("--image + job", best(lambda: cli("--image", img, work), 3)),
+        ]
+        print("python -m src.main, end to end (program cache warm)")
+        for label, t in rows:
+            print(f"  {label:<24}{t * 1000:9.1f} ms  {rows[0][1] / t:6.1f}x")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# Lexer throughput on multi-megabyte generated sources.
+#   python -m benchmarks.bench_lexer [megabytes]
+import sys
+import time
+import random
+
+from src.lexer import Lexer
+
+
+def generate(megabytes, seed=0):
+    rnd = random.Random(seed)
+    names = [f"var_{i}" for i in range(200)]
+    parts = []
+    size = 0
+    while size < megabytes * 1_000_000:
+        a, b = rnd.choice(names), rnd.choice(names)
+        chunk = (
+            f"{a} = {b} * {rnd.randint(0, 999)} + {rnd.random():.3f}  # update {a}\n"
+            f"if ({a} >= {b}) {{ print \"{a} wins\" }} else {{ {b} = {b} - 1 }}\n"
+            f"fff f_{size}({a}, {b}) {{ print '{b}\\n' }}\n"
+        )
+        parts.append(chunk)
+        size += len(chunk)
+    return "".join(parts)
+
+
+def main():
+    mb = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    src = generate(mb)
+    best = None
+    for _ in range(3):
+        t0 = time.perf_counter()
+        tokens = Lexer(src).tokenize()
+        t = time.perf_counter() - t0
+        best = t if best is None else min(best, t)
+    print(f"{len(src) / 1e6:.1f} MB, {len(tokens)} tokens: {best:.3f}s, "
+          f"{len(src) / 1e6 / best:.2f} MB/s, {len(tokens) / best / 1e6:.2f} Mtok/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Peak traced memory of the token stream and AST: object graphs vs the
+# struct-of-arrays containers in src/soa.py.
+#   python -m benchmarks.bench_memory
+import gc
+import tracemalloc
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.soa import TokenArrays, AstArrays
+
+
+def generate(statements):
+    lines = []
+    for i in range(statements):
+        if i % 4 == 0:
+            lines.append(f"x{i % 50} = x{(i + 1) % 50} * {i} + {i % 9} - y")
+        elif i % 4 == 1:
+            lines.append(f"if (x{i % 50} > {i}) {{ print \"big\" }} else {{ y = y + 1 }}")
+        elif i % 4 == 2:
+            lines.append(f"while (y < {i % 5}) {{ y = y + 1 }}")
+        else:
+            lines.append(f"fff f{i}(a, b) {{ c = a + b print c }}")
+    return "\n".join(lines) + "\n"
+
+
+def peak(build):
+    gc.collect()
+    tracemalloc.start()
+    keep = build()
+    size = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del keep
+    return size
+
+
+def main():
+    src = generate(100_000)
+    n_tokens = len(Lexer(src).tokenize())
+    tok_list = peak(lambda: Lexer(src).tokenize())
+    tok_soa = peak(lambda: TokenArrays(Lexer(src).iter_tokens()))
+    ast_obj = peak(lambda: Parser(Lexer(src).iter_tokens()).parse())
+    ast_soa = peak(lambda: AstArrays(Parser(Lexer(src).iter_tokens()).statements()))
+
+    per_m = 1e6 / n_tokens / 1e6
+    print(f"{n_tokens} tokens, 100000 statements")
+    print(f"tokens  list of Token  {tok_list * per_m:8.1f} MB per 1M tokens")
+    print(f"tokens  TokenArrays    {tok_soa * per_m:8.1f} MB per 1M tokens "
+          f"({tok_list / tok_soa:.1f}x smaller)")
+    print(f"AST     object graph   {ast_obj / 1e6:8.1f} MB per 100k statements")
+    print(f"AST     AstArrays      {ast_soa / 1e6:8.1f} MB per 100k statements "
+          f"({ast_obj / ast_soa:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# A program importing a graph of 200 helper modules against the same code
+# pasted into one file. In process: parsing everything every run, the
+# modules parsed once per process (ModuleCache), and a fresh ModuleCache
+# reading the on-disk program cache (what a new process sees). Then end to
+# end with python -m src.main. Outputs are checked against each other.
+#   python -m benchmarks.bench_modules [modules] [functions per module]
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import subprocess
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.interpreter import Interpreter
+from src.modules import ModuleCache
+from src.output import CaptureSink
+from src.main import ENGINES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def generate(n, per):
+    # -> {name: (imports, fff lines, other lines)}; module i imports up to
+    # three earlier ones and its f0 calls the first of them
+    rng = random.Random(7)
+    modules = {}
+    for i in range(n):
+        deps = sorted(rng.sample(range(i), min(i, 3)))
+        fns = []
+        for k in range(per):
+            fns.append(f"fff m{i}_f{k}(x) {{ y = x * {k + 1} + {i} "
+                       f"if (y > 1000) {{ y = y - 1000 }} return y }}")
+        if deps:
+            fns[0] = f"fff m{i}_f0(x) {{ return m{deps[0]}_f0(x) + m{i}_f1(x) }}"
+        modules[f"m{i}"] = ([f"m{j}" for j in deps], fns, [f"m{i}_base = {i} * 3"])
+    return modules
+
+
+def main_source(n):
+    tops = [f"m{i}" for i in range(n - 20, n)]
+    lines = [f'import "{m}"' for m in tops]
+    lines += [
+        "t = 0",
+        "i = 0",
+        f"while (i < 200) {{ t = t + m{n - 1}_f0(i) + m{n - 10}_f3(i) + m{n - 7}_base i = i + 1 }}",
+        "print t",
+    ]
+    return lines
+
+
+def flatten(modules, main_lines):
+    # what the program would be pasted into one file, in the order imports
+    # define things (modules.link)
+    out = []
+    done = set()
+
+    def take(lines):
+        for line in lines:
+            if line.startswith("import "):
+                name = line.split('"')[1]
+                if name not in done:
+                    imports, fns, rest = modules[name]
+                    out.extend(fns)
+                    take([f'import "{m}"' for m in imports] + rest)
+                    done.add(name)
+            else:
+                out.append(line)
+
+    take(main_lines)
+    return "\n".join(out) + "\n"
+
+
+def best(fn, runs=5):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def cli(*args):
+    return subprocess.run([sys.executable, "-m", "src.main", *args], cwd=ROOT, check=True,
+                          capture_output=True, text=True).stdout
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    per = int(sys.argv[2]) if len(sys.argv) > 2 else 25
+    tmp = tempfile.mkdtemp()
+    try:
+        modules = generate(n, per)
+        for name, (imports, fns, rest) in modules.items():
+            with open(os.path.join(tmp, f"{name}.dam"), "w") as f:
+                f.write("\n".join([f'import "{m}"' for m in imports] + fns + rest) + "\n")
+        lines = main_source(n)
+        prog = os.path.join(tmp, "main.dam")
+        with open(prog, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        flat_source = flatten(modules, lines)
+        flat = os.path.join(tmp, "flat.dam")
+        with open(flat, "w") as f:
+            f.write(flat_source)
+        main_code = "\n".join(lines) + "\n"
+
+        def run_flat():
+            out = CaptureSink()
+            Interpreter(out=out).run(Parser(Lexer(flat_source).tokenize()).parse())
+            return out
+
+        def run_modules(cache):
+            out = CaptureSink()
+            interp = Interpreter(out=out, modules=cache)
+            interp.run(Parser(Lexer(main_code).tokenize()).parse(), prog)
+            return out, interp
+
+        expected = run_flat().getvalue()
+        warm = ModuleCache(use_cache=False)
+        out, interp = run_modules(warm)
+        assert out.getvalue() == expected
+        defined = n * per
+        print(f"{n} modules, {defined} functions, {len(flat_source) / 1e6:.1f} MB pasted together; "
+              f"the run calls {len(interp.functions)} of them")
+        for engine in ("vm", "pycode"):
+            out = CaptureSink()
+            ENGINES[engine](Parser(Lexer(main_code).tokenize()).parse(), out, path=prog)
+            assert out.getvalue() == expected, engine
+        run_modules(ModuleCache())      # fills the on-disk cache
+
+        rows = [
+            ("one file, parsed", best(run_flat)),
+            ("imports, parsed", best(lambda: run_modules(ModuleCache(use_cache=False)))),
+            ("imports, disk cache", best(lambda: run_modules(ModuleCache()))),
+            ("imports, in process", best(lambda: run_modules(warm))),
+        ]
+        print("per run, in process")
+        for label, t in rows:
+            print(f"  {label:<24}{t * 1000:9.1f} ms  {rows[0][1] / t:6.1f}x")
+
+        assert cli(flat) == cli(prog) == expected
+        rows = [
+            ("one file", best(lambda: cli(flat), 3)),
+            ("imports", best(lambda: cli(prog), 3)),
+        ]
+        print("python -m src.main, end to end (program cache warm)")
+        for label, t in rows:
+            print(f"  {label:<24}{t * 1000:9.1f} ms  {rows[0][1] / t:6.1f}x")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Builtins (src/natives.py) against the same thing written as a fff, on every
+# engine, plus the tree engine's builtin calls through the generator
+# trampoline they used to take. Each case checks both versions print the same.
+#   python -m benchmarks.bench_natives [iterations]
+import sys
+import time
+
+from src import interpreter
+from src.lexer import Lexer
+from src.parser import Parser
+from src.main import ENGINES
+from src.output import CaptureSink
+
+# (name, builtin expression, fff definitions, the same expression with them)
+CASES = [
+    ("abs", "abs(i - h)",
+     "fff myabs(x) { if (x < 0) { return 0 - x } return x }",
+     "myabs(i - h)"),
+    ("max of two", "max([i, h])",
+     "fff max2(a, b) { if (a > b) { return a } return b }",
+     "max2(i, h)"),
+    ("sqrt", "floor(sqrt(i / 100))",
+     "fff isqrt(x) { r = 0 while ((r + 1) * (r + 1) <= x) { r = r + 1 } return r }",
+     "isqrt(i / 100)"),
+    ("pow", "pow(i, 3)",
+     "fff power(b, e) { r = 1 while (e > 0) { r = r * b e = e - 1 } return r }",
+     "power(i, 3)"),
+]
+
+LOOP = """{defs}
+h = {half}
+total = 0
+i = 0
+while (i < {n}) {{ total = total + {expr} i = i + 1 }}
+print total
+"""
+
+
+def parse(src):
+    return Parser(Lexer(src).tokenize()).parse()
+
+
+def run(engine, ast):
+    out = CaptureSink()
+    t0 = time.perf_counter()
+    ENGINES[engine](ast, out)
+    return time.perf_counter() - t0, out.getvalue()
+
+
+def trampolined(ast):
+    # the tree engine with every call driven through _gen_call, as before
+    # builtins had their own path
+    direct = interpreter.Interpreter._call
+    interpreter.Interpreter._call = lambda self, node: self._drive(self._gen_call(node))
+    try:
+        return run("tree", ast)
+    finally:
+        interpreter.Interpreter._call = direct
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    print(f"{'case':<12}{'engine':<14}{'builtin':>10}{'as fff':>10}{'speedup':>9}")
+    for name, expr, defs, same in CASES:
+        native = parse(LOOP.format(defs="", half=n // 2, n=n, expr=expr))
+        written = parse(LOOP.format(defs=defs, half=n // 2, n=n, expr=same))
+        t_old, expected = trampolined(native)
+        for engine in sorted(ENGINES):
+            t_native, out = run(engine, native)
+            t_written, out2 = run(engine, written)
+            assert out == out2 == expected, (name, engine, out, out2, expected)
+            print(f"{name:<12}{engine:<14}{t_native * 1000:8.1f}ms{t_written * 1000:8.1f}ms"
+                  f"{t_written / t_native:8.1f}x")
+        print(f"{name:<12}{'tree, before':<14}{t_old * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
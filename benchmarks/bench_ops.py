@@ -0,0 +1,65 @@
+# Operator dispatch micro-benchmarks: the old string-compare chain vs
+# operators resolved onto the AST vs quickened nodes.
+#   python -m benchmarks.bench_ops
+import time
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.interpreter import Interpreter, RuntimeErrorEx
+
+N = 100000
+
+PROGRAMS = {
+    "+": f"i = 0 s = 0 while (i < {N}) {{ s = s + i + 1 i = i + 1 }}",
+    "<": f"i = 0 n = 0 while (i < {N}) {{ if (i < 500) {{ n = n + 1 }} i = i + 1 }}",
+    "==": f"i = 0 n = 0 while (i < {N}) {{ if (n == 3) {{ n = 0 }} n = n + 1 i = i + 1 }}",
+}
+
+
+class StringDispatch(Interpreter):
+    # operator evaluation as it was before operators were resolved
+    def _eval_binary(self, node):
+        l = self.eval_expr(node.left)
+        r = self.eval_expr(node.right)
+        if node.op == "+":  return l + r
+        if node.op == "-":  return l - r
+        if node.op == "*":  return l * r
+        if node.op == "/":  return l / r
+        if node.op == "==": return l == r
+        if node.op == "!=": return l != r
+        if node.op == "<":  return l < r
+        if node.op == ">":  return l > r
+        if node.op == "<=": return l <= r
+        if node.op == ">=": return l >= r
+        raise RuntimeErrorEx(f"Unknown op {node.op}")
+
+    def _eval_unary(self, node):
+        v = self.eval_expr(node.expr)
+        if node.op == "-": return -v
+        if node.op == "!": return not v
+        raise RuntimeErrorEx(f"Unknown unary {node.op}")
+
+
+def best_of(make, src, repeat=3):
+    best = None
+    for _ in range(repeat):
+        ast = Parser(Lexer(src).tokenize()).parse()
+        interp = make()
+        t0 = time.perf_counter()
+        interp.run(ast)
+        t = time.perf_counter() - t0
+        best = t if best is None else min(best, t)
+    return best
+
+
+def main():
+    print(f"{'op':<4} {'strings':>9} {'resolved':>9} {'quickened':>10} {'total x':>8}")
+    for op, src in PROGRAMS.items():
+        t_str = best_of(lambda: StringDispatch(quicken=False), src)
+        t_res = best_of(lambda: Interpreter(quicken=False), src)
+        t_q = best_of(lambda: Interpreter(), src)
+        print(f"{op:<4} {t_str:9.3f} {t_res:9.3f} {t_q:10.3f} {t_str / t_q:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
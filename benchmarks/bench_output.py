@@ -0,0 +1,70 @@
+# Print throughput through each output sink, against calling print() per
+# line as the engines used to. Output goes to /dev/null, so this measures
+# the cost of getting lines out rather than the device.
+#   python -m benchmarks.bench_output [lines] [engine]
+import os
+import sys
+import time
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.main import ENGINES
+from src.output import Sink, StreamSink, LineSink, FdSink, CaptureSink
+
+PROGRAM = """
+i = 0
+while (i < {n}) {{ print i i = i + 1 }}
+"""
+
+# keeping every line in memory stops being reasonable past this
+CAPTURE_MAX = 1_000_000
+
+
+class PrintSink(Sink):
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, value):
+        print(value, file=self.stream)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def run(engine, ast, sink):
+    t0 = time.perf_counter()
+    ENGINES[engine](ast, sink)
+    sink.close()
+    return time.perf_counter() - t0
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    engine = sys.argv[2] if len(sys.argv) > 2 else "pycode"
+    ast = Parser(Lexer(PROGRAM.format(n=n)).tokenize()).parse()
+    text = open(os.devnull, "w")
+    fd = os.open(os.devnull, os.O_WRONLY)
+    sinks = [
+        ("print()", lambda: PrintSink(text)),
+        ("stream", lambda: StreamSink(text)),
+        ("lines 1024", lambda: LineSink(text)),
+        ("lines 0.1s", lambda: LineSink(text, lines=1 << 30, seconds=0.1)),
+        ("fd 1 MiB", lambda: FdSink(fd)),
+    ]
+    if n <= CAPTURE_MAX:
+        sinks.append(("capture", CaptureSink))
+    print(f"{n} lines, {engine} engine")
+    print(f"{'sink':<12}{'time':>10}{'lines/s':>14}{'vs print()':>12}")
+    try:
+        base = None
+        for label, make in sinks:
+            t = run(engine, ast, make())
+            base = base or t
+            print(f"{label:<12}{t:9.3f}s{n / t:14,.0f}{base / t:11.2f}x")
+    finally:
+        text.close()
+        os.close(fd)
+
+
+if __name__ == "__main__":
+    main()
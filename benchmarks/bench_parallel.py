@@ -0,0 +1,78 @@
+# Parallel front end: lex + parse time from 1 to N worker processes, and a
+# check that every split gives exactly the serial AST. The awkward cases are
+# in benchmarks/check_parallel.py, which is quick.
+#   python -m benchmarks.bench_parallel [megabytes] [max_workers]
+import os
+import sys
+import time
+import random
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.parallel import parse_parallel, split_source
+
+
+def generate(megabytes, seed=0):
+    # multi-line functions, nested blocks, comments and strings spanning
+    # lines, so the splitter has something to get wrong
+    rnd = random.Random(seed)
+    names = [f"v{i}" for i in range(100)]
+    parts = []
+    size = 0
+    n = 0
+    while size < megabytes * 1_000_000:
+        a, b = rnd.choice(names), rnd.choice(names)
+        n += 1
+        chunk = (
+            f"# block {n}\n"
+            f"fff f{n}({a}, {b}) {{\n"
+            f"  while ({a} < {b}) {{\n"
+            f"    {a} = {a} + {rnd.randint(1, 9)} *\n"
+            f"      ({b} - 1)\n"
+            f"  }}\n"
+            f"  print \"done\n{a}\"\n"
+            f"}}\n"
+            f"{a} = {b} + {rnd.random():.3f}\n"
+            f"if ({a} != {b}) {{ f{n}({a}, {b}) }}\n"
+            f"else {{ print '}} {{ (' }}\n"
+        )
+        parts.append(chunk)
+        size += len(chunk)
+    return "".join(parts)
+
+
+def dump(node):
+    if isinstance(node, list):
+        return [dump(n) for n in node]
+    if hasattr(node, "__slots__"):
+        return (type(node).__name__,) + tuple(
+            dump(getattr(node, s)) for s in node.__slots__)
+    return node
+
+
+def main():
+    mb = float(sys.argv[1]) if len(sys.argv) > 1 else 8
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    src = generate(mb)
+
+    t0 = time.perf_counter()
+    expected = Parser(Lexer(src).tokenize()).parse()
+    serial = time.perf_counter() - t0
+    expected = dump(expected)
+    print(f"{len(src) / 1e6:.1f} MB, {os.cpu_count()} CPUs")
+    print(f"  serial     {serial:7.3f}s")
+
+    for workers in range(1, max(max_workers, 2) + 1):
+        chunks = len(split_source(src, workers))
+        t0 = time.perf_counter()
+        ast = parse_parallel(src, workers, min_size=0)
+        t = time.perf_counter() - t0
+        same = dump(ast) == expected
+        print(f"  {workers:2d} workers {t:7.3f}s  x{serial / t:4.2f}  "
+              f"{chunks} chunks  {'same AST' if same else 'AST DIFFERS'}")
+        if not same:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Deep recursion and call-heavy code on every engine. Damavand calls don't
+# use the Python stack in the tree and vm engines, so depth is only bounded
+# by memory.
+#   python -m benchmarks.bench_recursion [max_depth]
+import io
+import sys
+import time
+from contextlib import redirect_stdout
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.main import ENGINES
+from src.interpreter import RuntimeErrorEx
+
+DEPTH = """
+fff depth(n) {{
+    if (n == 0) {{ return 0 }}
+    return 1 + depth(n - 1)
+}}
+print depth({n})
+"""
+
+# a linked walk over a complete binary tree of the given height
+TREE_WALK = """
+fff walk(h, id) {{
+    if (h == 0) {{ return 1 }}
+    return 1 + walk(h - 1, id * 2) + walk(h - 1, id * 2 + 1)
+}}
+print walk({n}, 1)
+"""
+
+FIB = """
+fff fib(n) {{
+    if (n < 2) {{ return n }}
+    return fib(n - 1) + fib(n - 2)
+}}
+print fib({n})
+"""
+
+LEAF_CALLS = """
+fff add(a, b) {{ return a + b }}
+i = 0
+s = 0
+while (i < {n}) {{ s = add(s, i) i = i + 1 }}
+print s
+"""
+
+
+def run(engine, template, n):
+    ast = Parser(Lexer(template.format(n=n)).tokenize()).parse()
+    out = io.StringIO()
+    t0 = time.perf_counter()
+    try:
+        with redirect_stdout(out):
+            ENGINES[engine](ast)
+    except (RuntimeErrorEx, RecursionError) as e:
+        return None, type(e).__name__
+    return time.perf_counter() - t0, out.getvalue().strip()
+
+
+def main():
+    max_depth = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    cases = [("depth", DEPTH, d) for d in sorted({10_000, 50_000, max_depth}) if d <= max_depth]
+    cases += [("tree walk", TREE_WALK, 14), ("fib", FIB, 20), ("leaf calls", LEAF_CALLS, 50_000)]
+    engines = sorted(ENGINES)
+    print(f"{'case':<20}" + "".join(f"{e:>16}" for e in engines))
+    for label, template, n in cases:
+        cells = []
+        results = set()
+        for engine in engines:
+            t, out = run(engine, template, n)
+            if t is None:
+                cells.append(f"{out:>16}")
+            else:
+                results.add(out)
+                cells.append(f"{t:15.3f}s")
+        # every engine that finished must agree
+        assert len(results) <= 1, results
+        print(f"{label + ' ' + str(n):<20}" + "".join(cells))
+
+
+if __name__ == "__main__":
+    main()
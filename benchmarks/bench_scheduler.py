@@ -0,0 +1,128 @@
+# Thousands of small programs in one process (src/scheduler.py).
+# Throughput: one after the other with Interpreter.run against taking turns
+# in the Scheduler at a few quanta. Fairness: how long the small programs take
+# to finish with endless loops among them, and how evenly time is shared
+# between programs that all run to their step budget.
+#   python -m benchmarks.bench_scheduler [programs] [hogs]
+import gc
+import sys
+import time
+import statistics
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.interpreter import Interpreter
+from src.output import CaptureSink
+from src.scheduler import Scheduler
+
+KINDS = [
+    """
+t = 0
+i = 0
+while (i < {k}) {{ t = t + i * i i = i + 1 }}
+print t
+""",
+    """
+fff fib(n) {{ if (n < 2) {{ return n }} return fib(n - 1) + fib(n - 2) }}
+print fib({f})
+""",
+    """
+s = ""
+i = 0
+while (i < {r}) {{ s = s + "ab" i = i + 1 }}
+print len(s)
+""",
+]
+
+HOG = """
+x = 0
+while (1) { x = x + 1 }
+"""
+
+
+def source(i):
+    k = 50 + i % 200
+    return KINDS[i % len(KINDS)].format(k=k, f=k % 3 + 8, r=k % 20 + 5)
+
+
+def parse(src):
+    return Parser(Lexer(src).tokenize()).parse()
+
+
+def sequential(sources):
+    outs = []
+    gc.collect()
+    t0 = time.perf_counter()
+    for src in sources:
+        out = CaptureSink()
+        Interpreter(out=out).run(parse(src))
+        outs.append(out.getvalue())
+    return time.perf_counter() - t0, outs
+
+
+def scheduled(sources, quantum, max_steps=None):
+    # -> elapsed, outputs, and when each program finished (None for the
+    # ones stopped)
+    gc.collect()
+    t0 = time.perf_counter()
+    scheduler = Scheduler(quantum, max_steps)
+    tasks = [scheduler.add(parse(src), i) for i, src in enumerate(sources)]
+    finished = [None] * len(tasks)
+    for task in scheduler.run():
+        if task.error is None:
+            finished[task.name] = time.perf_counter() - t0
+    elapsed = time.perf_counter() - t0
+    return elapsed, [t.out.getvalue() for t in tasks], finished, tasks
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def jain(values):
+    # 1.0 when every value is the same, 1/n when one gets everything
+    return sum(values) ** 2 / (len(values) * sum(v * v for v in values))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    hogs = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    sources = [source(i) for i in range(n)]
+
+    print(f"throughput, {n} programs (parsing included)")
+    base, expected = sequential(sources)
+    print(f"  {'Interpreter.run each':<28}{base:8.2f} s{n / base:10.0f} programs/s")
+    for quantum in (10_000, 1000, 100):
+        t, outs, _, _ = scheduled(sources, quantum)
+        assert outs == expected, quantum
+        print(f"  {f'Scheduler, quantum {quantum}':<28}{t:8.2f} s{n / t:10.0f} programs/s"
+              f"{t / base:8.2f}x the time")
+
+    print(f"\nfairness: the {n} programs with {hogs} endless loops among them, "
+          f"quantum 1000, --max-steps 200000")
+    mixed = list(sources)
+    for j in range(hogs):
+        mixed.insert(j * n // max(hogs, 1), HOG)
+    rows = []
+    for label, srcs in (("no loops", sources), (f"{hogs} endless loops", mixed)):
+        t, outs, finished, tasks = scheduled(srcs, 1000, 200_000)
+        done = [f for f in finished if f is not None]
+        stopped = sum(1 for task in tasks if task.error is not None)
+        assert [o for o, s in zip(outs, srcs) if s is not HOG] == expected, label
+        rows.append((label, t, done, stopped))
+    print(f"  {'':<20}{'total':>9}{'p50 done':>10}{'p99 done':>10}{'last done':>11}{'stopped':>9}")
+    for label, t, done, stopped in rows:
+        print(f"  {label:<20}{t:8.2f}s{statistics.median(done):9.2f}s"
+              f"{percentile(done, 0.99):9.2f}s{max(done):10.2f}s{stopped:>9}")
+
+    m = min(n, 2000)
+    print(f"\nsharing: {m} endless loops, each stopped at 100 turns of 1000 steps")
+    t, _, _, tasks = scheduled([HOG] * m, 1000, 100_000)
+    seconds = [task.seconds for task in tasks]
+    print(f"  {t:.2f} s in all; per program {min(seconds) * 1000:.1f} to {max(seconds) * 1000:.1f} ms "
+          f"of run time, Jain's fairness index {jain(seconds):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Startup time of `python -m src.main` on a large script: no cache, cold
+# cache (parse + store) and warm cache (load only).
+#   python -m benchmarks.bench_startup [statements]
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def generate(n):
+    lines = ["fff step(a, b) { c = a * b + 1 }"]
+    for i in range(n):
+        lines.append(f"x{i % 100} = {i} * 2 + {i % 7} - 3")
+        if i % 10 == 0:
+            lines.append(f"if (x{i % 100} > {i}) {{ step(x{i % 100}, {i}) }} else {{ y = 1 }}")
+    lines.append('print "done"')
+    return "\n".join(lines) + "\n"
+
+
+def run(args):
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "src.main", *args], cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - t0
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    tmp = tempfile.mkdtemp()
+    try:
+        prog = os.path.join(tmp, "big.dam")
+        with open(prog, "w") as f:
+            f.write(generate(n))
+        cache = os.path.join(tmp, "cache")
+        no_cache = min(run(["--no-cache", prog]) for _ in range(3))
+        cold = []
+        for _ in range(3):
+            shutil.rmtree(cache, ignore_errors=True)
+            cold.append(run(["--cache-dir", cache, prog]))
+        warm = min(run(["--cache-dir", cache, prog]) for _ in range(3))
+        print(f"{os.path.getsize(prog) / 1e6:.1f} MB source, {n} statements")
+        print(f"no cache   {no_cache:7.3f}s")
+        print(f"cold cache {min(cold):7.3f}s")
+        print(f"warm cache {warm:7.3f}s  ({no_cache / warm:.2f}x)")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Strings grown piece by piece in a loop, with ropes (the default) and with
+# every + copying the string, in the tree engine. Per-piece time stays flat
+# with ropes; copying grows with the length.
+#   python -m benchmarks.bench_strings [max_pieces] [max_copying]
+import io
+import sys
+import time
+from contextlib import redirect_stdout
+
+from src import rope
+from src.lexer import Lexer
+from src.parser import Parser
+from src.main import ENGINES
+
+# each prints something that looks at the whole string
+CASES = [
+    ("append", """
+s = ""
+i = 0
+while (i < {n}) {{ s = s + "ab" i = i + 1 }}
+print len(s)
+print s[{n}] + s[len(s) - 1]
+"""),
+    ("append 3", """
+s = ""
+i = 0
+while (i < {n}) {{ s = s + "<" + "a" + ">" i = i + 1 }}
+print len(s)
+print s == s + ""
+"""),
+    ("wrap", """
+t = "x"
+i = 0
+while (i < {n}) {{ t = "(" + t + ")" i = i + 1 }}
+print len(t)
+print t[0] + t[{n}] + t[len(t) - 1]
+"""),
+]
+
+
+def run(src):
+    ast = Parser(Lexer(src).tokenize()).parse()
+    out = io.StringIO()
+    t0 = time.perf_counter()
+    with redirect_stdout(out):
+        ENGINES["tree"](ast)
+    return time.perf_counter() - t0, out.getvalue()
+
+
+def main():
+    max_pieces = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    max_copying = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    sizes = []
+    n = 10_000
+    while n <= max_pieces:
+        sizes.append(n)
+        n *= 10
+    print(f"{'case':<10}{'pieces':>10}{'rope':>12}{'per piece':>12}{'copying':>12}{'per piece':>12}")
+    rope_min = rope.ROPE_MIN
+    try:
+        for label, template in CASES:
+            for n in sizes:
+                src = template.format(n=n)
+                rope.ROPE_MIN = rope_min
+                t, expected = run(src)
+                cells = f"{t:11.3f}s{t / n * 1e6:10.2f}us"
+                if n <= max_copying:
+                    # no string ever gets long enough for a rope
+                    rope.ROPE_MIN = float("inf")
+                    t_copy, out = run(src)
+                    assert out == expected, (label, n)
+                    cells += f"{t_copy:11.3f}s{t_copy / n * 1e6:10.2f}us"
+                print(f"{label:<10}{n:>10}{cells}")
+    finally:
+        rope.ROPE_MIN = rope_min
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# Quick check of where the parallel front end (src/parallel.py) cuts a source:
+# small programs with brackets, strings and comments at line ends, strings
+# spanning lines and pragmas, each with the lines a piece may start on. Every
+# way split_source() divides them must give exactly the serial AST, line
+# numbers included; it takes well under a second, pool included.
+#   python -m benchmarks.check_parallel
+import sys
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.parallel import parse_parallel, split_source, _parse_chunk
+from benchmarks.bench_parallel import dump
+
+# (what, source, the lines pieces start on when cut as finely as possible)
+CASES = [
+    ("plain statements",
+     "x = 1\n"
+     "y = x + 2\n"
+     "print y\n",
+     [1, 2, 3]),
+    ("blocks",
+     "fff f(a) {\n"
+     "  b = a\n"
+     "  while (b < 3) {\n"
+     "    b = b + 1\n"
+     "    print b\n"
+     "  }\n"
+     "  return b\n"
+     "}\n"
+     "print f(1)\n",
+     [1, 9]),
+    ("block on the next line",
+     "if (x)\n"
+     "{ print 1 }\n"
+     "fff g(a)\n"
+     "{ return a }\n"
+     "print 2\n",
+     [1, 3, 5]),
+    ("else on the next line",
+     "if (x) { print 1 }\n"
+     "else { print 2 }\n"
+     "print 3\n",
+     [1, 3]),
+    ("brackets and # in strings",
+     "print \"{ # not a comment\"\n"
+     "x = 1\n"
+     "print '(['\n"
+     "y = \"a\\\"}\"\n"
+     "print y\n",
+     [1, 2, 3, 4, 5]),
+    ("brackets and quotes in comments",
+     "x = 1 # { it's\n"
+     "y = 2\n"
+     "# } \"\n"
+     "print y\n",
+     [1, 2]),
+    ("strings spanning lines",
+     "print \"one\n"
+     "x = 1\n"
+     "two\"\n"
+     "y = 2\n"
+     "s = 'a\\'\n"
+     "b'\n"
+     "print s\n",
+     [1, 5]),
+    ("expressions spanning lines",
+     "x = 1 +\n"
+     "2\n"
+     "y = (1\n"
+     "+ 2)\n"
+     "z = [1,\n"
+     "2]\n"
+     "print z\n",
+     [1, 3, 5, 7]),
+    ("pragmas",
+     "x = 1\n"
+     "#pragma pure\n"
+     "fff f(a) { return a }\n"
+     "#pragma once\n"
+     "print f(x)\n",
+     [1]),
+]
+
+
+def check(src, starts):
+    # -> a list of what went wrong
+    problems = []
+    expected = dump(Parser(Lexer(src).tokenize()).parse())
+    finest = split_source(src, len(src))
+    if [line for _, line in finest] != starts:
+        problems.append(f"pieces start on lines {[line for _, line in finest]}, "
+                        f"not {starts}")
+    for parts in range(2, len(starts) + 2):
+        chunks = split_source(src, parts)
+        if "".join(text for text, _ in chunks) != src:
+            problems.append(f"{parts} parts: the pieces don't add up to the source")
+            continue
+        statements = []
+        for chunk in chunks:
+            stmts, lex_error, parse_errors = _parse_chunk(chunk)
+            if stmts is None:
+                problems.append(f"{parts} parts: piece at line {chunk[1]}: "
+                                f"{lex_error or parse_errors}")
+                break
+            statements.extend(stmts)
+        else:
+            if dump(statements) != expected[1]:
+                problems.append(f"{parts} parts: the AST differs")
+    return problems
+
+
+def main():
+    failed = 0
+    for what, src, starts in CASES:
+        problems = check(src, starts)
+        print(f"  {what:<36}{'ok' if not problems else 'FAILED'}")
+        for p in problems:
+            print(f"      {p}")
+        failed += bool(problems)
+
+    # all of them at once, through the process pool
+    src = "".join(src for _, src, _ in CASES)
+    same = dump(parse_parallel(src, 4, min_size=0)) == dump(Parser(Lexer(src).tokenize()).parse())
+    print(f"  {'all together, 4 workers':<36}{'ok' if same else 'FAILED'}")
+    failed += not same
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# Benchmark suite: times Lexer.tokenize, Parser.parse and running the program
+# separately for a set of representative workloads, with peak memory, and
+# writes the results as JSON. Two result files can then be compared.
+#   python -m benchmarks.suite [-o results.json] [--engine tree] [--repeat 3]
+#                              [--only NAME ...]
+#   python -m benchmarks.suite --compare base.json new.json [--threshold 10]
+import gc
+import io
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+from contextlib import redirect_stdout
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.main import ENGINES
+
+
+def counting_loop():
+    return """
+i = 0
+while (i < 300000) { i = i + 1 }
+print i
+"""
+
+
+def nested_loops():
+    return """
+i = 0
+n = 0
+while (i < 400) {
+    j = 0
+    while (j < 400) { n = n + 1 j = j + 1 }
+    i = i + 1
+}
+print n
+"""
+
+
+def if_chains():
+    # a ten-deep else-if ladder, evaluated on every iteration
+    ladder = "k = 10"
+    for v in range(9, -1, -1):
+        ladder = f"if (m == {v}) {{ k = {v} }} else {{ {ladder} }}"
+    return f"""
+i = 0
+m = 0
+s = 0
+while (i < 30000) {{
+    {ladder}
+    s = s + k
+    m = m + 1
+    if (m == 11) {{ m = 0 }}
+    i = i + 1
+}}
+print s
+"""
+
+
+def calls():
+    return """
+fff add(a, b) { c = a + b }
+fff twice(x) { add(x, x) add(x, 1) }
+i = 0
+while (i < 30000) { twice(i) i = i + 1 }
+print i
+"""
+
+
+def strings():
+    return """
+s = ""
+i = 0
+while (i < 20000) { s = s + "ab" i = i + 1 }
+t = ""
+j = 0
+while (j < 20000) { t = "x" + t + "y" j = j + 1 }
+print s == t
+"""
+
+
+def large_source(statements=60000):
+    # mostly parsed, little executed: definitions and cold branches
+    lines = [f"x{i} = {i}" for i in range(50)] + ["y = 0"]
+    for i in range(statements):
+        r = i % 4
+        if r == 0:
+            lines.append(f"x{i % 50} = x{(i + 1) % 50} * {i} + {i % 9} - 1.5  # step {i}")
+        elif r == 1:
+            lines.append(f"if (x{i % 50} > {i}) {{ print \"big {i}\" }} else {{ y = {i} }}")
+        elif r == 2:
+            lines.append(f"while (false) {{ y = y + {i} }}")
+        else:
+            lines.append(f"fff f{i}(a, b) {{ c = a + b print c * {i} }}")
+    return "\n".join(lines) + "\n"
+
+
+WORKLOADS = {
+    "counting_loop": counting_loop,
+    "nested_loops": nested_loops,
+    "if_chains": if_chains,
+    "calls": calls,
+    "strings": strings,
+    "large_source": large_source,
+}
+
+
+# --------------- measuring ---------------
+def timed(fn, repeat, setup=lambda: None):
+    best = None
+    result = None
+    for _ in range(repeat):
+        arg = setup()
+        gc.collect()
+        t0 = time.perf_counter()
+        result = fn(arg)
+        t = time.perf_counter() - t0
+        best = t if best is None else min(best, t)
+    return best, result
+
+
+def peak_memory(fn, setup=lambda: None):
+    arg = setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn(arg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(src, engine, repeat):
+    run_engine = ENGINES[engine]
+    lex = lambda _: Lexer(src).tokenize()
+    t_lex, tokens = timed(lex, repeat)
+    parse = lambda _: Parser(tokens).parse()
+    t_parse, _ = timed(parse, repeat)
+
+    # the engines annotate the tree they run, so each run gets a fresh one
+    def run(ast):
+        with redirect_stdout(io.StringIO()):
+            run_engine(ast)
+    fresh = lambda: Parser(tokens).parse()
+    t_run, _ = timed(run, repeat, fresh)
+    return {
+        "lex": {"seconds": t_lex, "peak_bytes": peak_memory(lex)},
+        "parse": {"seconds": t_parse, "peak_bytes": peak_memory(parse)},
+        "run": {"seconds": t_run, "peak_bytes": peak_memory(run, fresh)},
+        "source_bytes": len(src),
+        "tokens": len(tokens),
+    }
+
+
+def run_suite(names, engine, repeat):
+    results = {}
+    for name in names:
+        src = WORKLOADS[name]()
+        results[name] = r = measure(src, engine, repeat)
+        print(f"{name:<14} lex {r['lex']['seconds']:8.4f}s {r['lex']['peak_bytes'] / 1e6:7.1f} MB  "
+              f"parse {r['parse']['seconds']:8.4f}s {r['parse']['peak_bytes'] / 1e6:7.1f} MB  "
+              f"run {r['run']['seconds']:8.4f}s {r['run']['peak_bytes'] / 1e6:7.1f} MB",
+              file=sys.stderr)
+    return {
+        "meta": {
+            "engine": engine,
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "workloads": results,
+    }
+
+
+# --------------- comparing ---------------
+# below these, differences are timer and allocator noise, not regressions
+NOISE_FLOOR = {"seconds": 0.005, "peak_bytes": 64 * 1024}
+
+
+def compare(base, new, threshold):
+    # returns the regressions: metrics more than `threshold` percent worse
+    regressions = []
+    print(f"{'workload':<14} {'phase':<6} {'metric':<10} {'base':>12} {'new':>12} {'change':>8}")
+    for name, b in base["workloads"].items():
+        n = new["workloads"].get(name)
+        if n is None:
+            continue
+        for phase in ("lex", "parse", "run"):
+            for metric in ("seconds", "peak_bytes"):
+                old, cur = b[phase][metric], n[phase][metric]
+                if old <= 0:
+                    continue
+                change = (cur - old) / old * 100
+                flag = ""
+                if change > threshold and max(old, cur) >= NOISE_FLOOR[metric]:
+                    flag = "  REGRESSION"
+                    regressions.append((name, phase, metric, change))
+                fmt = "12.4f" if metric == "seconds" else "12d"
+                print(f"{name:<14} {phase:<6} {metric:<10} {old:{fmt}} {cur:{fmt}} "
+                      f"{change:+7.1f}%{flag}")
+    return regressions
+
+
+def main(argv):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.suite")
+    ap.add_argument("-o", "--output", metavar="FILE", help="write results as JSON")
+    ap.add_argument("--engine", choices=sorted(ENGINES), default="tree")
+    ap.add_argument("--repeat", type=int, default=3, help="best of N runs (default: 3)")
+    ap.add_argument("--only", nargs="+", choices=sorted(WORKLOADS), metavar="NAME",
+                    help="run only these workloads")
+    ap.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"),
+                    help="compare two result files instead of running")
+    ap.add_argument("--threshold", type=float, default=10.0,
+                    help="percent slowdown or growth counted as a regression (default: 10)")
+    args = ap.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            new = json.load(f)
+        regressions = compare(base, new, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:g}%")
+            return 1
+        return 0
+
+    results = run_suite(args.only or list(WORKLOADS), args.engine, args.repeat)
+    out = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
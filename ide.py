@@ -1,11 +1,11 @@
-import io
-import sys
 import tkinter as tk
 from tkinter import filedialog, messagebox
 
 from src.lexer import Lexer
 from src.parser import Parser, ParserError
 from src.interpreter import Interpreter, RuntimeErrorEx
+from src.output import CaptureSink
+from src.highlight import Highlighter, TAGS, scan
 
 # ---- VS Code Dark+ colors ----
 COL_BG        = "#1e1e1e"
@@ -27,7 +27,8 @@ COL_COMMENT   = "#6a9955"
 COL_OPERATOR  = "#dcdcaa"
 COL_PAREN     = "#9cdcfe"
 
-KEYWORDS = ["fff", "if", "else", "while", "print", "true", "false"]
+# lines above and below the view kept highlighted, for scrolling a bit
+MARGIN = 50
 
 class DamavandIDE:
     def __init__(self, root):
@@ -79,6 +80,17 @@ class DamavandIDE:
                               highlightthickness=0, yscrollcommand=self._on_editor_scroll)
         self.editor.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
+        # every change to the text goes through _proxy(), which tells the
+        # highlighter which lines it touched
+        self.highlighter = Highlighter()
+        # line (0-based) -> the state it was last painted in, for the lines
+        # around the view
+        self.painted = {}
+        self._pending = None
+        self._orig = self.editor._w + "_orig"
+        self.editor.tk.call("rename", self.editor._w, self._orig)
+        self.editor.tk.createcommand(self.editor._w, self._proxy)
+
         self.scrollbar.config(command=self._on_scrollbar)
 
         sep = tk.Frame(root, height=1, bg=COL_BORDER, bd=0, highlightthickness=0)
@@ -110,6 +122,7 @@ class DamavandIDE:
         root.bind_all("<Control-n>", lambda e: self.new_file())
         root.bind_all("<F5>",       lambda e: self.run_code())
 
+        self._gutter_lines = 0
         self._update_gutter()
         self.highlight()
         self._update_status()
@@ -130,6 +143,7 @@ class DamavandIDE:
     def _on_editor_scroll(self, *args):
         self.scrollbar.set(*args)
         self.gutter.yview_moveto(args[0])
+        self._schedule()
 
     def _on_scrollbar(self, *args):
         self.editor.yview(*args)
@@ -137,11 +151,19 @@ class DamavandIDE:
 
     # --- gutter ---
     def _update_gutter(self):
+        # only the numbers of lines added or removed
+        last_line = self._last_line()
+        shown = self._gutter_lines
+        if last_line == shown:
+            return
         self.gutter.config(state="normal")
-        self.gutter.delete("1.0", "end")
-        last_line = int(self.editor.index("end-1c").split(".")[0])
-        self.gutter.insert("1.0", "\n".join(str(i) for i in range(1, last_line + 1)))
+        if last_line > shown:
+            numbers = "\n".join(str(i) for i in range(shown + 1, last_line + 1))
+            self.gutter.insert("end-1c", "\n" + numbers if shown else numbers)
+        else:
+            self.gutter.delete(f"{last_line}.end", "end-1c")
         self.gutter.config(state="disabled")
+        self._gutter_lines = last_line
 
     def _on_modified(self, _=None):
         self.editor.tk.call(self.editor._w, 'edit', 'modified', 0)
@@ -149,7 +171,6 @@ class DamavandIDE:
         self._update_status()
 
     def _on_change(self, _=None):
-        self.highlight()
         self._update_gutter()
         self._update_status()
 
@@ -160,135 +181,81 @@ class DamavandIDE:
         name = self.filename if self.filename else "Untitled"
         self.statusbar.config(text=f"{name}   Ln {line}, Col {int(col)+1}")
 
-    # ---------- robust highlighter (comments override everything) ----------
-    def clear_tags(self):
-        for tag in ["kw", "num", "str", "com", "op", "par"]:
-            self.editor.tag_remove(tag, "1.0", "end")
+    # ---------- highlighter (src/highlight.py) ----------
+    def _proxy(self, cmd, *args):
+        # the editor's Tcl command: insert, delete and replace also report the
+        # lines they changed, as "lines first..first + removed are now
+        # first..first + added" (0-based)
+        call = self.editor.tk.call
+        if cmd == "insert":
+            marks = args[:1]
+        elif cmd == "delete":
+            marks = args
+        elif cmd == "replace":
+            marks = args[:2]
+        else:
+            return call(self._orig, cmd, *args)
+        before = self._last_line()
+        lines = [min(int(call(self._orig, "index", m).split(".")[0]), before) for m in marks]
+        result = call(self._orig, cmd, *args)
+        first = min(lines) - 1
+        removed = max(lines) - 1 - first
+        self._edited(first, removed, removed + self._last_line() - before)
+        return result
+
+    def _edited(self, first, removed, added):
+        self.highlighter.edit(first, removed, added)
+        # the lines changed are painted again, the ones after moved
+        delta = added - removed
+        self.painted = {i if i < first else i + delta: state
+                        for i, state in self.painted.items()
+                        if not first <= i <= first + removed}
+        self._schedule()
+
+    def _schedule(self):
+        # one highlight() once Tk is idle, however many edits come before
+        if self._pending is None:
+            self._pending = self.editor.after_idle(self.highlight)
+
+    def _last_line(self):
+        return int(self.editor.tk.call(self._orig, "index", "end-1c").split(".")[0])
+
+    def _lines(self, a, b):
+        # the text of lines a..b - 1 (0-based)
+        if b <= a:
+            return []
+        return self.editor.get(f"{a + 1}.0", f"{b}.end").split("\n")
 
     def highlight(self):
-        content = self.editor.get("1.0", "end-1c")
-        self.clear_tags()
-
-        # 1) Compute string spans (both ' and ", honoring escapes)
-        string_spans = self._find_string_spans(content)
-
-        # 2) Compute comment spans (# ... end-of-line), but ONLY outside strings
-        comment_spans = self._find_comment_spans(content, string_spans)
-
-        # Paint comments first and keep them above others
-        for s, e in comment_spans:
-            self._tag_abs_range("com", s, e)
-
-        # 3) Paint strings
-        for s, e in string_spans:
-            self._tag_abs_range("str", s, e)
-
-        # 4) Other categories, excluding string+comment spans
-        protected = self._merge_spans(string_spans + comment_spans)
-
-        import re
-        # keywords
-        kw_pattern = r"\b(" + "|".join(map(re.escape, KEYWORDS)) + r")\b"
-        for m in re.finditer(kw_pattern, content):
-            self._tag_abs_range_excluding("kw", m.start(), m.end(), protected)
-
-        # numbers (ints & floats)
-        for m in re.finditer(r"\b\d+(\.\d+)?\b", content):
-            self._tag_abs_range_excluding("num", m.start(), m.end(), protected)
-
-        # operators (including '=' and '!' forms)
-        for m in re.finditer(r"==|!=|<=|>=|[=+\-*/%<>!]", content):
-            self._tag_abs_range_excluding("op", m.start(), m.end(), protected)
-
-        # parens/braces/brackets
-        for m in re.finditer(r"[\(\)\{\}\[\]]", content):
-            self._tag_abs_range_excluding("par", m.start(), m.end(), protected)
-
-        # make sure comments always on top visually
-        self.editor.tag_raise("com")
-
-    # ---- span helpers ----
-    def _find_string_spans(self, text):
-        spans = []
-        i, n = 0, len(text)
-        in_str = False
-        quote = None
-        start = 0
-        while i < n:
-            c = text[i]
-            if not in_str:
-                if c in ("'", '"'):
-                    in_str = True
-                    quote = c
-                    start = i
-                i += 1
-            else:
-                if c == "\\":
-                    i += 2  # skip escaped char
-                    continue
-                if c == quote:
-                    spans.append((start, i + 1))  # include closing quote
-                    in_str = False
-                    quote = None
-                    i += 1
-                else:
-                    i += 1
-        # unclosed string: color until EOL or end
-        if in_str:
-            spans.append((start, n))
-        return spans
-
-    def _find_comment_spans(self, text, string_spans):
-        # Build quick mask for "inside-string"
-        in_string = [False] * (len(text) + 1)
-        for s, e in string_spans:
-            for k in range(s, e):
-                if 0 <= k < len(in_string):
-                    in_string[k] = True
-
-        spans = []
-        i, n = 0, len(text)
-        while i < n:
-            if text[i] == "#" and not in_string[i]:
-                # comment runs to end of line
-                j = i
-                while j < n and text[j] != "\n":
-                    j += 1
-                spans.append((i, j))
-                i = j
-            else:
-                i += 1
-        return spans
-
-    def _merge_spans(self, spans):
-        if not spans:
-            return []
-        spans = sorted(spans)
-        merged = [list(spans[0])]
-        for s, e in spans[1:]:
-            if s <= merged[-1][1]:
-                merged[-1][1] = max(merged[-1][1], e)
-            else:
-                merged.append([s, e])
-        return [(a, b) for a, b in merged]
-
-    def _overlaps(self, spans, a, b):
-        # any overlap with [a,b)
-        for s, e in spans:
-            if not (b <= s or a >= e):
-                return True
-        return False
-
-    def _tag_abs_range(self, tag, abs_start, abs_end):
-        start = f"1.0+{abs_start}c"
-        end   = f"1.0+{abs_end}c"
-        self.editor.tag_add(tag, start, end)
-
-    def _tag_abs_range_excluding(self, tag, abs_start, abs_end, excluded_spans):
-        # Skip adding if overlaps any protected span
-        if self._overlaps(excluded_spans, abs_start, abs_end):
-            return
-        self._tag_abs_range(tag, abs_start, abs_end)
+        # colors the lines in view and MARGIN around them, where a line's text
+        # or the state it starts in changed since it was last colored
+        self._pending = None
+        editor = self.editor
+        top = int(editor.index("@0,0").split(".")[0]) - 1
+        bottom = int(editor.index(f"@0,{editor.winfo_height()}").split(".")[0]) - 1
+        first = max(0, top - MARGIN)
+        last = min(self._last_line() - 1, bottom + MARGIN)
+        self.highlighter.lex_to(last, self._lines)
+        states = self.highlighter.states
+        old = self.painted
+        painted = {}
+        for i, text in enumerate(self._lines(first, last + 1), first):
+            state = states[i]
+            if i not in old or old[i] != state:
+                self._paint(i + 1, text, state)
+            painted[i] = state
+        self.painted = painted
+
+    def _paint(self, line, text, state):
+        # line: a Tk line number
+        editor = self.editor
+        for tag in TAGS:
+            editor.tag_remove(tag, f"{line}.0", f"{line}.end")
+        ranges = {}
+        for tag, start, end in scan(text, state)[0]:
+            ranges.setdefault(tag, []).extend((f"{line}.{start}", f"{line}.{end}"))
+        for tag, marks in ranges.items():
+            editor.tag_add(tag, *marks)
 
     # --- file ops ---
     def new_file(self):
@@ -345,20 +312,15 @@ class DamavandIDE:
         code = self.editor.get("1.0", "end-1c")
         self.console.delete("1.0", "end")
 
-        old_out, old_err = sys.stdout, sys.stderr
-        sys.stdout = sys.stderr = io.StringIO()
-
+        out = CaptureSink()
         try:
             tokens = Lexer(code).tokenize()
             ast = Parser(tokens).parse()
-            Interpreter().run(ast)
+            Interpreter(out=out).run(ast, self.filename)
         except (SyntaxError, ParserError, RuntimeErrorEx, Exception) as e:
-            print(f"[IDE Error] {e}")
-        output = sys.stdout.getvalue()
-
-        sys.stdout, sys.stderr = old_out, old_err
+            out.write(f"[IDE Error] {e}")
 
-        self.console.insert("end", output)
+        self.console.insert("end", out.getvalue())
         self.highlight()
 
 
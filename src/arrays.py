@@ -0,0 +1,308 @@
+import operator
+from array import array
+from functools import reduce
+from itertools import repeat
+
+from .rope import Rope, is_string
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Array values, shared by every engine. An Array is immutable, so the
+# call-scoping rule (nothing written during a call outlives it) holds for
+# arrays passed around too.
+#
+# All-int arrays are stored in array("q") and all-float ones in array("d");
+# anything else (strings, booleans, nested arrays, mixes, ints and floats
+# together included, so an int stays an int) in a tuple. The arithmetic and comparison operators work element
+# by element, between two arrays of the same length or an array and a
+# scalar, and are implemented as dunders: operator.add & co. (what the
+# engines call) reach them without the scalar paths paying for a check.
+# Each one is a single pass in C over the whole array, with NumPy for
+# longer numeric arrays when it is installed.
+
+INT, FLOAT = "q", "d"
+
+# numeric arrays at least this long go through NumPy, if available; below
+# it converting costs more than it saves
+NUMPY_MIN = 64
+
+
+class ArrayError(Exception):
+    pass
+
+
+def type_name(v):
+    if v is None:
+        return "none"
+    if isinstance(v, bool):
+        return "bool"
+    if isinstance(v, (int, float)):
+        return "number"
+    if is_string(v):
+        return "string"
+    if isinstance(v, Array):
+        return "array"
+    return type(v).__name__
+
+
+def _kind(v):
+    # the storage a scalar would get in an array: INT, FLOAT or None
+    cls = v.__class__
+    if cls is int:
+        return INT
+    if cls is float:
+        return FLOAT
+    return None
+
+
+def pack(values):
+    # values: a list; picks the narrowest storage for it
+    kinds = set(map(type, values))
+    if kinds == {int}:
+        try:
+            return array(INT, values)
+        except OverflowError:
+            return tuple(values)
+    if kinds == {float}:
+        return array(FLOAT, values)
+    return tuple(values)
+
+
+def make_array(values):
+    return Array(pack(values))
+
+
+COMPARISONS = {operator.eq, operator.ne, operator.lt, operator.gt, operator.le, operator.ge}
+
+if numpy is not None:
+    _NUMPY_OPS = {
+        operator.add: numpy.add, operator.sub: numpy.subtract,
+        operator.mul: numpy.multiply, operator.truediv: numpy.true_divide,
+        operator.eq: numpy.equal, operator.ne: numpy.not_equal,
+        operator.lt: numpy.less, operator.gt: numpy.greater,
+        operator.le: numpy.less_equal, operator.ge: numpy.greater_equal,
+    }
+    _DTYPES = {INT: numpy.int64, FLOAT: numpy.float64}
+
+# NumPy is only used where it gives exactly what Python's own operators
+# would: int64 results that can't wrap around, and ints small enough to be
+# exact floats wherever they meet a float or a division
+_INT_LIMIT = 1 << 63
+_EXACT_FLOAT = 1 << 53
+
+
+def _bound(v):
+    # the largest magnitude in v, an int64 array or a scalar
+    if not isinstance(v, numpy.ndarray):
+        return abs(v)
+    return max(int(v.max()), -int(v.min())) if len(v) else 0
+
+
+def _numpy(op, x, kx, y, ky):
+    # x / y: an Array's items (array("q") or array("d")) or a scalar; None
+    # when NumPy can't be trusted with them
+    if isinstance(x, array):
+        x = numpy.frombuffer(x, _DTYPES[kx])
+    if isinstance(y, array):
+        y = numpy.frombuffer(y, _DTYPES[ky])
+    if kx == INT or ky == INT:
+        bx = _bound(x) if kx == INT else 0
+        by = _bound(y) if ky == INT else 0
+        ints = kx == ky == INT
+        if max(bx, by) >= _INT_LIMIT:
+            big = True
+        elif ints and op is operator.mul:
+            big = bx * by >= _INT_LIMIT
+        elif ints and op in (operator.add, operator.sub):
+            big = bx + by >= _INT_LIMIT
+        elif ints and op in COMPARISONS:
+            big = False
+        else:
+            big = max(bx, by) >= _EXACT_FLOAT
+        if big:
+            return None
+    if op is operator.truediv and not numpy.all(y):
+        return None     # dividing by zero has to raise
+    # inf and nan come out as they do from Python floats, without warnings
+    with numpy.errstate(all="ignore"):
+        r = _NUMPY_OPS[op](x, y)
+    if op in COMPARISONS:
+        return tuple(r.tolist())
+    out = array(INT if r.dtype == numpy.int64 else FLOAT)
+    out.frombytes(memoryview(r).cast("B"))
+    return out
+
+
+def elementwise(op, a, b):
+    # op(a, b) where a or b (or both) is an Array
+    if a.__class__ is Array:
+        xs, ka = a.items, a.kind
+        n = len(xs)
+    else:
+        xs, ka = a, _kind(a)
+    if b.__class__ is Array:
+        ys, kb = b.items, b.kind
+        if a.__class__ is Array and len(ys) != n:
+            raise ArrayError(f"Array length mismatch: {n} and {len(ys)}")
+        n = len(ys)
+    else:
+        ys, kb = b, _kind(b)
+
+    numeric = ka is not None and kb is not None
+    if numeric and numpy is not None and n >= NUMPY_MIN:
+        r = _numpy(op, xs, ka, ys, kb)
+        if r is not None:
+            return Array(r)
+
+    def operands():
+        return (xs if a.__class__ is Array else repeat(xs, n),
+                ys if b.__class__ is Array else repeat(ys, n))
+    results = list(map(op, *operands()))
+    if not numeric:
+        return Array(pack(results))
+    if op in COMPARISONS:
+        return Array(tuple(results))
+    if op is operator.truediv or ka == FLOAT or kb == FLOAT:
+        return Array(array(FLOAT, results))
+    try:
+        return Array(array(INT, results))
+    except OverflowError:
+        # past 64 bits; Damavand ints don't wrap, so keep them exact
+        return Array(tuple(results))
+
+
+class Array:
+    __slots__ = ("items", "kind")
+
+    def __init__(self, items):
+        # items: array("q"), array("d") or a tuple, as built by pack()
+        self.items = items
+        self.kind = items.typecode if isinstance(items, array) else None
+
+    # element-wise operators; each returns a new Array
+    def __add__(self, other): return elementwise(operator.add, self, other)
+    def __radd__(self, other): return elementwise(operator.add, other, self)
+    def __sub__(self, other): return elementwise(operator.sub, self, other)
+    def __rsub__(self, other): return elementwise(operator.sub, other, self)
+    def __mul__(self, other): return elementwise(operator.mul, self, other)
+    def __rmul__(self, other): return elementwise(operator.mul, other, self)
+    def __truediv__(self, other): return elementwise(operator.truediv, self, other)
+    def __rtruediv__(self, other): return elementwise(operator.truediv, other, self)
+    # Python reflects these itself when the array is on the right
+    def __eq__(self, other): return elementwise(operator.eq, self, other)
+    def __ne__(self, other): return elementwise(operator.ne, self, other)
+    def __lt__(self, other): return elementwise(operator.lt, self, other)
+    def __gt__(self, other): return elementwise(operator.gt, self, other)
+    def __le__(self, other): return elementwise(operator.le, self, other)
+    def __ge__(self, other): return elementwise(operator.ge, self, other)
+
+    def __neg__(self):
+        items = self.items
+        if self.kind is None:
+            return Array(pack([-v for v in items]))
+        return Array(array(self.kind, map(operator.neg, items)))
+
+    # comparisons give arrays, so arrays can't be dict keys or conditions
+    __hash__ = None
+
+    def __bool__(self):
+        raise ArrayError("An array is neither true nor false; compare len() or sum() instead")
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, i):
+        if i.__class__ is not int:
+            raise ArrayError(f"Array index must be a whole number, not {type_name(i)}")
+        try:
+            return self.items[i]
+        except IndexError:
+            raise ArrayError(f"Index {i} out of range for an array of length {len(self.items)}")
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __str__(self):
+        return "[" + ", ".join(str(v) if v.__class__ is Array else repr(v)
+                               for v in self.items) + "]"
+
+    __repr__ = __str__
+
+
+def index(target, i):
+    # target[i] for the Index node; strings can be indexed too
+    if target.__class__ is Array:
+        return target[i]
+    if target.__class__ is Rope:
+        target = str(target)
+    if isinstance(target, str):
+        if i.__class__ is not int:
+            raise ArrayError(f"String index must be a whole number, not {type_name(i)}")
+        try:
+            return target[i]
+        except IndexError:
+            raise ArrayError(f"Index {i} out of range for a string of length {len(target)}")
+    raise ArrayError(f"Cannot index a {type_name(target)}")
+
+
+# --------------- builtins ---------------
+# Called when no fff of the same name is defined. They take Damavand values
+# and get exactly as many arguments as they have parameters.
+def _len(x):
+    if x.__class__ is Array or is_string(x):
+        return len(x)
+    raise ArrayError(f"len() needs an array or string, not {type_name(x)}")
+
+
+def _items(name, a):
+    if a.__class__ is not Array:
+        raise ArrayError(f"{name}() needs an array, not {type_name(a)}")
+    return a.items
+
+
+def _sum(a):
+    items = _items("sum", a)
+    if a.kind == INT and numpy is not None and len(items) >= NUMPY_MIN:
+        x = numpy.frombuffer(items, numpy.int64)
+        if _bound(x) * len(items) < _INT_LIMIT:
+            return int(x.sum())
+    # floats are added left to right, as a loop would (NumPy sums pairwise)
+    if a.kind is not None or not items or not is_string(items[0]):
+        return sum(items)
+    return reduce(operator.add, items)
+
+
+def _min(a):
+    items = _items("min", a)
+    if not items:
+        raise ArrayError("min() of an empty array")
+    return min(items)
+
+
+def _max(a):
+    items = _items("max", a)
+    if not items:
+        raise ArrayError("max() of an empty array")
+    return max(items)
+
+
+def _range(n):
+    if n.__class__ is not int:
+        raise ArrayError(f"range() needs a whole number, not {type_name(n)}")
+    if numpy is not None and n >= NUMPY_MIN:
+        out = array(INT)
+        out.frombytes(memoryview(numpy.arange(n, dtype=numpy.int64)).cast("B"))
+        return Array(out)
+    return Array(array(INT, range(n)))
+
+
+BUILTINS = {
+    "len": _len,
+    "sum": _sum,
+    "min": _min,
+    "max": _max,
+    "range": _range,
+}
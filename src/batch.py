@@ -0,0 +1,110 @@
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from time import perf_counter
+
+from .interpreter import Interpreter
+from .optimizer import optimize
+from .output import CaptureSink
+from .modules import ModuleCache
+from .main import ENGINES, error_text, load_program, run_tree
+
+# Batch mode: many programs on a pool of worker processes. A worker imports
+# everything once and then runs program after program, each with its own
+# Interpreter (or VM) and its output captured, so a program costs only its
+# own front end and execution, not a Python start. Results come back in the
+# order the programs were given, whatever order they finish in.
+
+
+# ModuleCaches by (use_cache, cache_dir): a worker's modules stay parsed
+# from one program to the next
+_modules = {}
+
+
+class Result:
+    __slots__ = ("path", "output", "error", "seconds")
+
+    def __init__(self, path, output, error, seconds):
+        self.path = path
+        self.output = output
+        self.error = error
+        self.seconds = seconds
+
+
+def expand(paths):
+    # directories give their *.dam files and patterns their matches, sorted
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files += sorted(glob.glob(os.path.join(glob.escape(p), "*.dam")))
+        elif any(c in p for c in "*?["):
+            files += sorted(glob.glob(p, recursive=True))
+        else:
+            files.append(p)
+    return files
+
+
+def run_program(path, engine="tree", optimize_ast=False, use_cache=True, cache_dir=None,
+                **memo):
+    out = CaptureSink()
+    error = None
+    start = perf_counter()
+    try:
+        ast = load_program(path, use_cache, cache_dir)
+        if optimize_ast:
+            ast, _ = optimize(ast)
+        modules = _modules.get((use_cache, cache_dir))
+        if modules is None:
+            modules = _modules[use_cache, cache_dir] = ModuleCache(use_cache, cache_dir)
+        if engine == "tree":
+            run_tree(ast, interp=Interpreter(out=out, modules=modules, **memo), path=path)
+        else:
+            ENGINES[engine](ast, out, path=path, modules=modules)
+    except OSError as e:
+        error = f"[Damavand Error] Cannot read {path}: {e.strerror}"
+    except Exception as e:
+        # one broken program doesn't take the rest of the batch with it
+        error = error_text(e)
+    return Result(path, out.getvalue(), error, perf_counter() - start)
+
+
+def run_batch(files, jobs=None, **options):
+    # yields a Result per file, in order
+    jobs = jobs or os.cpu_count() or 1
+    run = partial(run_program, **options)
+    if jobs < 2 or len(files) < 2:
+        yield from map(run, files)
+        return
+    with ProcessPoolExecutor(min(jobs, len(files))) as pool:
+        yield from pool.map(run, files)
+
+
+def main(paths, jobs=None, **options):
+    files = expand(paths)
+    if not files:
+        print("[Damavand Error] No programs to run", file=sys.stderr)
+        return 1
+    jobs = min(jobs or os.cpu_count() or 1, len(files))
+    start = perf_counter()
+    results = []
+    for r in run_batch(files, jobs, **options):
+        results.append(r)
+        if len(files) > 1:
+            print(f"==> {r.path} <==")
+        sys.stdout.write(r.output)
+        if r.error is not None:
+            sys.stdout.flush()
+            print(r.error, file=sys.stderr)
+            sys.stderr.flush()
+    sys.stdout.flush()
+    elapsed = perf_counter() - start
+    failed = [r for r in results if r.error is not None]
+    print(f"\n[Damavand batch] {len(results)} programs in {elapsed:.2f} s on {jobs} "
+          f"worker{'s' if jobs > 1 else ''} ({len(results) / elapsed:.1f} programs/s), "
+          f"{len(failed)} failed", file=sys.stderr)
+    for r in results:
+        status = "FAILED" if r.error is not None else "ok"
+        print(f"  {r.seconds * 1000:10.2f} ms  {status:<6}  {r.path}", file=sys.stderr)
+    return 1 if failed else 0
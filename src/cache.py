@@ -0,0 +1,87 @@
+import os
+import sys
+import pickle
+import hashlib
+import tempfile
+
+# On-disk cache of parsed programs, like __pycache__ for .dam files.
+#
+# An entry is keyed by the hash of the source text and of the interpreter
+# version, where the version is derived from the front-end modules
+# themselves, so editing the lexer, parser or AST classes invalidates every
+# entry without anyone having to remember to bump a number.
+#
+# Entries are written to a temp file and renamed into place, so concurrent
+# runs never see a partial file; a corrupt or foreign entry is just a miss.
+
+CACHE_DIRNAME = "__damcache__"
+MAGIC = b"DAMC\x01"
+
+_FRONTEND = ("lexer.py", "parser.py", "dam_ast.py", "cache.py")
+_version = None
+
+
+def interpreter_version():
+    global _version
+    if _version is None:
+        h = hashlib.sha256(repr(sys.version_info[:2]).encode())
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in _FRONTEND:
+            with open(os.path.join(here, name), "rb") as f:
+                h.update(f.read())
+        _version = h.digest()[:16]
+    return _version
+
+
+def cache_key(source):
+    h = hashlib.sha256(interpreter_version())
+    h.update(source.encode("utf-8", "surrogatepass"))
+    return h.hexdigest()[:32]
+
+
+def default_cache_dir(filename):
+    return os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIRNAME)
+
+
+class ProgramCache:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path_for(self, source):
+        return os.path.join(self.directory, cache_key(source) + ".damc")
+
+    def load(self, source):
+        try:
+            with open(self.path_for(source), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if not data.startswith(MAGIC + interpreter_version()):
+            return None
+        try:
+            return pickle.loads(memoryview(data)[len(MAGIC) + 16:])
+        except Exception:
+            return None
+
+    def store(self, source, program):
+        try:
+            payload = pickle.dumps(program, protocol=pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            # very deeply nested expressions; not worth caching
+            return False
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(MAGIC)
+                    f.write(interpreter_version())
+                    f.write(payload)
+                os.replace(tmp, self.path_for(source))
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError:
+            # read-only checkout, full disk...: run uncached
+            return False
+        return True
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import socket
+import argparse
+import tempfile
+
+# Client for the interpreter daemon (src/server.py). Only the standard
+# library is imported here, so a request costs a Python start and a round
+# trip, not loading the interpreter.
+#
+# The protocol is JSON, one object per line. A request:
+#   {"source": "print 1"} or {"path": "/abs/prog.dam"}
+#   optional: "engine" ("tree", "vm", "pycode"), "optimize" (bool),
+#             "timeout" (seconds)
+# and the replies, in this order:
+#   {"out": "..."}            printed lines, as they come
+#   {"error": "..."}          at most one, when the program failed
+#   {"done": true, "status": 0 or 1, "seconds": ...}
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f"damavand-{os.getuid()}.sock")
+
+
+def request(job, path=DEFAULT_SOCKET):
+    # sends one job and yields the replies as dicts
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(json.dumps(job).encode() + b"\n")
+        with sock.makefile("rb") as replies:
+            for line in replies:
+                reply = json.loads(line)
+                yield reply
+                if reply.get("done"):
+                    return
+    raise ConnectionError("The server closed the connection")
+
+
+def run(job, path=DEFAULT_SOCKET, out=None, err=None):
+    # runs a job, writing its output and errors out; returns the exit status
+    out = out or sys.stdout
+    err = err or sys.stderr
+    for reply in request(job, path):
+        if "out" in reply:
+            out.write(reply["out"])
+        elif "error" in reply:
+            out.flush()
+            print(reply["error"], file=err)
+        elif reply.get("done"):
+            return reply["status"]
+    return 1
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m src.client")
+    ap.add_argument("program", nargs="?",
+                    help="program.dam, read by the server; - reads the source from stdin")
+    ap.add_argument("-c", dest="source", metavar="SOURCE",
+                    help="run this source instead of a file")
+    ap.add_argument("--socket", default=DEFAULT_SOCKET, metavar="PATH",
+                    help=f"the server's socket (default: {DEFAULT_SOCKET})")
+    ap.add_argument("--engine", choices=("tree", "vm", "pycode"), default="tree")
+    ap.add_argument("-O", dest="optimize", action="store_true")
+    ap.add_argument("--timeout", type=float, metavar="SECONDS",
+                    help="give up on the program after this long (default: the server's)")
+    args = ap.parse_args(argv)
+    if (args.program is None) == (args.source is None):
+        ap.error("give either a program or -c SOURCE")
+    job = {"engine": args.engine, "optimize": args.optimize}
+    if args.source is not None:
+        job["source"] = args.source
+    elif args.program == "-":
+        job["source"] = sys.stdin.read()
+    else:
+        job["path"] = os.path.abspath(args.program)
+    if args.timeout is not None:
+        job["timeout"] = args.timeout
+    try:
+        return run(job, args.socket)
+    except (ConnectionError, FileNotFoundError) as e:
+        print(f"[Damavand Error] Cannot reach the server at {args.socket}: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+from .dam_ast import *
+
+# ---------------- opcodes ----------------
+# binary operators come first so the VM can range-check them with `op <= GE`
+(
+    ADD, SUB, MUL, DIV, EQ, NE, LT, GT, LE, GE,
+    LOAD_CONST, LOAD_NAME, STORE_NAME, POP,
+    NEG, NOT,
+    JUMP, JUMP_IF_FALSE,
+    PRINT, DEF_FUNC, CHECK_CALL, CALL,
+    HALT,
+    BINARY_NAME_CONST, BINARY_NAME_NAME,
+    DUP, JUMP_IF_NOT_NONE,
+    RETURN_VALUE,
+    BUILD_ARRAY, INDEX,
+) = range(30)
+
+OPNAMES = [
+    "ADD", "SUB", "MUL", "DIV", "EQ", "NE", "LT", "GT", "LE", "GE",
+    "LOAD_CONST", "LOAD_NAME", "STORE_NAME", "POP",
+    "NEG", "NOT",
+    "JUMP", "JUMP_IF_FALSE",
+    "PRINT", "DEF_FUNC", "CHECK_CALL", "CALL",
+    "HALT",
+    "BINARY_NAME_CONST", "BINARY_NAME_NAME",
+    "DUP", "JUMP_IF_NOT_NONE",
+    "RETURN_VALUE",
+    "BUILD_ARRAY", "INDEX",
+]
+
+BINARY_OPS = {
+    "+": ADD, "-": SUB, "*": MUL, "/": DIV,
+    "==": EQ, "!=": NE, "<": LT, ">": GT, "<=": LE, ">=": GE,
+}
+
+UNARY_OPS = {"-": NEG, "!": NOT}
+
+
+class CompileError(Exception):
+    pass
+
+
+class CodeObject:
+    # Every instruction is two ints: opcode and argument.
+    def __init__(self, name, code, consts, names):
+        self.name = name
+        self.code = code
+        self.consts = consts
+        self.names = names
+
+    def disassemble(self):
+        lines = []
+        for pc in range(0, len(self.code), 2):
+            op, arg = self.code[pc], self.code[pc + 1]
+            lines.append(f"{pc:5d} {OPNAMES[op]:<14} {arg}")
+        return "\n".join(lines)
+
+
+class Function:
+    def __init__(self, name, params, code):
+        self.name = name
+        self.params = params
+        self.code = code
+
+
+class Compiler:
+    def __init__(self, name="<module>"):
+        self.name = name
+        self.code = []
+        self.consts = []
+        self.names = []
+        self._const_index = {}
+        self._name_index = {}
+
+    def compile(self, program: Program):
+        self.compile_block(program.statements)
+        self.emit(HALT)
+        return CodeObject(self.name, self.code, self.consts, self.names)
+
+    def compile_function(self, node: FuncDef):
+        # falling off the end returns None
+        self.compile_block(node.body)
+        self.emit(LOAD_CONST, self.const_index(None))
+        self.emit(RETURN_VALUE)
+        return Function(node.name, node.params,
+                        CodeObject(self.name, self.code, self.consts, self.names))
+
+    # --------------- helpers ---------------
+    def emit(self, op, arg=0):
+        self.code.append(op)
+        self.code.append(arg)
+        return len(self.code) - 2
+
+    def patch(self, at, target):
+        self.code[at + 1] = target
+
+    def const_index(self, value):
+        # keep 1, 1.0 and True apart: they are equal as dict keys
+        key = (type(value), value)
+        if key not in self._const_index:
+            self._const_index[key] = len(self.consts)
+            self.consts.append(value)
+        return self._const_index[key]
+
+    def name_index(self, name):
+        if name not in self._name_index:
+            self._name_index[name] = len(self.names)
+            self.names.append(name)
+        return self._name_index[name]
+
+    def add_const(self, value):
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    # --------------- statements ---------------
+    def compile_block(self, stmts):
+        for s in stmts:
+            self.compile_stmt(s)
+
+    def compile_stmt(self, node):
+        if isinstance(node, FuncDef):
+            fn = Compiler(node.name).compile_function(node)
+            self.emit(DEF_FUNC, self.add_const(fn))
+        elif isinstance(node, Call):
+            self.compile_call(node)
+            self.emit(POP)
+        elif isinstance(node, If):
+            self.compile_expr(node.cond)
+            jf = self.emit(JUMP_IF_FALSE)
+            self.compile_block(node.then_branch)
+            if node.else_branch:
+                j = self.emit(JUMP)
+                self.patch(jf, len(self.code))
+                self.compile_block(node.else_branch)
+                self.patch(j, len(self.code))
+            else:
+                self.patch(jf, len(self.code))
+        elif isinstance(node, While):
+            top = len(self.code)
+            self.compile_expr(node.cond)
+            jf = self.emit(JUMP_IF_FALSE)
+            self.compile_block(node.body)
+            self.emit(JUMP, top)
+            self.patch(jf, len(self.code))
+        elif isinstance(node, Print):
+            self.compile_expr(node.expr)
+            self.emit(PRINT)
+        elif isinstance(node, Assign):
+            self.compile_expr(node.expr)
+            self.emit(STORE_NAME, self.name_index(node.name))
+        elif isinstance(node, Return):
+            if node.expr is None:
+                self.emit(LOAD_CONST, self.const_index(None))
+            else:
+                self.compile_expr(node.expr)
+            self.emit(RETURN_VALUE)
+        else:
+            raise CompileError(f"Unknown statement {type(node)}")
+
+    # --------------- expressions ---------------
+    def compile_expr(self, node):
+        if isinstance(node, Literal):
+            self.emit(LOAD_CONST, self.const_index(node.value))
+        elif isinstance(node, Var):
+            self.emit(LOAD_NAME, self.name_index(node.name))
+        elif isinstance(node, UnaryOp):
+            if node.op not in UNARY_OPS:
+                raise CompileError(f"Unknown unary {node.op}")
+            self.compile_expr(node.expr)
+            self.emit(UNARY_OPS[node.op])
+        elif isinstance(node, BinaryOp):
+            if node.op not in BINARY_OPS:
+                raise CompileError(f"Unknown op {node.op}")
+            op = BINARY_OPS[node.op]
+            # superinstructions for `name op const` and `name op name`, the
+            # shape of nearly every loop counter and condition
+            if isinstance(node.left, Var) and isinstance(node.right, Literal):
+                k = self.add_const((op, node.left.name, node.right.value))
+                self.emit(BINARY_NAME_CONST, k)
+            elif isinstance(node.left, Var) and isinstance(node.right, Var):
+                k = self.add_const((op, node.left.name, node.right.name))
+                self.emit(BINARY_NAME_NAME, k)
+            else:
+                self.compile_expr(node.left)
+                self.compile_expr(node.right)
+                self.emit(op)
+        elif isinstance(node, Call):
+            self.compile_call(node)
+        elif isinstance(node, Index):
+            self.compile_expr(node.target)
+            self.compile_expr(node.index)
+            self.emit(INDEX)
+        elif isinstance(node, ArrayLiteral):
+            for item in node.items:
+                self.compile_expr(item)
+            self.emit(BUILD_ARRAY, len(node.items))
+        elif isinstance(node, Hoisted):
+            k = self.name_index(node.name)
+            self.emit(LOAD_NAME, k)
+            j = self.emit(JUMP_IF_NOT_NONE)
+            self.compile_expr(node.expr)
+            self.emit(DUP)
+            self.emit(STORE_NAME, k)
+            self.patch(j, len(self.code))
+        else:
+            raise CompileError(f"Unknown expr {type(node)}")
+
+    def compile_call(self, node):
+        # the callee is looked up and checked before the arguments run,
+        # exactly like Interpreter._call
+        k = self.add_const((node.name, len(node.args)))
+        self.emit(CHECK_CALL, k)
+        for a in node.args:
+            self.compile_expr(a)
+        self.emit(CALL, len(node.args))
+
+
+def compile_program(program: Program):
+    return Compiler().compile(program)
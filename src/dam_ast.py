@@ -1,63 +1,236 @@
+# Nodes use __slots__: a large program has millions of them, and a
+# per-instance __dict__ would more than double their size.
+#
+# Statements carry the source line they start on (0 when synthesized).
+# `calls` tells whether running the node can reach a Call; the resolver sets
+# it where it varies, the other classes fix it.
+#
+# They pickle as a constructor call on the parsed fields only, which is
+# several times faster than the generic slots protocol. Anything the resolver
+# or interpreter attaches later is recomputed after loading.
+
+
 class Program:
+    __slots__ = ("statements",)
+
     def __init__(self, statements):
         self.statements = statements
 
+    def __reduce__(self):
+        return Program, (self.statements,)
+
 
 class FuncDef:
-    def __init__(self, name, params, body):
+    calls = False
+    __slots__ = ("name", "params", "body", "slots", "param_slots", "leaf", "line", "pragmas")
+
+    def __init__(self, name, params, body, line=0, pragmas=()):
         self.name = name
         self.params = params
         self.body = body
+        self.line = line
+        # names from `#pragma NAME` lines in front of the fff
+        self.pragmas = tuple(pragmas)
+        # filled in by the resolver
+        self.slots = None
+        self.param_slots = None
+        # no calls in the body
+        self.leaf = False
+
+    def __reduce__(self):
+        return FuncDef, (self.name, self.params, self.body, self.line, self.pragmas)
 
 
 class Call:
-    def __init__(self, name, args):
+    __slots__ = ("name", "args", "line", "nested", "builtin", "calls")
+
+    def __init__(self, name, args, line=0):
         self.name = name
         self.args = args
+        self.line = line
+        # an argument contains a call; set by the resolver
+        self.nested = False
+        # the Native the name is bound to (used unless a fff of that name
+        # exists), or None; set by the resolver
+        self.builtin = None
+        # whether it can reach a fff call: false for a builtin with no fff
+        # of its name, whose arguments don't call anything either
+        self.calls = True
+
+    def __reduce__(self):
+        return Call, (self.name, self.args, self.line)
 
 
 class If:
-    def __init__(self, cond, then_branch, else_branch):
+    __slots__ = ("cond", "then_branch", "else_branch", "line", "calls")
+
+    def __init__(self, cond, then_branch, else_branch, line=0):
         self.cond = cond
         self.then_branch = then_branch
         self.else_branch = else_branch
+        self.line = line
+        self.calls = False
+
+    def __reduce__(self):
+        return If, (self.cond, self.then_branch, self.else_branch, self.line)
 
 
 class While:
-    def __init__(self, cond, body):
+    __slots__ = ("cond", "body", "line", "calls")
+
+    def __init__(self, cond, body, line=0):
         self.cond = cond
         self.body = body
+        self.line = line
+        self.calls = False
+
+    def __reduce__(self):
+        return While, (self.cond, self.body, self.line)
 
 
 class Print:
-    def __init__(self, expr):
+    __slots__ = ("expr", "line", "calls")
+
+    def __init__(self, expr, line=0):
         self.expr = expr
+        self.line = line
+        self.calls = False
+
+    def __reduce__(self):
+        return Print, (self.expr, self.line)
 
 
 class Assign:
-    def __init__(self, name, expr):
+    __slots__ = ("name", "expr", "slot", "line", "calls")
+
+    def __init__(self, name, expr, line=0):
         self.name = name
         self.expr = expr
+        self.line = line
+        self.slot = None
+        self.calls = False
+
+    def __reduce__(self):
+        return Assign, (self.name, self.expr, self.line)
+
+
+class Return:
+    __slots__ = ("expr", "line", "calls")
+
+    def __init__(self, expr, line=0):
+        # expr is None for a bare `return`
+        self.expr = expr
+        self.line = line
+        self.calls = False
+
+    def __reduce__(self):
+        return Return, (self.expr, self.line)
+
+
+class Import:
+    # runs a module's code, which can do anything (see modules.py)
+    calls = True
+    __slots__ = ("path", "line")
+
+    def __init__(self, path, line=0):
+        # as written in the program
+        self.path = path
+        self.line = line
+
+    def __reduce__(self):
+        return Import, (self.path, self.line)
 
 
 class Var:
+    calls = False
+    __slots__ = ("name", "slot")
+
     def __init__(self, name):
         self.name = name
+        self.slot = None
+
+    def __reduce__(self):
+        return Var, (self.name,)
 
 
 class Literal:
+    calls = False
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
+    def __reduce__(self):
+        return Literal, (self.value,)
+
 
 class BinaryOp:
+    __slots__ = ("left", "op", "right", "fn", "quick", "warmup", "calls")
+
     def __init__(self, left, op, right):
         self.left = left
         self.op = op
         self.right = right
+        # operator callable, bound by the resolver
+        self.fn = None
+        # specialized evaluator installed by the interpreter once hot
+        self.quick = None
+        self.warmup = 0
+        self.calls = False
+
+    def __reduce__(self):
+        return BinaryOp, (self.left, self.op, self.right)
 
 
 class UnaryOp:
+    __slots__ = ("op", "expr", "fn", "quick", "warmup", "calls")
+
     def __init__(self, op, expr):
         self.op = op
         self.expr = expr
+        self.fn = None
+        self.quick = None
+        self.warmup = 0
+        self.calls = False
+
+    def __reduce__(self):
+        return UnaryOp, (self.op, self.expr)
+
+
+class ArrayLiteral:
+    __slots__ = ("items", "calls")
+
+    def __init__(self, items):
+        self.items = items
+        self.calls = False
+
+    def __reduce__(self):
+        return ArrayLiteral, (self.items,)
+
+
+class Index:
+    __slots__ = ("target", "index", "calls")
+
+    def __init__(self, target, index):
+        self.target = target
+        self.index = index
+        self.calls = False
+
+    def __reduce__(self):
+        return Index, (self.target, self.index)
+
+
+class Hoisted:
+    # A loop-invariant expression pulled out by the optimizer. It is
+    # evaluated the first time the loop needs it and cached in the hidden
+    # variable `name`, which is reset to None on every entry to the loop.
+    calls = False
+    __slots__ = ("expr", "name", "slot")
+
+    def __init__(self, expr, name):
+        self.expr = expr
+        self.name = name
+        self.slot = None
+
+    def __reduce__(self):
+        return Hoisted, (self.expr, self.name)
@@ -0,0 +1,145 @@
+import re
+
+from .lexer import Lexer
+
+# Syntax highlighting for the IDE, with the Lexer's own token patterns, one
+# line at a time. The only thing a line needs from the lines before it is
+# whether a string is still open at its start (strings may span lines,
+# comments may not), so that is the lexer state kept per line: None, or the
+# quote of the open string.
+#
+# A Highlighter remembers the state at the start of every line it has lexed.
+# An edit only damages the lines it touched: lexing starts again at the first
+# of them, and stops as soon as a line past the damage starts in the state it
+# had before, since everything from there on lexes the way it did. Lines are
+# only lexed as far down as someone looks (lex_to()), and only the lines
+# shown need their tokens (scan()).
+
+# what to color each Lexer.SCANNER group as; "id" is a keyword or nothing
+_TAG_OF = {
+    "PRAGMA": "com", "COMMENT": "com", "NUMBER": "num", "STRING": "str", "ID": "id",
+    "OP": "op", "LPAREN": "par", "RPAREN": "par", "LBRACE": "par", "RBRACE": "par",
+    "LBRACKET": "par", "RBRACKET": "par",
+}
+TAGS = ("kw", "num", "str", "com", "op", "par")
+
+_SCANNER = Lexer.SCANNER
+_GROUP_NAMES = Lexer.GROUP_NAMES
+_GROUP_TAGS = [_TAG_OF.get(name) for name in _GROUP_NAMES]
+_KEYWORDS = Lexer.KEYWORDS
+_QUOTES = "\"'"
+
+# the rest of a string open since an earlier line, up to its closing quote
+# (Lexer's STRING pattern without the opening quote)
+_CLOSE = {q: re.compile(rf"(?:[^{q}\\]|\\.)*{q}") for q in _QUOTES}
+
+# as far along a line as plain code and whole strings go: what stops it is
+# the end, a comment or a string left open
+_PLAIN = re.compile(rf"(?:[^\"'#]+|{dict(Lexer.TOKEN_SPEC)['STRING']})*")
+
+# states[i] of a line whose state isn't known any more
+UNKNOWN = object()
+
+
+def scan(text, state=None):
+    # -> ([(tag, start, end)], the state after the line) for one line of
+    # text (no newline) starting in `state`
+    spans = []
+    pos = 0
+    if state is not None:
+        mo = _CLOSE[state].match(text)
+        if mo is None:
+            return [("str", 0, len(text))] if text else spans, state
+        pos = mo.end()
+        spans.append(("str", 0, pos))
+    tags = _GROUP_TAGS
+    for mo in _SCANNER.finditer(text, pos):
+        group = mo.lastindex
+        tag = tags[group]
+        if tag is None:
+            value = mo.group(group)
+            if value and value in _QUOTES and _GROUP_NAMES[group] == "MISMATCH":
+                # a string going on past the end of the line
+                spans.append(("str", mo.start(group), len(text)))
+                return spans, value
+            continue
+        if tag == "id":
+            if mo.group(group) not in _KEYWORDS:
+                continue
+            tag = "kw"
+        spans.append((tag, mo.start(group), mo.end(group)))
+    return spans, None
+
+
+def state_after(text, state=None):
+    # scan(text, state)[1], without the tokens
+    pos = 0
+    if state is not None:
+        mo = _CLOSE[state].match(text) if state in text else None
+        if mo is None:
+            return state
+        pos = mo.end()
+    elif '"' not in text and "'" not in text:
+        return None
+    end = _PLAIN.match(text, pos).end()
+    if end < len(text) and text[end] != "#":
+        return text[end]
+    return None
+
+
+class Highlighter:
+    # how many lines lex_to() asks for at a time: few at first, as it mostly
+    # catches up within a line or two of an edit, then up to CHUNK
+    FIRST_CHUNK = 8
+    CHUNK = 512
+
+    def __init__(self):
+        # states[i]: the state at the start of line i (0-based); right for
+        # i < valid, and for the rest as of before the last edits
+        self.states = [None]
+        self.valid = 1
+        # the first line past the edits since, and the last pass of lex_to()
+        # if it stopped short: from there on the old states follow from one
+        # another again, so lexing can stop at one it agrees with
+        self.dirty = 0
+        # lines lexed, for measuring
+        self.lexed = 0
+
+    def edit(self, first, removed, added):
+        # lines first..first + removed of the text are now first..first + added
+        states = self.states
+        if first + 1 >= len(states):
+            return
+        states[first + 1:first + 1 + removed] = [UNKNOWN] * added
+        if self.dirty > first:
+            self.dirty += added - removed
+        self.dirty = max(self.dirty, first + added + 1)
+        self.valid = min(self.valid, first + 1)
+
+    def lex_to(self, last, lines):
+        # makes states[:last + 1] right; lines(a, b) -> the text of lines
+        # a..b - 1, as a list
+        states = self.states
+        i = self.valid - 1
+        chunk = self.FIRST_CHUNK
+        while i < last:
+            texts = lines(i, min(last, i + chunk))
+            if not texts:
+                break
+            chunk = min(chunk * 4, self.CHUNK)
+            state = states[i]
+            for text in texts:
+                state = state_after(text, state)
+                i += 1
+                self.lexed += 1
+                if i < len(states):
+                    if i >= self.dirty and states[i] == state:
+                        # back in step with the lines as last lexed
+                        i = len(states) - 1
+                        break
+                    states[i] = state
+                else:
+                    states.append(state)
+        self.valid = i + 1
+        # what comes after was lexed in an earlier pass, from other states
+        self.dirty = max(self.dirty, self.valid) if self.valid < len(states) else 0
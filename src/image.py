@@ -0,0 +1,137 @@
+import os
+import mmap
+import pickle
+import struct
+import hashlib
+import tempfile
+
+from .cache import interpreter_version
+from .resolver import resolve_statement
+from .rope import Rope
+from .optimizer import HIDDEN
+
+# Interpreter images: the functions and globals an Interpreter ended up
+# with, saved so later runs can start from them instead of re-running the
+# prelude that built them (main.py --save-image / --image).
+#
+# Layout: MAGIC, the image version, then the offset and length of the
+# index, a pickled {"globals": span, "functions": {name: span}} where a
+# span is (offset, length) of a pickle elsewhere in the file. The file is
+# mapped, not read: globals are unpickled on load, but a function is only
+# unpickled (and resolved) the first time the program calls it, so an image
+# with thousands of functions costs little more to open than an empty one.
+
+MAGIC = b"DAMI\x01"
+_PREFIX = struct.Struct("<QQ")
+# what saved values are made of, besides the AST
+_VALUES = ("arrays.py", "image.py")
+_version = None
+
+
+class ImageError(Exception):
+    pass
+
+
+def image_version():
+    global _version
+    if _version is None:
+        h = hashlib.sha256(interpreter_version())
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in _VALUES:
+            with open(os.path.join(here, name), "rb") as f:
+                h.update(f.read())
+        _version = h.digest()[:16]
+    return _version
+
+
+def save_image(interp, path):
+    # writes interp's functions and globals to `path`; functions not loaded
+    # yet from the interpreter's own image or from modules are copied over
+    # as they are
+    dump = lambda v: pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL)
+    blobs = []
+    functions = {}
+    offset = len(MAGIC) + 16 + _PREFIX.size
+
+    def add(data):
+        nonlocal offset
+        blobs.append(data)
+        span = (offset, len(data))
+        offset += len(data)
+        return span
+
+    # ropes are only a way of building strings; save the strings. Values -O
+    # hoisted out of top-level loops aren't the program's to keep.
+    values = {k: str(v) if v.__class__ is Rope else v for k, v in interp.globals.items()
+              if not k.startswith(HIDDEN)}
+    globals_span = add(dump(values))
+    image = interp.image
+    if image is not None:
+        for name in image.index:
+            if name not in interp.functions:
+                functions[name] = add(image.raw(name))
+    for name, module in interp.lazy.items():
+        if name not in interp.functions:
+            functions[name] = add(module.raw(name))
+    for name, fn in interp.functions.items():
+        functions[name] = add(dump(fn))
+    index = dump({"globals": globals_span, "functions": functions})
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(image_version())
+            f.write(_PREFIX.pack(offset, len(index)))
+            for data in blobs:
+                f.write(data)
+            f.write(index)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class Image:
+    def __init__(self, path):
+        try:
+            with open(path, "rb") as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise ImageError(f"Cannot open image {path}: {e}")
+        view = self.view = memoryview(self.map)
+        start = len(MAGIC) + 16
+        if view[:len(MAGIC)] != MAGIC or len(view) < start + _PREFIX.size:
+            raise ImageError(f"{path} is not a Damavand image")
+        if view[len(MAGIC):start] != image_version():
+            raise ImageError(f"{path} was saved by a different version of Damavand; "
+                             f"save it again with --save-image")
+        at, n = _PREFIX.unpack_from(view, start)
+        index = pickle.loads(view[at:at + n])
+        self.index = index["functions"]
+        self.globals = pickle.loads(self.raw_span(index["globals"]))
+
+    def raw_span(self, span):
+        at, n = span
+        return self.view[at:at + n]
+
+    def raw(self, name):
+        return self.raw_span(self.index[name])
+
+    def function(self, name, shadowed=(), preempt=False):
+        # the FuncDef saved under `name`, ready to call, or None; `shadowed`
+        # and `preempt` as for resolve_statement()
+        span = self.index.get(name)
+        if span is None:
+            return None
+        return resolve_statement(pickle.loads(self.raw_span(span)), shadowed, preempt)
+
+
+def load_image(interp, path):
+    # starts interp from the image at `path`
+    image = Image(path)
+    interp.image = image
+    interp.globals.update(image.globals)
+    interp.bind_builtin_names(image, image.index)
+    return image
@@ -1,85 +1,615 @@
+import os
+
 from .dam_ast import *
+from .resolver import resolve, resolve_statement, UNSET
+from .quicken import QUICKEN_AFTER, quicken_binary, quicken_unary
+from .arrays import make_array, index
+from .natives import BUILTINS
+from .memo import POLICIES, DEFAULT_SIZE, MISSING, Memo, local_callees, memo_key
+from .output import StreamSink
+from .modules import MODULES, find, cycle_error
 
 class RuntimeErrorEx(Exception):
     pass
 
+class Frame:
+    def __init__(self, fn, values):
+        self.fn = fn
+        self.values = values
+        self.result = None
+
+# what statement handlers return when a `return` ran
+RETURNED = object()
+
+# Calls never recurse on the Python stack. Code that can reach a call (the
+# resolver marks it with `calls`) runs as generators: a call evaluates its
+# arguments and yields the new Frame, and _drive() keeps the generators of
+# every active call on a list, sending each callee's result back to its
+# caller. Everything else takes the plain recursive handlers below, which
+# never see a call.
+#
+# Statement handlers return RETURNED when a `return` ran, with the value left
+# in the current frame's `result`, so returning needs no exception. A call to
+# a function whose body has no calls (`leaf`, set by the resolver) runs its
+# body directly instead of going through _drive().
+
 class Interpreter:
-    def __init__(self):
+    # whether loops must be able to pause (scheduler.py)
+    preempt = False
+
+    def __init__(self, quicken=True, memoize=False, memo_size=DEFAULT_SIZE, memo_policy="lru",
+                 out=None, modules=None):
         self.globals = {}
         self.functions = {}
+        # functions not loaded yet, consulted only when a name isn't in
+        # `functions`: name -> the Module that defines it (modules.py), then
+        # the image this run started from (image.py)
+        self.lazy = {}
+        self.image = None
+        # the ModuleCache imports go through; the files being imported,
+        # outermost (the program's own) first; the ones done
+        self.modules = modules or MODULES
+        self.importing = []
+        self.imported = set()
+        self.frames = []
+        self.frame = None
+        self.quicken = quicken
+        if memo_policy not in POLICIES:
+            raise ValueError(f"Unknown eviction policy {memo_policy!r}")
+        self.memoize = memoize
+        self.memo_size = memo_size
+        self.memo_policy = memo_policy
+        # FuncDef -> Memo for every function memoized so far, with its stats
+        self.memos = {}
+        # the output sink `print` writes to (src/output.py)
+        self.out = out or StreamSink()
+        self._write = self.out.write
+        # node type -> handler, so dispatch is one dict lookup instead of a
+        # chain of isinstance checks
+        self._stmt_handlers = {
+            FuncDef: self._exec_funcdef,
+            Call: self._exec_call,
+            If: self._exec_if,
+            While: self._exec_while,
+            Print: self._exec_print,
+            Assign: self._exec_assign,
+            Return: self._exec_return,
+        }
+        self._expr_handlers = {
+            Literal: self._eval_literal,
+            Var: self._load,
+            BinaryOp: self._eval_binary,
+            UnaryOp: self._eval_unary,
+            Call: self._call,
+            Index: self._eval_index,
+            ArrayLiteral: self._eval_array,
+            Hoisted: self._eval_hoisted,
+        }
+        # the same for nodes with `calls` set; these return generators
+        self._gen_stmt_handlers = {
+            Call: self._gen_call,
+            If: self._gen_if,
+            While: self._gen_while,
+            Print: self._gen_print,
+            Assign: self._gen_assign,
+            Return: self._gen_return,
+            Import: self._gen_import,
+        }
+        self._gen_expr_handlers = {
+            BinaryOp: self._gen_binary,
+            UnaryOp: self._gen_unary,
+            Call: self._gen_call,
+            Index: self._gen_index,
+            ArrayLiteral: self._gen_array,
+        }
+        if memoize:
+            self._init_memo()
 
-    def run(self, program: Program):
+    def run(self, program: Program, path=None):
+        # path: the file the program is from, which imports are relative to
+        self._enter(path)
+        resolve(program, self._shadowed(), self.preempt)
         for stmt in program.statements:
+            self.exec_top(stmt)
+
+    def run_stream(self, statements, path=None):
+        # run top-level statements as they arrive (e.g. Parser.statements()),
+        # so only the statement being executed has to be in memory
+        self._enter(path)
+        for stmt in statements:
+            self.exec_top(resolve_statement(stmt, self._shadowed(), self.preempt))
+
+    def _enter(self, path):
+        self.importing = [os.path.realpath(path)] if path else []
+
+    def _shadowed(self):
+        # builtins a fff has taken the name of
+        functions = self.functions
+        return {name for name in BUILTINS if name in functions}
+
+    def exec_top(self, stmt):
+        if stmt.calls:
+            self._drive(self._gen_stmt(stmt))
+        else:
             self.exec_stmt(stmt)
 
     # --------------- statements ---------------
     def exec_stmt(self, node):
-        if isinstance(node, FuncDef):
-            self.functions[node.name] = node
-        elif isinstance(node, Call):
-            self._call(node)
-        elif isinstance(node, If):
-            if self.eval_expr(node.cond):
-                for s in node.then_branch:
-                    self.exec_stmt(s)
-            else:
-                for s in node.else_branch:
-                    self.exec_stmt(s)
-        elif isinstance(node, While):
-            while self.eval_expr(node.cond):
-                for s in node.body:
-                    self.exec_stmt(s)
-        elif isinstance(node, Print):
-            print(self.eval_expr(node.expr))
-        elif isinstance(node, Assign):
-            self.globals[node.name] = self.eval_expr(node.expr)
-        else:
+        handler = self._stmt_handlers.get(node.__class__)
+        if handler is None:
             raise RuntimeErrorEx(f"Unknown statement {type(node)}")
+        return handler(node)
+
+    def _exec_funcdef(self, node):
+        self.functions[node.name] = node
+
+    def _exec_call(self, node):
+        self._call(node)
+
+    def _exec_if(self, node):
+        exec_stmt = self.exec_stmt
+        for s in node.then_branch if self.eval_expr(node.cond) else node.else_branch:
+            if exec_stmt(s) is RETURNED:
+                return RETURNED
+
+    def _exec_while(self, node):
+        exec_stmt = self.exec_stmt
+        eval_expr = self.eval_expr
+        cond = node.cond
+        body = node.body
+        while eval_expr(cond):
+            for s in body:
+                if exec_stmt(s) is RETURNED:
+                    return RETURNED
+
+    def _exec_print(self, node):
+        self._write(self.eval_expr(node.expr))
+
+    def _exec_assign(self, node):
+        self._store(node, self.eval_expr(node.expr))
+
+    def _exec_return(self, node):
+        self.frame.result = None if node.expr is None else self.eval_expr(node.expr)
+        return RETURNED
 
     # --------------- expressions ---------------
     def eval_expr(self, node):
-        if isinstance(node, Literal):
-            return node.value
-        if isinstance(node, Var):
-            if node.name in self.globals:
-                return self.globals[node.name]
-            return None
-        if isinstance(node, UnaryOp):
-            v = self.eval_expr(node.expr)
-            if node.op == "-": return -v
-            if node.op == "!": return not v
-            raise RuntimeErrorEx(f"Unknown unary {node.op}")
-        if isinstance(node, BinaryOp):
-            l = self.eval_expr(node.left)
-            r = self.eval_expr(node.right)
-            if node.op == "+":  return l + r
-            if node.op == "-":  return l - r
-            if node.op == "*":  return l * r
-            if node.op == "/":  return l / r
-            if node.op == "==": return l == r
-            if node.op == "!=": return l != r
-            if node.op == "<":  return l < r
-            if node.op == ">":  return l > r
-            if node.op == "<=": return l <= r
-            if node.op == ">=": return l >= r
+        handler = self._expr_handlers.get(node.__class__)
+        if handler is None:
+            raise RuntimeErrorEx(f"Unknown expr {type(node)}")
+        return handler(node)
+
+    def _eval_literal(self, node):
+        return node.value
+
+    def _eval_binary(self, node):
+        q = node.quick
+        if q is not None:
+            return q(self)
+        fn = node.fn
+        if fn is None:
             raise RuntimeErrorEx(f"Unknown op {node.op}")
-        if isinstance(node, Call):
-            return self._call(node)
-        raise RuntimeErrorEx(f"Unknown expr {type(node)}")
+        if self.quicken:
+            node.warmup += 1
+            if node.warmup >= QUICKEN_AFTER:
+                node.quick = quicken_binary(node)
+        return fn(self.eval_expr(node.left), self.eval_expr(node.right))
+
+    def _eval_unary(self, node):
+        q = node.quick
+        if q is not None:
+            return q(self)
+        fn = node.fn
+        if fn is None:
+            raise RuntimeErrorEx(f"Unknown unary {node.op}")
+        if self.quicken:
+            node.warmup += 1
+            if node.warmup >= QUICKEN_AFTER:
+                node.quick = quicken_unary(node)
+        return fn(self.eval_expr(node.expr))
+
+    def _eval_index(self, node):
+        return index(self.eval_expr(node.target), self.eval_expr(node.index))
+
+    def _eval_array(self, node):
+        eval_expr = self.eval_expr
+        return make_array([eval_expr(item) for item in node.items])
+
+    def _eval_hoisted(self, node):
+        v = self._load(node)
+        if v is None:
+            v = self.eval_expr(node.expr)
+            self._store(node, v)
+        return v
+
+    # --------------- variables ---------------
+    def _load(self, node):
+        slot = node.slot
+        if slot is None:
+            return self.globals.get(node.name)
+        if slot >= 0:
+            v = self.frame.values[slot]
+            if v is not UNSET:
+                return v
+        return self._lookup_dynamic(node.name)
+
+    def _store(self, node, value):
+        if node.slot is None:
+            self.globals[node.name] = value
+        else:
+            self.frame.values[node.slot] = value
+
+    def _lookup_dynamic(self, name):
+        # a name the function hasn't set itself: the innermost caller that
+        # has it wins, then the globals
+        for frame in reversed(self.frames):
+            i = frame.fn.slots.get(name)
+            if i is not None:
+                v = frame.values[i]
+                if v is not UNSET:
+                    return v
+        return self.globals.get(name)
+
+    # --------------- calls ---------------
+    def _call(self, node):
+        native = node.builtin
+        if native is not None and node.name not in self.functions:
+            # no frame and no generator (see natives.py)
+            args = node.args
+            if len(args) != native.arity:
+                raise RuntimeErrorEx(f"Arg count mismatch for {node.name}")
+            eval_expr = self.eval_expr
+            return native.fn(*[eval_expr(a) for a in args])
+        return self._drive(self._gen_call(node))
+
+    def _run_leaf(self, frame):
+        frames = self.frames
+        frames.append(frame)
+        self.frame = frame
+        exec_stmt = self.exec_stmt
+        try:
+            for s in frame.fn.body:
+                if exec_stmt(s) is RETURNED:
+                    break
+        finally:
+            frames.pop()
+            self.frame = frames[-1] if frames else None
+        return frame.result
+
+    def _drive(self, gen):
+        # Runs `gen` to completion. `running` holds the generator of every
+        # call in progress, innermost last; self.frames the matching frames.
+        frames = self.frames
+        base = len(frames)
+        running = [gen]
+        value = None
+        try:
+            while True:
+                try:
+                    frame = running[-1].send(value)
+                except StopIteration as stop:
+                    running.pop()
+                    if not running:
+                        return stop.value
+                    value = frames.pop().result
+                    self.frame = frames[-1] if frames else None
+                    continue
+                frames.append(frame)
+                self.frame = frame
+                running.append(self._gen_body(frame))
+                value = None
+        except BaseException:
+            # nothing written during a call outlives it, so dropping the
+            # frames of the calls that were cut short is all the cleanup
+            del frames[base:]
+            self.frame = frames[-1] if frames else None
+            raise
 
-    def _call(self, node: Call):
-        if node.name not in self.functions:
+    def _gen_body(self, frame):
+        return self._gen_block(frame.fn.body)
+
+    def _callee(self, node):
+        fn = self.functions.get(node.name)
+        if fn is None:
+            fn = self._lazy_function(node.name)
+        if fn is None:
             raise RuntimeErrorEx(f"Undefined function {node.name}")
-        fn = self.functions[node.name]
         if len(node.args) != len(fn.params):
             raise RuntimeErrorEx(f"Arg count mismatch for {node.name}")
-        # bind params
-        local = {p: self.eval_expr(a) for p, a in zip(fn.params, node.args)}
-        # snapshot globals and execute body with local overlay
-        saved = dict(self.globals)
+        return fn
+
+    def _lazy_function(self, name):
+        module = self.lazy.pop(name, None)
+        if module is not None:
+            fn = module.function(name, self._shadowed(), self.preempt)
+        elif self.image is not None:
+            fn = self.image.function(name, self._shadowed(), self.preempt)
+        else:
+            return None
+        if fn is not None:
+            self.functions[name] = fn
+        return fn
+
+    def bind_builtin_names(self, source, names):
+        # binds the fffs among `names` that take a builtin's name, from
+        # `source` (a Module or an Image), right away: a call to len() & co.
+        # only goes to the builtin when no fff of that name is bound, so
+        # those can't wait until they are called
+        functions = self.functions
+        names = [name for name in names if name in BUILTINS and name not in functions]
+        if not names:
+            return
+        shadowed = self._shadowed().union(names)
+        lazy = self.lazy
+        for name in names:
+            lazy.pop(name, None)
+            functions[name] = source.function(name, shadowed, self.preempt)
+
+    def _frame(self, node):
+        # the frame for a call whose arguments don't call anything
+        fn = self._callee(node)
+        # bind params into a fresh frame; nothing written during the call
+        # outlives it, so there is no need to snapshot the globals
+        values = [UNSET] * len(fn.slots)
+        eval_expr = self.eval_expr
+        for i, a in zip(fn.param_slots, node.args):
+            values[i] = eval_expr(a)
+        return Frame(fn, values)
+
+    def _gen_call(self, node):
+        if node.builtin and node.name not in self.functions:
+            return (yield from self._gen_builtin(node))
+        if node.nested:
+            fn = self._callee(node)
+            values = [UNSET] * len(fn.slots)
+            for i, a in zip(fn.param_slots, node.args):
+                values[i] = (yield from self._gen_expr(a)) if a.calls else self.eval_expr(a)
+            frame = Frame(fn, values)
+        else:
+            frame = self._frame(node)
+        if frame.fn.leaf:
+            return self._run_leaf(frame)
+        return (yield frame)
+
+    def _gen_builtin(self, node):
+        native = node.builtin
+        if len(node.args) != native.arity:
+            raise RuntimeErrorEx(f"Arg count mismatch for {node.name}")
+        return native.fn(*(yield from self._gen_values(node.args)))
+
+    # --------------- memoization ---------------
+    # With memoize on, calls to pure functions (see memo.py) and to ones
+    # marked `#pragma pure` go through a cache of results per argument tuple.
+    # It is wired in by replacing the call and fff hooks on the instance, so
+    # the interpreter pays nothing for it when it is off.
+    def _init_memo(self):
+        # FuncDef -> its Memo, or None if it isn't pure with the functions
+        # bound right now
+        self._memo_of = {}
+        # name -> the FuncDefs whose entry in _memo_of looked the name up, and
+        # so only holds while its binding does (None: any name)
+        self._dependents = {}
+        # FuncDef -> local_callees(), which only depends on the node
+        self._callees = {}
+        self._plain_run_leaf = self._run_leaf
+        self._plain_gen_body = self._gen_body
+        self._run_leaf = self._memo_run_leaf
+        self._gen_body = self._memo_gen_body
+        self._stmt_handlers[FuncDef] = self._memo_funcdef
+
+    def _memo_funcdef(self, node):
+        if self.functions.get(node.name) is not node:
+            self._rebound(node.name)
+        self.functions[node.name] = node
+
+    def _rebound(self, name):
+        # calls to `name` may now run different code (or run at all): forget
+        # what was decided, and cached, for the functions that can reach it
+        memo_of = self._memo_of
+        memos = self.memos
+        for key in (name, None):
+            for fn in self._dependents.pop(key, ()):
+                memo_of.pop(fn, None)
+                memo = memos.get(fn)
+                if memo is not None:
+                    memo.clear()
+
+    def _memo(self, fn):
+        memo = self._memo_of.get(fn, MISSING)
+        if memo is MISSING:
+            memo = None
+            names = set()
+            if self._only_pure(fn, names):
+                memo = self.memos.get(fn)
+                if memo is None:
+                    memo = self.memos[fn] = Memo(fn, self.memo_size, self.memo_policy)
+            self._memo_of[fn] = memo
+            dependents = self._dependents
+            for name in names:
+                dependents.setdefault(name, set()).add(fn)
+        return memo
+
+    def _only_pure(self, fn, names):
+        # fn and every function it can reach through the current bindings
+        # have pure bodies, or are reached through one that says it is.
+        # `names` gets the names looked up on the way (None when a function
+        # says it is pure but its body can't tell what it calls).
+        seen = {(fn, False)}
+        todo = [(fn, False)]
+        while todo:
+            f, trusted = todo.pop()
+            trusted = trusted or "pure" in f.pragmas
+            callees = self._callees.get(f, MISSING)
+            if callees is MISSING:
+                callees = self._callees[f] = local_callees(f)
+            if callees is None:
+                if not trusted:
+                    return False
+                names.add(None)
+                continue
+            for name in callees:
+                names.add(name)
+                g = self.functions.get(name) or self._lazy_function(name)
+                if g is None:
+                    native = BUILTINS.get(name)
+                    if native is not None and native.pure or trusted:
+                        continue
+                    return False
+                if (g, trusted) not in seen:
+                    seen.add((g, trusted))
+                    todo.append((g, trusted))
+        return True
+
+    def _memo_run_leaf(self, frame):
+        memo = self._memo(frame.fn)
+        if memo is None:
+            return self._plain_run_leaf(frame)
+        key = memo_key(frame.values, memo.nargs)
+        v = memo.get(key)
+        if v is MISSING:
+            v = self._plain_run_leaf(frame)
+            memo.put(key, v)
+        return v
+
+    def _memo_gen_body(self, frame):
+        memo = self._memo(frame.fn)
+        if memo is None:
+            return self._plain_gen_body(frame)
+        return self._memo_gen(memo, frame)
+
+    def _memo_gen(self, memo, frame):
+        key = memo_key(frame.values, memo.nargs)
+        v = memo.get(key)
+        if v is MISSING:
+            yield from self._plain_gen_body(frame)
+            memo.put(key, frame.result)
+        else:
+            frame.result = v
+
+    def memo_report(self):
+        out = [f"[Damavand memo] {len(self.memos)} function(s) memoized, "
+               f"size {self.memo_size}, {self.memo_policy}"]
+        if self.memos:
+            out.append(f"{'':<28}{'hits':>10}{'misses':>10}{'hit %':>8}"
+                       f"{'evicted':>10}{'entries':>10}")
+        for fn, m in sorted(self.memos.items(), key=lambda kv: kv[1].hits, reverse=True):
+            calls = m.hits + m.misses
+            rate = m.hits / calls * 100 if calls else 0.0
+            label = f"{fn.name} (line {fn.line})"
+            out.append(f"  {label:<26}{m.hits:>10}{m.misses:>10}{rate:7.1f}%"
+                       f"{m.evictions:>10}{len(m.entries):>10}")
+        return "\n".join(out)
+
+    # --------------- generator versions ---------------
+    def _gen_stmt(self, node):
+        return self._gen_stmt_handlers[node.__class__](node)
+
+    def _gen_expr(self, node):
+        return self._gen_expr_handlers[node.__class__](node)
+
+    def _gen_block(self, stmts):
+        exec_stmt = self.exec_stmt
+        gen_stmt = self._gen_stmt
+        for s in stmts:
+            if ((yield from gen_stmt(s)) if s.calls else exec_stmt(s)) is RETURNED:
+                return RETURNED
+
+    def _gen_if(self, node):
+        cond = node.cond
+        c = (yield from self._gen_expr(cond)) if cond.calls else self.eval_expr(cond)
+        exec_stmt = self.exec_stmt
+        gen_stmt = self._gen_stmt
+        for s in node.then_branch if c else node.else_branch:
+            if ((yield from gen_stmt(s)) if s.calls else exec_stmt(s)) is RETURNED:
+                return RETURNED
+
+    def _gen_while(self, node):
+        cond = node.cond
+        body = node.body
+        exec_stmt = self.exec_stmt
+        gen_stmt = self._gen_stmt
+        while (yield from self._gen_expr(cond)) if cond.calls else self.eval_expr(cond):
+            for s in body:
+                if ((yield from gen_stmt(s)) if s.calls else exec_stmt(s)) is RETURNED:
+                    return RETURNED
+
+    def _gen_print(self, node):
+        self._write((yield from self._gen_expr(node.expr)))
+
+    def _gen_assign(self, node):
+        self._store(node, (yield from self._gen_expr(node.expr)))
+
+    def _gen_return(self, node):
+        self.frame.result = yield from self._gen_expr(node.expr)
+        return RETURNED
+
+    def _gen_import(self, node):
+        importing = self.importing
+        path = find(node.path, importing[-1] if importing else None)
+        if path in self.imported:
+            return
+        if path in importing:
+            raise cycle_error(importing, path)
+        module = self.modules.load(path)
+        functions = self.functions
+        lazy = self.lazy
+        memoize = self.memoize
+        for name in module.functions:
+            functions.pop(name, None)
+            lazy[name] = module
+            if memoize:
+                self._rebound(name)
+        self.bind_builtin_names(module, module.functions)
+        program = resolve(Program(module.statements()), self._shadowed(), self.preempt)
+        exec_stmt = self.exec_stmt
+        gen_stmt = self._gen_stmt
+        importing.append(path)
         try:
-            self.globals.update(local)
-            for s in fn.body:
-                self.exec_stmt(s)
+            for s in program.statements:
+                if s.calls:
+                    yield from gen_stmt(s)
+                else:
+                    exec_stmt(s)
         finally:
-            self.globals = saved
+            importing.pop()
+        self.imported.add(path)
+
+    def _gen_binary(self, node):
+        fn = node.fn
+        if fn is None:
+            raise RuntimeErrorEx(f"Unknown op {node.op}")
+        left, right = node.left, node.right
+        if not left.calls:
+            l = self.eval_expr(left)
+        elif left.__class__ is Call and not left.nested and not left.builtin:
+            frame = self._frame(left)
+            l = self._run_leaf(frame) if frame.fn.leaf else (yield frame)
+        else:
+            l = yield from self._gen_expr(left)
+        if not right.calls:
+            r = self.eval_expr(right)
+        elif right.__class__ is Call and not right.nested and not right.builtin:
+            frame = self._frame(right)
+            r = self._run_leaf(frame) if frame.fn.leaf else (yield frame)
+        else:
+            r = yield from self._gen_expr(right)
+        return fn(l, r)
+
+    def _gen_values(self, exprs):
+        values = []
+        for e in exprs:
+            values.append((yield from self._gen_expr(e)) if e.calls else self.eval_expr(e))
+        return values
+
+    def _gen_index(self, node):
+        target, i = yield from self._gen_values((node.target, node.index))
+        return index(target, i)
+
+    def _gen_array(self, node):
+        return make_array((yield from self._gen_values(node.items)))
+
+    def _gen_unary(self, node):
+        fn = node.fn
+        if fn is None:
+            raise RuntimeErrorEx(f"Unknown unary {node.op}")
+        return fn((yield from self._gen_expr(node.expr)))
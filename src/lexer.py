@@ -1,6 +1,25 @@
 import re
+import sys
+
+# ---------------- token kinds ----------------
+(
+    EOF, NUMBER, STRING, ID, OP,
+    LPAREN, RPAREN, LBRACE, RBRACE, COMMA, SEMICOLON,
+    FFF, IF, ELSE, WHILE, PRINT, BOOLEAN, RETURN, PRAGMA,
+    LBRACKET, RBRACKET, IMPORT,
+) = range(22)
+
+TOKEN_NAMES = [
+    "EOF", "NUMBER", "STRING", "ID", "OP",
+    "LPAREN", "RPAREN", "LBRACE", "RBRACE", "COMMA", "SEMICOLON",
+    "FFF", "IF", "ELSE", "WHILE", "PRINT", "BOOLEAN", "RETURN", "PRAGMA",
+    "LBRACKET", "RBRACKET", "IMPORT",
+]
+
 
 class Token:
+    __slots__ = ("type", "value", "line", "col")
+
     def __init__(self, type_, value, line, col):
         self.type = type_
         self.value = value
@@ -8,79 +27,172 @@ class Token:
         self.col = col
 
     def __repr__(self):
-        return f"Token({self.type}, {self.value}, {self.line}:{self.col})"
+        return f"Token({TOKEN_NAMES[self.type]}, {self.value}, {self.line}:{self.col})"
 
 
 class Lexer:
     KEYWORDS = {
-        "fff": "FFF",
-        "if": "IF",
-        "else": "ELSE",
-        "while": "WHILE",
-        "print": "PRINT",
-        "true": "TRUE",
-        "false": "FALSE",
+        "fff": FFF,
+        "if": IF,
+        "else": ELSE,
+        "while": WHILE,
+        "print": PRINT,
+        "true": BOOLEAN,
+        "false": BOOLEAN,
+        "return": RETURN,
+        "import": IMPORT,
     }
 
+    # Whitespace (newlines included) is not a token of its own: the scanner
+    # swallows it in front of the next token, so it never costs a match.
     TOKEN_SPEC = [
+        # `#pragma NAME`: a comment the parser gets to see, when it is on a
+        # line of its own right before an fff (see _scan)
+        ("PRAGMA",   r"#pragma[ \t]+\w+.*"),
         ("COMMENT",  r"#.*"),
-        ("NUMBER",   r"\d+(\.\d+)?"),
-        ("STRING",   r"\"([^\"\\]|\\.)*\"|'([^'\\]|\\.)*'"),
+        ("NUMBER",   r"\d+(?:\.\d+)?"),
+        ("STRING",   r"\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'"),
         ("ID",       r"[A-Za-z_][A-Za-z0-9_]*"),
         ("OP",       r"==|!=|<=|>=|[+\-*/<>=!]"),
         ("LPAREN",   r"\("),
         ("RPAREN",   r"\)"),
         ("LBRACE",   r"\{"),
         ("RBRACE",   r"\}"),
+        ("LBRACKET", r"\["),
+        ("RBRACKET", r"\]"),
         ("COMMA",    r","),
         ("SEMICOLON",r";"),
-        ("NEWLINE",  r"\n"),
-        ("SKIP",     r"[ \t\r]+"),
+        ("END",      r"\Z"),
         ("MISMATCH", r"."),
     ]
+    WHITESPACE = r"[ \t\r\n]*"
+
+    # compiled once; group 1 is the leading whitespace, group i + 2 is
+    # TOKEN_SPEC[i], so `lastindex` identifies the token without a string
+    SCANNER = re.compile(
+        f"({WHITESPACE})(?:"
+        + "|".join(f"({pattern})" for _, pattern in TOKEN_SPEC)
+        + ")"
+    )
+    GROUP_NAMES = [None, None] + [name for name, _ in TOKEN_SPEC]
+    GROUP_KINDS = [None, None] + [
+        TOKEN_NAMES.index(name) if name in TOKEN_NAMES else None
+        for name, _ in TOKEN_SPEC
+    ]
+
+    # when streaming, a match this close to the end of a chunk may still grow
+    # once the next chunk arrives ("12" + ".5", "=" + "=", an identifier...)
+    LOOKAHEAD = 2
 
-    def __init__(self, code):
+    def __init__(self, code, line=1):
         self.code = code
+        # line number of the first line of `code`, for sources that are a
+        # slice of a bigger file
+        self.line = line
 
     def tokenize(self):
-        regex = "|".join(f"(?P<{name}>{pattern})" for name, pattern in self.TOKEN_SPEC)
-        tokens = []
-        line_num = 1
-        line_start = 0
-        for mo in re.finditer(regex, self.code):
-            kind = mo.lastgroup
-            value = mo.group()
-            col = mo.start() - line_start + 1
-
-            if kind == "NEWLINE":
-                line_num += 1
-                line_start = mo.end()
-                continue
-            if kind in ("SKIP", "COMMENT"):
-                continue
-            if kind == "MISMATCH":
-                raise SyntaxError(f"Unexpected character {value!r} at {line_num}:{col}")
-
-            if kind == "ID":
-                ttype = self.KEYWORDS.get(value, "ID")
-                if ttype == "TRUE":
-                    tokens.append(Token("BOOLEAN", True, line_num, col))
-                elif ttype == "FALSE":
-                    tokens.append(Token("BOOLEAN", False, line_num, col))
-                else:
-                    tokens.append(Token(ttype, value, line_num, col))
-            elif kind == "NUMBER":
-                val = float(value) if "." in value else int(value)
-                tokens.append(Token("NUMBER", val, line_num, col))
-            elif kind == "STRING":
-                # unescape quotes/newlines minimally
-                if value[0] == '"':
-                    inner = value[1:-1].encode('utf-8').decode('unicode_escape')
+        return list(self.iter_tokens())
+
+    def iter_tokens(self):
+        return self._scan((self.code,))
+
+    @classmethod
+    def stream(cls, f, chunk_size=1 << 16):
+        # tokens from a text file object, read chunk by chunk
+        return cls(None)._scan(iter(lambda: f.read(chunk_size), ""))
+
+    def _scan(self, chunks):
+        scanner = self.SCANNER
+        names = self.GROUP_NAMES
+        kinds = self.GROUP_KINDS
+        keywords = self.KEYWORDS
+        margin = self.LOOKAHEAD
+        intern = sys.intern
+        line_num = self.line
+        line_start = 0      # absolute offset of the current line
+        base = 0            # absolute offset of buf[0]
+        # pragmas on lines of their own, held back until an fff follows
+        # right after (comments aside), and where the last of them ends
+        pending = []
+        after = -1
+        chunks = iter(chunks)
+        buf = next(chunks, None) or ""
+        while True:
+            chunk = next(chunks, None)
+            more = chunk is not None
+            safe_end = len(buf) - margin
+            consumed = len(buf)
+            count = buf.count
+            for mo in scanner.finditer(buf):
+                group = mo.lastindex
+                kind = kinds[group]
+                if more and (mo.end() > safe_end
+                             or kind is None and names[group] == "MISMATCH"
+                             and mo.group(group) in "'\""):
+                    # possibly cut off by the chunk boundary (a quote may be
+                    # the start of a string that ends in the next chunk)
+                    consumed = mo.start()
+                    break
+                start = mo.end(1)
+                newlines = count("\n", mo.start(), start)
+                if newlines:
+                    line_num += newlines
+                    line_start = base + buf.rfind("\n", 0, start) + 1
+                col = base + start - line_start + 1
+
+                if kind == ID:
+                    value = intern(mo.group(group))
+                    kw = keywords.get(value)
+                    if kw is None:
+                        yield Token(ID, value, line_num, col)
+                    elif kw == BOOLEAN:
+                        yield Token(BOOLEAN, value == "true", line_num, col)
+                    else:
+                        if kw == FFF and pending:
+                            if base + mo.start() == after:
+                                yield from pending
+                            pending = []
+                        yield Token(kw, value, line_num, col)
+                elif kind == NUMBER:
+                    value = mo.group(group)
+                    val = float(value) if "." in value else int(value)
+                    yield Token(NUMBER, val, line_num, col)
+                elif kind == STRING:
+                    raw = mo.group(group)
+                    inner = raw[1:-1]
+                    # the round trip also re-decodes non-ASCII text, so only
+                    # plain ASCII without escapes can skip it
+                    if "\\" in inner or not inner.isascii():
+                        inner = inner.encode('utf-8').decode('unicode_escape')
+                    yield Token(STRING, inner, line_num, col)
+                    newlines = raw.count("\n")
+                    if newlines:
+                        # a string spanning lines moves the position too
+                        line_num += newlines
+                        line_start = base + mo.start(group) + raw.rfind("\n") + 1
+                elif kind == PRAGMA:
+                    # anywhere else it stays the comment it looks like
+                    at = base + mo.start()
+                    if newlines or at == 0:
+                        if at != after:
+                            pending = []
+                        pending.append(Token(PRAGMA, mo.group(group), line_num, col))
+                        after = base + mo.end()
+                elif kind is not None:
+                    yield Token(kind, mo.group(group), line_num, col)
                 else:
-                    inner = value[1:-1].encode('utf-8').decode('unicode_escape')
-                tokens.append(Token("STRING", inner, line_num, col))
-            else:
-                tokens.append(Token(kind, value, line_num, col))
+                    name = names[group]
+                    if name == "END":
+                        break
+                    if name == "MISMATCH":
+                        raise SyntaxError(f"Unexpected character {mo.group(group)!r} "
+                                          f"at {line_num}:{col}")
+                    # COMMENT
+                    if pending and base + mo.start() == after:
+                        after = base + mo.end()
+            if not more:
+                break
+            buf = buf[consumed:] + chunk
+            base += consumed
 
-        tokens.append(Token("EOF", None, line_num, 1))
-        return tokens
+        yield Token(EOF, None, line_num, 1)
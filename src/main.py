@@ -1,21 +1,267 @@
+import os
 import sys
+import argparse
 from .lexer import Lexer
 from .parser import Parser, ParserError
 from .interpreter import Interpreter, RuntimeErrorEx
+from .compiler import compile_program, CompileError
+from .vm import VM
+from .pycodegen import generate_python, compile_python, PyCodeRunner
+from .optimizer import optimize
+from .cache import ProgramCache, default_cache_dir
+from .soa import TokenArrays, AstArrays
+from .parallel import parse_parallel
+from .profiler import ProfilingInterpreter
+from .memo import POLICIES, DEFAULT_SIZE
+from .arrays import ArrayError
+from .output import SINKS, make_sink
+from .image import ImageError, load_image, save_image
+from .natives import NativeError
+from .modules import ModuleCache, ModuleError, link
 
-def main(filename):
+# errors reported as "[Damavand Error] ..." rather than a traceback
+ERRORS = (SyntaxError, RuntimeErrorEx, CompileError, ArrayError, ImageError, NativeError,
+          ModuleError)
+
+
+def error_text(e):
+    # the report for an error a program ran into; anything outside ERRORS
+    # gets its Python type name too
+    if isinstance(e, ParserError):
+        return "\n".join(f"[Damavand Error] {err}" for err in e.errors)
+    if isinstance(e, ERRORS):
+        return f"[Damavand Error] {e}"
+    return f"[Damavand Error] {type(e).__name__}: {e}"
+
+
+# `path` is the file the program came from, which its imports are relative
+# to; `modules` the ModuleCache they go through (modules.MODULES if None)
+def run_tree(ast, out=None, interp=None, path=None, modules=None):
+    (interp or Interpreter(out=out, modules=modules)).run(ast, path)
+
+def run_vm(ast, out=None, path=None, modules=None):
+    VM(out).run(compile_program(link(ast, path, modules)))
+
+def run_pycode(ast, out=None, path=None, modules=None):
+    PyCodeRunner(out).run(compile_python(link(ast, path, modules)))
+
+def run_profiled(ast, trace_path=None, interp=None, path=None):
+    if interp is None:
+        interp = ProfilingInterpreter(trace=trace_path is not None)
+    try:
+        interp.run(ast, path)
+    finally:
+        interp.out.flush()
+        print(interp.report(), file=sys.stderr)
+        if trace_path is not None:
+            interp.write_trace(trace_path)
+
+ENGINES = {
+    "tree": run_tree,
+    "vm": run_vm,
+    "pycode": run_pycode,
+}
+
+def load_program(filename, use_cache=True, cache_dir=None, parse_jobs=1):
     with open(filename, "r", encoding="utf-8") as f:
         code = f.read()
+    cache = None
+    if use_cache:
+        cache = ProgramCache(cache_dir or default_cache_dir(filename))
+        ast = cache.load(code)
+        if ast is not None:
+            return ast
+    if parse_jobs != 1:
+        ast = parse_parallel(code, parse_jobs)
+    else:
+        ast = Parser(Lexer(code).tokenize()).parse()
+    if cache is not None:
+        cache.store(code, ast)
+    return ast
+
+def run_streaming(filename, interp=None):
+    # lex, parse and execute one top-level statement at a time; syntax errors
+    # surface when the parser reaches them, after earlier statements ran
+    with open(filename, "r", encoding="utf-8") as f:
+        (interp or Interpreter()).run_stream(Parser(Lexer.stream(f)).statements(), filename)
 
+def run_compact(filename, interp=None):
+    # token stream and AST held in typed arrays; nodes are materialized one
+    # top-level statement at a time
+    with open(filename, "r", encoding="utf-8") as f:
+        code = f.read()
+    tokens = TokenArrays(Lexer(code).iter_tokens())
+    del code
+    ast = AstArrays(Parser(tokens).statements())
+    del tokens
+    (interp or Interpreter()).run_stream(ast.statements(), filename)
+
+def check_program(filename):
+    # parse only; every syntax error is reported, not just the first
+    with open(filename, "r", encoding="utf-8") as f:
+        Parser(Lexer(f.read()).tokenize()).parse()
+
+def main(filename, engine="tree", emit_python=False, optimize_ast=False,
+         use_cache=True, cache_dir=None, stream=False, compact=False, check=False,
+         parse_jobs=1, profile=False, profile_trace=None, memoize=False,
+         memo_size=DEFAULT_SIZE, memo_policy="lru", memo_stats=False,
+         output="stdout", flush_lines=1024, image=None, save_image_to=None):
+    out = make_sink(output, flush_lines)
+    # the tree engine's interpreter, when options have to reach it
+    interp = None
+    modules = None
+    if not use_cache or cache_dir is not None:
+        modules = ModuleCache(use_cache, cache_dir)
+    options = dict(memoize=memoize, memo_size=memo_size, memo_policy=memo_policy, out=out,
+                   modules=modules)
+    if profile or profile_trace:
+        interp = ProfilingInterpreter(trace=profile_trace is not None, **options)
+    elif engine == "tree":
+        interp = Interpreter(**options)
     try:
-        tokens = Lexer(code).tokenize()
-        ast = Parser(tokens).parse()
-        Interpreter().run(ast)
-    except (SyntaxError, ParserError, RuntimeErrorEx) as e:
-        print(f"[Damavand Error] {e}", file=sys.stderr)
+        try:
+            if check:
+                check_program(filename)
+                return 0
+            if image is not None:
+                load_image(interp, image)
+            if stream:
+                run_streaming(filename, interp)
+            elif compact:
+                run_compact(filename, interp)
+            else:
+                ast = load_program(filename, use_cache, cache_dir, parse_jobs)
+                if optimize_ast:
+                    ast, opt = optimize(ast)
+                    print(f"[Damavand -O] removed {opt.removed} nodes "
+                          f"(folded {opt.folded}, pruned {opt.pruned}, hoisted {opt.hoisted})",
+                          file=sys.stderr)
+                if emit_python:
+                    print(generate_python(link(ast, filename, modules)), end="")
+                    return 0
+                if profile or profile_trace:
+                    run_profiled(ast, profile_trace, interp, filename)
+                elif interp is not None:
+                    run_tree(ast, interp=interp, path=filename)
+                else:
+                    ENGINES[engine](ast, out, path=filename, modules=modules)
+            if save_image_to is not None:
+                try:
+                    save_image(interp, save_image_to)
+                except OSError as e:
+                    raise ImageError(f"Cannot write image {save_image_to}: {e}")
+        finally:
+            # the program's output goes before any error or report
+            out.close()
+    except (ParserError,) + ERRORS as e:
+        print(error_text(e), file=sys.stderr)
+        return 1
+    finally:
+        if memo_stats and interp is not None:
+            print(interp.memo_report(), file=sys.stderr)
+    return 0
+
+def parse_args(argv):
+    ap = argparse.ArgumentParser(prog="python -m src.main")
+    ap.add_argument("programs", nargs="+", metavar="program",
+                    help="program.dam; several programs, directories or glob patterns "
+                         "run them all in batch mode")
+    ap.add_argument("--engine", choices=sorted(ENGINES), default="tree",
+                    help="tree-walking interpreter, bytecode VM or Python code objects "
+                         "(default: tree)")
+    ap.add_argument("--emit-python", action="store_true",
+                    help="print the generated Python code instead of running")
+    ap.add_argument("-O", dest="optimize", action="store_true",
+                    help="fold constants, prune dead branches and hoist loop invariants")
+    ap.add_argument("--no-cache", dest="use_cache", action="store_false",
+                    help="always re-parse, don't read or write the program cache")
+    ap.add_argument("--cache-dir", metavar="DIR",
+                    help="where to keep parsed programs (default: __damcache__ "
+                         "next to the program)")
+    ap.add_argument("--stream", action="store_true",
+                    help="read the program in chunks and run each top-level statement "
+                         "as soon as it is parsed (tree engine only)")
+    ap.add_argument("--compact", action="store_true",
+                    help="keep tokens and the AST in typed arrays instead of objects "
+                         "(tree engine only)")
+    ap.add_argument("--check", action="store_true",
+                    help="only check the syntax, reporting every error found")
+    ap.add_argument("--parse-jobs", type=int, default=1, metavar="N",
+                    help="lex and parse large programs on N processes "
+                         "(0: one per CPU; default: 1)")
+    ap.add_argument("--profile", action="store_true",
+                    help="time every line, function and loop and print the hotspots "
+                         "(tree engine only)")
+    ap.add_argument("--profile-trace", metavar="FILE",
+                    help="with --profile, also write calls and loops as a Chrome trace "
+                         "(opens in chrome://tracing, Perfetto or speedscope)")
+    ap.add_argument("--memoize", action="store_true",
+                    help="cache the results of pure functions and of ones marked "
+                         "#pragma pure (tree engine only)")
+    ap.add_argument("--memo-size", type=int, default=DEFAULT_SIZE, metavar="N",
+                    help=f"with --memoize, entries kept per function (default: {DEFAULT_SIZE})")
+    ap.add_argument("--memo-policy", choices=POLICIES, default="lru",
+                    help="with --memoize, which entry a full cache drops: the least "
+                         "recently used or the oldest (default: lru)")
+    ap.add_argument("--memo-stats", action="store_true",
+                    help="with --memoize, print cache hits and misses per function")
+    ap.add_argument("--image", metavar="FILE",
+                    help="start from the functions and globals saved in FILE by "
+                         "--save-image instead of empty (tree engine only)")
+    ap.add_argument("--save-image", metavar="FILE",
+                    help="after running the program, save its functions and globals "
+                         "to FILE (tree engine only)")
+    ap.add_argument("--jobs", type=int, metavar="N",
+                    help="batch mode: run the programs on N worker processes, printing "
+                         "each one's output in order and then a summary "
+                         "(default, or 0: one per CPU)")
+    ap.add_argument("--output", choices=SINKS, default="stdout",
+                    help="how printed lines are written: through sys.stdout one at a "
+                         "time, in batches of --flush-lines, or straight to file "
+                         "descriptor 1 from a large buffer (default: stdout)")
+    ap.add_argument("--flush-lines", type=int, default=1024, metavar="N",
+                    help="with --output lines, lines per batch (default: 1024)")
+    args = ap.parse_args(argv)
+    for flag in ("stream", "compact"):
+        if getattr(args, flag) and (args.engine != "tree" or args.optimize or args.emit_python
+                                    or args.profile or args.profile_trace):
+            ap.error(f"--{flag} only works with the tree engine, without -O, --emit-python "
+                     f"or --profile")
+    if (args.profile or args.profile_trace) and (args.engine != "tree" or args.emit_python):
+        ap.error("--profile only works with the tree engine, without --emit-python")
+    if args.memoize and (args.engine != "tree" or args.emit_python):
+        ap.error("--memoize only works with the tree engine, without --emit-python")
+    if (args.image or args.save_image) and (args.engine != "tree" or args.emit_python
+                                            or args.check):
+        ap.error("--image and --save-image only work with the tree engine, without "
+                 "--emit-python or --check")
+    if args.memo_stats and not args.memoize:
+        ap.error("--memo-stats needs --memoize")
+    if args.flush_lines < 1:
+        ap.error("--flush-lines must be at least 1")
+    args.batch = (args.jobs is not None or len(args.programs) > 1
+                  or os.path.isdir(args.programs[0]) or any(c in args.programs[0] for c in "*?["))
+    if args.batch:
+        for flag in ("emit_python", "stream", "compact", "check", "profile", "profile_trace",
+                     "memo_stats", "image", "save_image"):
+            if getattr(args, flag):
+                ap.error(f"--{flag.replace('_', '-')} doesn't work in batch mode")
+        if args.output != "stdout":
+            ap.error("--output doesn't work in batch mode")
+        if args.jobs is not None and args.jobs < 0:
+            ap.error("--jobs must be 0 or more")
+    return args
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python src/main.py program.dam")
-        sys.exit(1)
-    main(sys.argv[1])
+    args = parse_args(sys.argv[1:])
+    if args.batch:
+        from .batch import main as run_batch
+        sys.exit(run_batch(args.programs, args.jobs, engine=args.engine,
+                           optimize_ast=args.optimize, use_cache=args.use_cache,
+                           cache_dir=args.cache_dir, memoize=args.memoize,
+                           memo_size=args.memo_size, memo_policy=args.memo_policy))
+    sys.exit(main(args.programs[0], args.engine, args.emit_python, args.optimize,
+                  args.use_cache, args.cache_dir, args.stream, args.compact, args.check,
+                  args.parse_jobs, args.profile, args.profile_trace, args.memoize,
+                  args.memo_size, args.memo_policy, args.memo_stats, args.output,
+                  args.flush_lines, args.image, args.save_image))
@@ -0,0 +1,149 @@
+from collections import OrderedDict
+
+from .dam_ast import *
+
+# Memoization of pure functions for the tree engine.
+#
+# A function is pure when its result depends only on its arguments: it prints
+# nothing, defines no functions, reads no name it hasn't set itself first
+# (those would come from its callers' frames or the globals) and calls only
+# pure functions or builtins registered as pure (natives.py). Writes never
+# leave a call, so they don't count. Functions are looked up by name when
+# called, so the "calls only pure functions" part depends on what the names
+# are bound to at the time; local_callees() only checks the body and the
+# interpreter does the rest.
+
+POLICIES = ("lru", "fifo")
+DEFAULT_SIZE = 1024
+
+
+class _Impure(Exception):
+    pass
+
+
+def local_callees(fn):
+    # the names fn calls if its own body is pure, else None
+    callees = set()
+    try:
+        _block(fn.body, set(fn.params), callees)
+    except _Impure:
+        return None
+    return callees
+
+
+def _block(stmts, assigned, callees):
+    # `assigned`: the names certainly set at this point; grows as it goes
+    for s in stmts:
+        _stmt(s, assigned, callees)
+    return assigned
+
+
+def _stmt(node, assigned, callees):
+    cls = node.__class__
+    if cls is Assign:
+        _expr(node.expr, assigned, callees)
+        assigned.add(node.name)
+    elif cls is If:
+        _expr(node.cond, assigned, callees)
+        then = _block(node.then_branch, set(assigned), callees)
+        assigned |= then & _block(node.else_branch, set(assigned), callees)
+    elif cls is While:
+        _expr(node.cond, assigned, callees)
+        # the body may not run at all
+        _block(node.body, set(assigned), callees)
+    elif cls is Return:
+        if node.expr is not None:
+            _expr(node.expr, assigned, callees)
+    elif cls is Call:
+        _expr(node, assigned, callees)
+    else:
+        # Print, FuncDef
+        raise _Impure
+
+
+def _expr(node, assigned, callees):
+    cls = node.__class__
+    if cls is Literal:
+        return
+    if cls is Var:
+        if node.name not in assigned:
+            raise _Impure
+    elif cls is BinaryOp:
+        _expr(node.left, assigned, callees)
+        _expr(node.right, assigned, callees)
+    elif cls is UnaryOp:
+        _expr(node.expr, assigned, callees)
+    elif cls is Call:
+        callees.add(node.name)
+        for a in node.args:
+            _expr(a, assigned, callees)
+    elif cls is Index:
+        _expr(node.target, assigned, callees)
+        _expr(node.index, assigned, callees)
+    elif cls is ArrayLiteral:
+        for item in node.items:
+            _expr(item, assigned, callees)
+    elif cls is Hoisted:
+        if node.name not in assigned:
+            raise _Impure
+        _expr(node.expr, assigned, callees)
+    else:
+        raise _Impure
+
+
+MISSING = object()
+
+
+class Memo:
+    # one function's cache: argument tuple -> result, at most `size` entries
+    __slots__ = ("fn", "nargs", "size", "lru", "entries", "hits", "misses", "evictions")
+
+    def __init__(self, fn, size=DEFAULT_SIZE, policy="lru"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown eviction policy {policy!r}")
+        self.fn = fn
+        # parameters take the first frame slots, one per distinct name
+        self.nargs = len(set(fn.params))
+        self.size = size
+        # "lru" drops the least recently used entry, "fifo" the oldest one
+        self.lru = policy == "lru"
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        try:
+            v = self.entries.get(key, MISSING)
+        except TypeError:
+            # an array argument: arrays aren't hashable, so never cached
+            v = MISSING
+        if v is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            if self.lru:
+                self.entries.move_to_end(key)
+        return v
+
+    def put(self, key, value):
+        if self.size <= 0:
+            return
+        entries = self.entries
+        try:
+            entries[key] = value
+        except TypeError:
+            return
+        if len(entries) > self.size:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+
+def memo_key(values, n):
+    # the types keep 1, 1.0 and true apart, which are equal as dict keys but
+    # don't behave the same
+    args = values[:n]
+    return (*args, *map(type, args))
@@ -0,0 +1,192 @@
+import os
+import pickle
+from collections import Counter
+
+from .lexer import Lexer
+from .parser import Parser, ParserError
+from .dam_ast import Program, FuncDef, Import
+from .resolver import resolve_statement, defined_names
+from .cache import ProgramCache, cache_key, default_cache_dir
+
+# Modules: `import "lib.dam"` runs another file's code in the importing
+# program, once per run however many files import it. The path is relative
+# to the directory of the file the import is in (the current directory for
+# a program that isn't a file), and ".dam" is added when it has no
+# extension. Importing a file that is still being imported is an error.
+#
+# A module's top-level fffs are defined as of the import, before any of its
+# code runs, and only materialized when first called: the ModuleCache keeps
+# each one as its own pickle, which the Interpreter unpickles and resolves on
+# the first call (Interpreter.lazy), the way images do. The rest of the code
+# is one more pickle, unpickled on each import; every Interpreter gets nodes
+# of its own to resolve and quicken. A fff whose name is defined twice in the
+# module stays in that code, to be defined when its statement runs.
+#
+# The cache is per process and keyed by the module's real path. A changed
+# mtime or size makes it read the file again, and only a changed hash makes
+# it parse it again. Unless told not to, the pickles are also kept on disk
+# with the program cache (cache.py), so a new process doesn't parse either.
+#
+# The tree engine imports as the import statements run. The vm and pycode
+# engines compile whole programs, so they get them with the imports linked
+# in by link(), in the same order.
+
+
+class ModuleError(Exception):
+    pass
+
+
+def _dump(value):
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def split(program):
+    # -> the pickles a Module keeps: {name: pickled FuncDef} for the fffs bound
+    # lazily, and the rest of the statements
+    stmts = program.statements
+    top = Counter(s.name for s in stmts if isinstance(s, FuncDef))
+    again = {name for name, n in top.items() if n > 1}
+    again |= defined_names([s for s in stmts if not isinstance(s, FuncDef)])
+    for s in stmts:
+        if isinstance(s, FuncDef):
+            again |= defined_names(s.body)
+    functions = {}
+    code = []
+    for s in stmts:
+        if isinstance(s, FuncDef) and s.name not in again:
+            functions[s.name] = _dump(s)
+        else:
+            code.append(s)
+    return functions, _dump(code)
+
+
+class _SplitCache(ProgramCache):
+    # split() of the module's source, kept with the parsed programs
+    def path_for(self, source):
+        return os.path.join(self.directory, cache_key(source) + ".damm")
+
+
+class Module:
+    __slots__ = ("path", "stamp", "digest", "functions", "code")
+
+    def __init__(self, path, stamp, digest, functions, code):
+        self.path = path
+        # (mtime, size) and the source hash it was parsed from
+        self.stamp = stamp
+        self.digest = digest
+        # as from split()
+        self.functions = functions
+        self.code = code
+
+    def function(self, name, shadowed=(), preempt=False):
+        # the fff `name`, ready to call; arguments as for resolve_statement()
+        return resolve_statement(pickle.loads(self.functions[name]), shadowed, preempt)
+
+    def raw(self, name):
+        return self.functions[name]
+
+    def statements(self):
+        # a fresh copy of the code, unresolved
+        return pickle.loads(self.code)
+
+    def definitions(self):
+        # the lazily bound fffs as statements, unresolved
+        return [pickle.loads(data) for data in self.functions.values()]
+
+
+class ModuleCache:
+    def __init__(self, use_cache=True, cache_dir=None):
+        # use_cache and cache_dir are for the on-disk program cache
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir
+        self.modules = {}
+        self.parsed = 0
+
+    def load(self, path):
+        # the Module for the file at `path`, a real path as from find()
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            raise ModuleError(f"Cannot import {path}: {e.strerror}")
+        stamp = (st.st_mtime_ns, st.st_size)
+        module = self.modules.get(path)
+        if module is not None and module.stamp == stamp:
+            return module
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                source = f.read()
+        except OSError as e:
+            raise ModuleError(f"Cannot import {path}: {e.strerror}")
+        digest = cache_key(source)
+        if module is not None and module.digest == digest:
+            # touched, not changed
+            module.stamp = stamp
+            return module
+        module = Module(path, stamp, digest, *self._split(path, source))
+        self.modules[path] = module
+        return module
+
+    def _split(self, path, source):
+        cache = None
+        if self.use_cache:
+            cache = _SplitCache(self.cache_dir or default_cache_dir(path))
+            pieces = cache.load(source)
+            if pieces is not None:
+                return pieces
+        try:
+            program = Parser(Lexer(source).tokenize()).parse()
+        except ParserError as e:
+            more = f" (and {len(e.errors) - 1} more)" if len(e.errors) > 1 else ""
+            raise ModuleError(f"In {path}: {e.errors[0]}{more}")
+        self.parsed += 1
+        pieces = split(program)
+        if cache is not None:
+            cache.store(source, pieces)
+        return pieces
+
+
+# the modules of this process
+MODULES = ModuleCache()
+
+
+def find(name, importer=None):
+    # the real path of the module `import name` means in the file `importer`
+    if not os.path.splitext(name)[1]:
+        name += ".dam"
+    base = os.path.dirname(os.path.abspath(importer)) if importer else os.getcwd()
+    return os.path.realpath(os.path.join(base, name))
+
+
+def cycle_error(chain, path):
+    # chain: the files being imported, outermost first; path is among them.
+    # Paths are shown relative to the outermost one's directory.
+    base = os.path.dirname(chain[0])
+    names = [os.path.relpath(p, base) for p in chain[chain.index(path):] + [path]]
+    return ModuleError(f"Import cycle: {' -> '.join(names)}")
+
+
+def link(program, path=None, modules=None):
+    # `program` (from the file `path`) with every import replaced by the
+    # module's fffs and code, each module once, where it is first imported
+    if not any(isinstance(s, Import) for s in program.statements):
+        return program
+    modules = modules or MODULES
+    done = set()
+
+    def expand(stmts, chain):
+        out = []
+        for s in stmts:
+            if not isinstance(s, Import):
+                out.append(s)
+                continue
+            target = find(s.path, chain[-1] if chain else None)
+            if target in chain:
+                raise cycle_error(chain, target)
+            if target in done:
+                continue
+            module = modules.load(target)
+            out += expand(module.definitions() + module.statements(), chain + [target])
+            done.add(target)
+        return out
+
+    return Program(expand(program.statements, [os.path.realpath(path)] if path else []))
@@ -0,0 +1,265 @@
+import math
+import inspect
+
+from .arrays import BUILTINS as ARRAY_BUILTINS, Array, type_name
+from .rope import Rope
+
+# Builtin functions: Python callables that programs call like a fff, each
+# with its parameter count declared when it is registered. The resolver
+# binds a Call to its builtin once (Call.builtin); when no fff of that name
+# exists the interpreter calls the Python function straight on the
+# evaluated arguments, with no frame and no generator, and the call doesn't
+# count as one for the resolver's `calls` flags. A fff of the same name
+# always wins.
+#
+# Embedders add their own with register(), before running programs. Only
+# builtins registered as pure (the same arguments always give the same
+# result, nothing else happens) let --memoize cache their callers.
+
+
+class NativeError(Exception):
+    pass
+
+
+class Native:
+    __slots__ = ("name", "fn", "arity", "pure")
+
+    def __init__(self, name, fn, arity, pure):
+        self.name = name
+        self.fn = fn
+        self.arity = arity
+        self.pure = pure
+
+
+BUILTINS = {}
+
+
+def register(name, fn, arity=None, pure=False):
+    # arity: how many arguments fn takes; worked out from its signature if
+    # not given, which C functions may not have
+    if arity is None:
+        try:
+            arity = len(inspect.signature(fn).parameters)
+        except (TypeError, ValueError):
+            raise TypeError(f"Can't tell how many arguments {name} takes; pass arity")
+    BUILTINS[name] = Native(name, fn, arity, pure)
+    return fn
+
+
+def builtin(name, arity):
+    # the standard builtins below, all pure
+    def add(fn):
+        return register(name, fn, arity, pure=True)
+    return add
+
+
+for _name, _fn in ARRAY_BUILTINS.items():
+    register(_name, _fn, _fn.__code__.co_argcount, pure=True)
+
+
+# --------------- argument checks ---------------
+def _number(name, x):
+    cls = x.__class__
+    if cls is int or cls is float:
+        return x
+    raise NativeError(f"{name}() needs a number, not {type_name(x)}")
+
+
+def _whole(name, x):
+    if x.__class__ is int:
+        return x
+    raise NativeError(f"{name}() needs a whole number, not {type_name(x)}")
+
+
+def _string(name, x):
+    cls = x.__class__
+    if cls is str:
+        return x
+    if cls is Rope:
+        return str(x)
+    raise NativeError(f"{name}() needs a string, not {type_name(x)}")
+
+
+# --------------- math ---------------
+def _math(name, fn):
+    def native(x):
+        try:
+            return fn(_number(name, x))
+        except (ValueError, OverflowError) as e:
+            raise NativeError(f"{name}({x!r}): {e}")
+    register(name, native, 1, pure=True)
+
+
+_math("sqrt", math.sqrt)
+_math("exp", math.exp)
+_math("log", math.log)
+_math("sin", math.sin)
+_math("cos", math.cos)
+_math("tan", math.tan)
+_math("floor", math.floor)
+_math("ceil", math.ceil)
+
+
+@builtin("abs", 1)
+def _abs(x):
+    return abs(_number("abs", x))
+
+
+@builtin("round", 1)
+def _round(x):
+    # to the nearest whole number, halves to even
+    try:
+        return round(_number("round", x))
+    except (ValueError, OverflowError) as e:
+        raise NativeError(f"round({x!r}): {e}")
+
+
+@builtin("pow", 2)
+def _pow(x, y):
+    try:
+        result = _number("pow", x) ** _number("pow", y)
+    except (ZeroDivisionError, OverflowError) as e:
+        raise NativeError(f"pow({x!r}, {y!r}): {e}")
+    # a negative number to a fractional power; there are no complex numbers
+    if isinstance(result, complex):
+        raise NativeError(f"pow({x!r}, {y!r}): math domain error")
+    return result
+
+
+@builtin("mod", 2)
+def _mod(x, y):
+    # the remainder with the sign of y, as in Python
+    if _number("mod", y) == 0:
+        raise NativeError("mod() by zero")
+    return _number("mod", x) % y
+
+
+# --------------- strings ---------------
+@builtin("upper", 1)
+def _upper(s):
+    return _string("upper", s).upper()
+
+
+@builtin("lower", 1)
+def _lower(s):
+    return _string("lower", s).lower()
+
+
+@builtin("trim", 1)
+def _trim(s):
+    return _string("trim", s).strip()
+
+
+@builtin("find", 2)
+def _find(s, sub):
+    # the index of the first sub in s, or -1
+    return _string("find", s).find(_string("find", sub))
+
+
+@builtin("contains", 2)
+def _contains(s, sub):
+    return _string("contains", sub) in _string("contains", s)
+
+
+@builtin("replace", 3)
+def _replace(s, old, new):
+    return _string("replace", s).replace(_string("replace", old), _string("replace", new))
+
+
+@builtin("slice", 3)
+def _slice(s, start, end):
+    # s[start:end]; negative indices count from the end
+    return _string("slice", s)[_whole("slice", start):_whole("slice", end)]
+
+
+@builtin("repeat", 2)
+def _repeat(s, n):
+    return _string("repeat", s) * _whole("repeat", n)
+
+
+@builtin("split", 2)
+def _split(s, sep):
+    s, sep = _string("split", s), _string("split", sep)
+    if not sep:
+        raise NativeError("split() needs a non-empty separator")
+    return Array(tuple(s.split(sep)))
+
+
+@builtin("join", 2)
+def _join(a, sep):
+    if a.__class__ is not Array:
+        raise NativeError(f"join() needs an array, not {type_name(a)}")
+    return _string("join", sep).join(_string("join", v) for v in a.items)
+
+
+@builtin("ord", 1)
+def _ord(c):
+    c = _string("ord", c)
+    if len(c) != 1:
+        raise NativeError(f"ord() needs a single character, not {len(c)}")
+    return ord(c)
+
+
+@builtin("chr", 1)
+def _chr(n):
+    try:
+        return chr(_whole("chr", n))
+    except (ValueError, OverflowError):
+        raise NativeError(f"chr() code point out of range: {n}")
+
+
+# --------------- conversions ---------------
+@builtin("str", 1)
+def _str(x):
+    # what print would show
+    return f"{x}"
+
+
+@builtin("int", 1)
+def _int(x):
+    # numbers are truncated; strings must spell a whole number
+    cls = x.__class__
+    if cls is int:
+        return x
+    if cls is float:
+        try:
+            return int(x)
+        except (ValueError, OverflowError) as e:
+            raise NativeError(f"int({x!r}): {e}")
+    s = _string("int", x)
+    try:
+        return int(s)
+    except ValueError:
+        raise NativeError(f"int() can't read {s!r}")
+
+
+@builtin("num", 1)
+def _num(x):
+    # a string as a number: whole numbers stay ints
+    if x.__class__ is int or x.__class__ is float:
+        return x
+    s = _string("num", x)
+    try:
+        return int(s)
+    except ValueError:
+        pass
+    try:
+        return float(s)
+    except ValueError:
+        raise NativeError(f"num() can't read {s!r}")
+
+
+@builtin("type", 1)
+def _type(x):
+    return type_name(x)
+
+
+@builtin("format", 2)
+def _format(x, spec):
+    # Python's format spec: format(3.14159, ".2f") is "3.14"
+    if x.__class__ is Rope:
+        x = str(x)
+    try:
+        return format(x, _string("format", spec))
+    except (ValueError, TypeError) as e:
+        raise NativeError(f"format({x!r}, {spec!r}): {e}")
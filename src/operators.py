@@ -0,0 +1,11 @@
+import operator
+
+# Operator symbol -> callable. Resolved once onto the AST (or into opcodes)
+# so evaluation never compares operator strings.
+BINARY = {
+    "+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv,
+    "==": operator.eq, "!=": operator.ne, "<": operator.lt, ">": operator.gt,
+    "<=": operator.le, ">=": operator.ge,
+}
+
+UNARY = {"-": operator.neg, "!": operator.not_}
@@ -0,0 +1,240 @@
+from .dam_ast import *
+from .resolver import assigned_names
+from .operators import BINARY as FOLD_BINARY, UNARY as FOLD_UNARY
+
+# don't bake huge values into the tree (same idea as CPython's peephole limit)
+MAX_FOLDED_SIZE = 4096
+
+# a single operator costs about as much as reading the cached value back,
+# so only hoist expressions with at least this many operators
+MIN_HOIST_OPS = 2
+
+# what the names of hoisted values start with; no variable of a program can
+HIDDEN = "$"
+
+
+class Optimizer:
+    def __init__(self):
+        self.folded = 0
+        self.pruned = 0
+        self.hoisted = 0
+        # nodes hoisting adds to keep its values (the Hoisted node and the
+        # `$hN = None` before the loop), left out of optimize()'s `removed`
+        self.added = 0
+        self._hoist_count = 0
+
+    def optimize(self, program: Program):
+        program.statements = self.block(program.statements)
+        return program
+
+    # --------------- statements ---------------
+    def block(self, stmts):
+        out = []
+        for s in stmts:
+            out.extend(self.stmt(s))
+        return out
+
+    def stmt(self, node):
+        # returns the list of statements that replace `node`
+        if isinstance(node, FuncDef):
+            node.body = self.block(node.body)
+        elif isinstance(node, Call):
+            node.args = [self.expr(a) for a in node.args]
+        elif isinstance(node, If):
+            node.cond = self.expr(node.cond)
+            node.then_branch = self.block(node.then_branch)
+            node.else_branch = self.block(node.else_branch)
+            if isinstance(node.cond, Literal):
+                self.pruned += 1
+                return node.then_branch if node.cond.value else node.else_branch
+        elif isinstance(node, While):
+            node.cond = self.expr(node.cond)
+            if isinstance(node.cond, Literal) and not node.cond.value:
+                self.pruned += 1
+                return []
+            node.body = self.block(node.body)
+            return self.hoist(node)
+        elif isinstance(node, Print):
+            node.expr = self.expr(node.expr)
+        elif isinstance(node, Assign):
+            node.expr = self.expr(node.expr)
+        elif isinstance(node, Return):
+            if node.expr is not None:
+                node.expr = self.expr(node.expr)
+        return [node]
+
+    # --------------- expressions ---------------
+    def expr(self, node):
+        if isinstance(node, UnaryOp):
+            node.expr = self.expr(node.expr)
+            if isinstance(node.expr, Literal) and node.op in FOLD_UNARY:
+                return self.fold(node, FOLD_UNARY[node.op], node.expr.value)
+        elif isinstance(node, BinaryOp):
+            node.left = self.expr(node.left)
+            node.right = self.expr(node.right)
+            if (isinstance(node.left, Literal) and isinstance(node.right, Literal)
+                    and node.op in FOLD_BINARY):
+                return self.fold(node, FOLD_BINARY[node.op],
+                                 node.left.value, node.right.value)
+        elif isinstance(node, Call):
+            node.args = [self.expr(a) for a in node.args]
+        elif isinstance(node, Index):
+            node.target = self.expr(node.target)
+            node.index = self.expr(node.index)
+        elif isinstance(node, ArrayLiteral):
+            node.items = [self.expr(item) for item in node.items]
+        return node
+
+    def fold(self, node, fn, *operands):
+        if len(operands) == 2 and too_big(node.op, *operands):
+            return node
+        try:
+            value = fn(*operands)
+        except Exception:
+            # e.g. 1 / 0 or "a" - 1: leave it to fail at run time, as before
+            return node
+        if isinstance(value, str) and len(value) > MAX_FOLDED_SIZE:
+            return node
+        if isinstance(value, int) and value.bit_length() > MAX_FOLDED_SIZE:
+            return node
+        self.folded += 1
+        return Literal(value)
+
+    # --------------- loop-invariant hoisting ---------------
+    def hoist(self, loop):
+        # Calls can't change the caller's variables (their writes are local to
+        # the call), so an expression is invariant when none of its names is
+        # assigned anywhere in the loop.
+        written = set(assigned_names(loop.body))
+        resets = []
+
+        def visit(node):
+            if (isinstance(node, (UnaryOp, BinaryOp, Index, ArrayLiteral))
+                    and self._invariant(node, written)):
+                if count_ops(node) >= MIN_HOIST_OPS:
+                    name = f"{HIDDEN}h{self._hoist_count}"
+                    self._hoist_count += 1
+                    self.hoisted += 1
+                    self.added += 3
+                    resets.append(Assign(name, Literal(None), loop.line))
+                    return Hoisted(node, name)
+                return node
+            if isinstance(node, UnaryOp):
+                node.expr = visit(node.expr)
+            elif isinstance(node, BinaryOp):
+                node.left = visit(node.left)
+                node.right = visit(node.right)
+            elif isinstance(node, Call):
+                node.args = [visit(a) for a in node.args]
+            elif isinstance(node, Index):
+                node.target = visit(node.target)
+                node.index = visit(node.index)
+            elif isinstance(node, ArrayLiteral):
+                node.items = [visit(item) for item in node.items]
+            return node
+
+        loop.cond = visit(loop.cond)
+        for_each_expr(loop.body, visit)
+        return resets + [loop]
+
+    def _invariant(self, node, written):
+        if isinstance(node, Literal):
+            return True
+        if isinstance(node, Var):
+            return node.name not in written
+        if isinstance(node, UnaryOp):
+            return self._invariant(node.expr, written)
+        if isinstance(node, BinaryOp):
+            return self._invariant(node.left, written) and self._invariant(node.right, written)
+        if isinstance(node, Index):
+            return self._invariant(node.target, written) and self._invariant(node.index, written)
+        if isinstance(node, ArrayLiteral):
+            return all(self._invariant(item, written) for item in node.items)
+        # calls may print; hoisted values are already handled
+        return False
+
+
+def for_each_expr(stmts, fn):
+    # replace every top-level expression of the statements (not inside
+    # nested fff bodies, which run in their own scope) with fn(expr)
+    for s in stmts:
+        if isinstance(s, Call):
+            s.args = [fn(a) for a in s.args]
+        elif isinstance(s, If):
+            s.cond = fn(s.cond)
+            for_each_expr(s.then_branch, fn)
+            for_each_expr(s.else_branch, fn)
+        elif isinstance(s, While):
+            s.cond = fn(s.cond)
+            for_each_expr(s.body, fn)
+        elif isinstance(s, Print):
+            s.expr = fn(s.expr)
+        elif isinstance(s, Assign):
+            s.expr = fn(s.expr)
+        elif isinstance(s, Return):
+            if s.expr is not None:
+                s.expr = fn(s.expr)
+
+
+def too_big(op, a, b):
+    # whether `a op b` would come out over MAX_FOLDED_SIZE, judged from the
+    # operands so that fold() never builds the value
+    if op == "*":
+        if isinstance(a, int) and isinstance(b, str):
+            a, b = b, a
+        if isinstance(a, str) and isinstance(b, int):
+            return len(a) * b > MAX_FOLDED_SIZE
+        if isinstance(a, int) and isinstance(b, int):
+            return a.bit_length() + b.bit_length() > MAX_FOLDED_SIZE
+    elif op == "+" and isinstance(a, str) and isinstance(b, str):
+        return len(a) + len(b) > MAX_FOLDED_SIZE
+    return False
+
+
+def count_ops(node):
+    if isinstance(node, UnaryOp):
+        return 1 + count_ops(node.expr)
+    if isinstance(node, BinaryOp):
+        return 1 + count_ops(node.left) + count_ops(node.right)
+    if isinstance(node, Index):
+        return 1 + count_ops(node.target) + count_ops(node.index)
+    if isinstance(node, ArrayLiteral):
+        # building the array is an operation of its own
+        return 1 + sum(count_ops(item) for item in node.items)
+    return 0
+
+
+def count_nodes(node):
+    if isinstance(node, Program):
+        return sum(count_nodes(s) for s in node.statements)
+    if isinstance(node, FuncDef):
+        return 1 + sum(count_nodes(s) for s in node.body)
+    if isinstance(node, Call):
+        return 1 + sum(count_nodes(a) for a in node.args)
+    if isinstance(node, If):
+        return (1 + count_nodes(node.cond)
+                + sum(count_nodes(s) for s in node.then_branch)
+                + sum(count_nodes(s) for s in node.else_branch))
+    if isinstance(node, While):
+        return 1 + count_nodes(node.cond) + sum(count_nodes(s) for s in node.body)
+    if isinstance(node, (Print, Assign, Hoisted)):
+        return 1 + count_nodes(node.expr)
+    if isinstance(node, Return):
+        return 1 + (0 if node.expr is None else count_nodes(node.expr))
+    if isinstance(node, UnaryOp):
+        return 1 + count_nodes(node.expr)
+    if isinstance(node, BinaryOp):
+        return 1 + count_nodes(node.left) + count_nodes(node.right)
+    if isinstance(node, Index):
+        return 1 + count_nodes(node.target) + count_nodes(node.index)
+    if isinstance(node, ArrayLiteral):
+        return 1 + sum(count_nodes(item) for item in node.items)
+    return 1
+
+
+def optimize(program: Program):
+    before = count_nodes(program)
+    opt = Optimizer()
+    opt.optimize(program)
+    opt.removed = before - (count_nodes(program) - opt.added)
+    return program, opt
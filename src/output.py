@@ -0,0 +1,141 @@
+import io
+import sys
+import time
+import threading
+
+# Where `print` goes, for every engine. A sink takes the printed values one
+# at a time (write() formats them, one per line) and must have written all
+# of them once flush() or close() returns; main closes it before reporting
+# errors, so program output always comes first.
+
+
+class Sink:
+    def write(self, value):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class StreamSink(Sink):
+    # each line goes straight to a text stream, which does its own
+    # buffering; with no stream, to whatever sys.stdout is at the time, so
+    # redirect_stdout() keeps working. The default.
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, value):
+        (self.stream or sys.stdout).write(f"{value}\n")
+
+    def flush(self):
+        (self.stream or sys.stdout).flush()
+
+
+class LineSink(Sink):
+    # keeps lines back and hands them to a text stream `lines` at a time.
+    # With `seconds` set, a thread of its own also hands over whatever is
+    # waiting once that long has passed since the last batch, so a program
+    # that prints a little and then works for a while is still heard from;
+    # close() stops it.
+    def __init__(self, stream=None, lines=1024, seconds=None):
+        if lines < 1:
+            raise ValueError("lines must be at least 1")
+        self.stream = stream
+        self.lines = lines
+        self.seconds = seconds
+        self.batch = []
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+        self.flusher = None
+        if seconds is not None:
+            self.closed = threading.Event()
+            self.flusher = threading.Thread(target=self._flush_every, daemon=True)
+            self.flusher.start()
+
+    def write(self, value):
+        # no lock: appending is atomic, and a flush only takes the lines
+        # that were there when it started
+        batch = self.batch
+        batch.append(f"{value}\n")
+        if len(batch) >= self.lines:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        if self.flusher is not None:
+            self.closed.set()
+            self.flusher.join()
+            self.flusher = None
+        self.flush()
+
+    def _flush(self):
+        stream = self.stream or sys.stdout
+        batch = self.batch
+        n = len(batch)
+        if n:
+            stream.write("".join(batch[:n]))
+            del batch[:n]
+        stream.flush()
+        self.last = time.monotonic()
+
+    def _flush_every(self):
+        seconds = self.seconds
+        wait = seconds
+        while not self.closed.wait(wait):
+            with self.lock:
+                wait = self.last + seconds - time.monotonic()
+                if wait <= 0:
+                    if self.batch:
+                        self._flush()
+                    else:
+                        self.last = time.monotonic()
+                    wait = seconds
+
+
+class FdSink(Sink):
+    # writes to a file descriptor through a large buffer of its own,
+    # bypassing sys.stdout; whatever was already written to sys.stdout is
+    # flushed first so it stays in front. The descriptor is left open.
+    def __init__(self, fd=1, size=1 << 20, encoding="utf-8"):
+        if fd == 1 and sys.stdout is not None:
+            sys.stdout.flush()
+        raw = io.FileIO(fd, "w", closefd=False)
+        self.stream = io.TextIOWrapper(io.BufferedWriter(raw, size), encoding=encoding)
+
+    def write(self, value):
+        self.stream.write(f"{value}\n")
+
+    def flush(self):
+        self.stream.flush()
+
+
+class CaptureSink(Sink):
+    # keeps everything in memory, e.g. for the IDE's console
+    def __init__(self):
+        self.lines = []
+
+    def write(self, value):
+        self.lines.append(str(value))
+
+    def getvalue(self):
+        return "".join(f"{line}\n" for line in self.lines)
+
+
+SINKS = ("stdout", "lines", "fd")
+
+
+def make_sink(kind="stdout", lines=1024):
+    # the sinks main can write the program's output to
+    if kind == "stdout":
+        return StreamSink()
+    if kind == "lines":
+        return LineSink(lines=lines)
+    if kind == "fd":
+        return FdSink()
+    raise ValueError(f"Unknown output {kind!r}")
@@ -0,0 +1,117 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from .dam_ast import Program
+from .lexer import (
+    Lexer, NUMBER, STRING, ID, RPAREN, RBRACE, RBRACKET,
+    FFF, IF, ELSE, WHILE, PRINT, BOOLEAN, IMPORT,
+)
+from .parser import Parser, ParserError
+
+# Parallel front end for very large sources. A cheap pre-scan cuts the text
+# at top-level statement boundaries, each piece is lexed and parsed in a
+# worker process with its real starting line number, and the statement lists
+# are joined back in order. Valid programs give exactly the serial AST.
+
+# below this the pool costs more than it saves
+MIN_PARALLEL_SIZE = 256 * 1024
+
+# comments and strings are skipped whole, so only brackets and newlines
+# outside them are seen
+_SCAN = re.compile(r"#[^\n]*|\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'|[{}()\[\]]|\n")
+
+# a statement can end with one of these...
+_ENDS_STATEMENT = (NUMBER, STRING, BOOLEAN, ID, RPAREN, RBRACE, RBRACKET)
+# ...and the next one starts with one of these
+_STARTS_STATEMENT = (FFF, IF, WHILE, PRINT, IMPORT, ID)
+# `if (c)` / `while (c)` / `fff f(a)` at the end of a line still need a block
+_NEEDS_BLOCK = (FFF, IF, ELSE, WHILE)
+
+
+def _can_split(prev_line, next_line):
+    try:
+        prev = Lexer(prev_line).tokenize()[:-1]
+        first = next(Lexer(next_line).iter_tokens())
+    except SyntaxError:
+        return False
+    if not prev or first.type not in _STARTS_STATEMENT:
+        return False
+    last = prev[-1].type
+    if last not in _ENDS_STATEMENT:
+        return False
+    return not (last == RPAREN and prev[0].type in _NEEDS_BLOCK)
+
+
+def split_source(code, parts):
+    # [(text, first_line)], at most `parts` pieces of roughly equal size, cut
+    # only at line starts outside any bracket, string or comment where one
+    # statement visibly ends and the next begins
+    step = max(1, len(code) // parts)
+    target = step
+    cuts = [0]
+    depth = 0
+    clean = True        # the current line did not start inside a string
+    line_start = 0
+    for mo in _SCAN.finditer(code):
+        c = mo.group()
+        if c == "\n":
+            end = mo.end()
+            if depth == 0 and clean and end >= target:
+                stop = code.find("\n", end)
+                next_line = code[end:] if stop < 0 else code[end:stop]
+                if _can_split(code[line_start:end - 1], next_line):
+                    cuts.append(end)
+                    if len(cuts) == parts:
+                        break
+                    target = end + step
+            clean = True
+            line_start = end
+        elif c in "{([":
+            depth += 1
+        elif c in "})]":
+            depth -= 1
+        elif "\n" in c and c[0] != "#":
+            clean = False
+    cuts.append(len(code))
+    chunks = []
+    line = 1
+    for start, end in zip(cuts, cuts[1:]):
+        chunks.append((code[start:end], line))
+        line += code.count("\n", start, end)
+    return chunks
+
+
+def _parse_chunk(chunk):
+    # runs in a worker: (statements, lexer error, parser errors)
+    text, line = chunk
+    try:
+        tokens = Lexer(text, line).tokenize()
+    except SyntaxError as e:
+        return None, str(e), None
+    try:
+        return Parser(tokens).parse().statements, None, None
+    except ParserError as e:
+        return None, None, [str(err) for err in e.errors]
+
+
+def parse_parallel(code, workers=None, min_size=MIN_PARALLEL_SIZE):
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or len(code) < min_size:
+        return Parser(Lexer(code).tokenize()).parse()
+    chunks = split_source(code, workers)
+    if len(chunks) < 2:
+        return Parser(Lexer(code).tokenize()).parse()
+    with ProcessPoolExecutor(min(workers, len(chunks))) as pool:
+        results = list(pool.map(_parse_chunk, chunks))
+    # like the serial path, a lexer error anywhere wins over parser errors
+    for _, lex_error, _ in results:
+        if lex_error is not None:
+            raise SyntaxError(lex_error)
+    errors = [ParserError(m) for _, _, msgs in results if msgs for m in msgs]
+    if errors:
+        raise ParserError("\n".join(str(e) for e in errors), errors)
+    statements = []
+    for stmts, _, _ in results:
+        statements.extend(stmts)
+    return Program(statements)
@@ -1,182 +1,326 @@
 from .dam_ast import (
-    Program, FuncDef, Call, If, While, Print, Assign,
-    Var, Literal, BinaryOp, UnaryOp
+    Program, FuncDef, Call, If, While, Print, Assign, Return,
+    Var, Literal, BinaryOp, UnaryOp, ArrayLiteral, Index, Import
+)
+from .lexer import (
+    TOKEN_NAMES, EOF, NUMBER, STRING, ID, OP,
+    LPAREN, RPAREN, LBRACE, RBRACE, COMMA, SEMICOLON,
+    FFF, IF, ELSE, WHILE, PRINT, BOOLEAN, RETURN, PRAGMA,
+    LBRACKET, RBRACKET, IMPORT,
 )
 
 class ParserError(Exception):
+    # `errors` lists every error found in the run (just this one unless the
+    # parser recovered and kept going)
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors if errors is not None else [self]
+
+
+class _Unrecoverable(Exception):
+    # raised once recovery runs into EOF inside an open block
     pass
 
 
+# binary operator -> binding power; higher binds tighter, all left-assoc
+BINARY_PRECEDENCE = {
+    "==": 1, "!=": 1,
+    "<": 2, ">": 2, "<=": 2, ">=": 2,
+    "+": 3, "-": 3,
+    "*": 4, "/": 4,
+}
+PREFIX_OPS = ("-", "!")
+
+STATEMENT_START = (FFF, IF, WHILE, PRINT, RETURN, PRAGMA, IMPORT, ID)
+
+# what `#pragma NAME` can say about the fff that follows it
+#   pure   memoize it even when the interpreter can't prove it pure
+PRAGMAS = ("pure",)
+
+
 class Parser:
+    # `tokens` can be any iterable, e.g. a list from Lexer.tokenize() or the
+    # lazy Lexer.stream(); the grammar only ever looks one token ahead.
     def __init__(self, tokens):
-        self.tokens = tokens
-        self.pos = 0
+        self.tokens = iter(tokens)
+        self.tok = next(self.tokens)
+        self.errors = []
+        self.recover = False
+        self.depth = 0
+        # how many fff bodies we are inside, for `return`
+        self.functions = 0
 
     def cur(self):
-        return self.tokens[self.pos]
+        return self.tok
+
+    def advance(self):
+        tok = self.tok
+        # stay on EOF once the stream is exhausted
+        self.tok = next(self.tokens, tok)
+        return tok
 
     def eat(self, type_):
-        tok = self.cur()
+        tok = self.tok
         if tok.type != type_:
-            raise ParserError(f"Expected {type_}, got {tok.type} at {tok.line}:{tok.col}")
-        self.pos += 1
-        return tok
+            raise ParserError(f"Expected {TOKEN_NAMES[type_]}, got {TOKEN_NAMES[tok.type]} "
+                              f"at {tok.line}:{tok.col}")
+        return self.advance()
 
     def match(self, *types):
-        if self.cur().type in types:
-            t = self.cur()
-            self.pos += 1
-            return t
+        if self.tok.type in types:
+            return self.advance()
         return None
 
     def parse(self):
+        # Parses the whole program, recovering after each syntax error so a
+        # single run reports all of them.
+        self.recover = True
         stmts = []
-        while self.cur().type != "EOF":
-            stmts.append(self.statement())
+        try:
+            while self.tok.type != EOF:
+                s = self.statement_or_recover()
+                if s is not None:
+                    stmts.append(s)
+        except _Unrecoverable:
+            pass
+        if self.errors:
+            raise ParserError("\n".join(str(e) for e in self.errors), self.errors)
         return Program(stmts)
 
+    def statements(self):
+        # top-level statements, each yielded as soon as it is complete; stops
+        # at the first error
+        while self.tok.type != EOF:
+            yield self.statement()
+
+    # ---------------- Error recovery ----------------
+    def statement_or_recover(self):
+        start = self.tok
+        try:
+            return self.statement()
+        except ParserError as e:
+            self.errors.append(e)
+            self.synchronize(start)
+            if self.tok.type == EOF and self.depth > 0:
+                raise _Unrecoverable()
+            return None
+
+    def synchronize(self, start):
+        # skip to a point where a new statement can start: after a `;`, at
+        # the `}` closing the current block, or at a statement keyword or
+        # identifier on a later line than the failed statement began. A `{`
+        # skipped on the way takes its whole block with it.
+        if self.tok is start and start.type != EOF:
+            self.advance()
+        while True:
+            t = self.tok
+            if t.type == EOF:
+                return
+            if t.type == LBRACE:
+                self.skip_block()
+                continue
+            if t.type == SEMICOLON:
+                self.advance()
+                return
+            if t.type == RBRACE:
+                if self.depth > 0:
+                    return
+                self.advance()
+                continue
+            if t.line > start.line and t.type in STATEMENT_START:
+                return
+            self.advance()
+
+    def skip_block(self):
+        nesting = 0
+        while self.tok.type != EOF:
+            t = self.advance().type
+            if t == LBRACE:
+                nesting += 1
+            elif t == RBRACE:
+                nesting -= 1
+                if nesting == 0:
+                    return
+
     # ---------------- Statements ----------------
     def statement(self):
-        t = self.cur()
-        if t.type == "FFF":
-            return self.func_def()
-        if t.type == "IF":
+        t = self.tok.type
+        if t == ID:
+            return self.assignment_or_call()
+        if t == PRINT:
+            return self.print_stmt()
+        if t == IF:
             return self.if_stmt()
-        if t.type == "WHILE":
+        if t == WHILE:
             return self.while_stmt()
-        if t.type == "PRINT":
-            return self.print_stmt()
-        if t.type == "ID":
-            return self.assignment_or_call()
+        if t == FFF:
+            return self.func_def()
+        if t == RETURN:
+            return self.return_stmt()
+        if t == PRAGMA:
+            return self.pragmas()
+        if t == IMPORT:
+            return self.import_stmt()
+        t = self.tok
         raise ParserError(f"Unexpected token {t} at {t.line}:{t.col}")
 
-    def func_def(self):
-        self.eat("FFF")
-        name = self.eat("ID").value
-        self.eat("LPAREN")
+    def pragmas(self):
+        # the lexer only passes on the ones right before an fff; names it
+        # doesn't know are left as the comments they were
+        names = []
+        while self.tok.type == PRAGMA:
+            name = self.advance().value.split()[1]
+            if name in PRAGMAS:
+                names.append(name)
+        return self.func_def(names)
+
+    def func_def(self, pragmas=()):
+        line = self.eat(FFF).line
+        name = self.eat(ID).value
+        self.eat(LPAREN)
         params = []
-        if self.cur().type != "RPAREN":
-            params.append(self.eat("ID").value)
-            while self.match("COMMA"):
-                params.append(self.eat("ID").value)
-        self.eat("RPAREN")
-        self.eat("LBRACE")
-        body = []
-        while self.cur().type != "RBRACE":
-            body.append(self.statement())
-        self.eat("RBRACE")
-        return FuncDef(name, params, body)
+        if self.tok.type != RPAREN:
+            params.append(self.eat(ID).value)
+            while self.match(COMMA):
+                params.append(self.eat(ID).value)
+        self.eat(RPAREN)
+        self.functions += 1
+        try:
+            body = self.block()
+        finally:
+            self.functions -= 1
+        return FuncDef(name, params, body, line, pragmas)
 
     def if_stmt(self):
-        self.eat("IF")
-        self.eat("LPAREN")
+        line = self.eat(IF).line
+        self.eat(LPAREN)
         cond = self.expr()
-        self.eat("RPAREN")
+        self.eat(RPAREN)
         then_body = self.block()
         else_body = []
-        if self.match("ELSE"):
+        if self.match(ELSE):
             else_body = self.block()
-        return If(cond, then_body, else_body)
+        return If(cond, then_body, else_body, line)
 
     def while_stmt(self):
-        self.eat("WHILE")
-        self.eat("LPAREN")
+        line = self.eat(WHILE).line
+        self.eat(LPAREN)
         cond = self.expr()
-        self.eat("RPAREN")
+        self.eat(RPAREN)
         body = self.block()
-        return While(cond, body)
+        return While(cond, body, line)
 
     def print_stmt(self):
-        self.eat("PRINT")
+        line = self.eat(PRINT).line
         value = self.expr()
-        return Print(value)
+        return Print(value, line)
+
+    def return_stmt(self):
+        tok = self.eat(RETURN)
+        if not self.functions:
+            raise ParserError(f"'return' outside of a function at {tok.line}:{tok.col}")
+        # statements aren't terminated, so a bare `return` is one followed by
+        # the end of the block or of the line
+        nxt = self.tok
+        if nxt.type in (RBRACE, SEMICOLON, EOF) or nxt.line != tok.line:
+            return Return(None, tok.line)
+        return Return(self.expr(), tok.line)
+
+    def import_stmt(self):
+        tok = self.eat(IMPORT)
+        if self.depth:
+            raise ParserError(f"'import' inside a block at {tok.line}:{tok.col}; "
+                              f"imports go at the top level")
+        return Import(self.eat(STRING).value, tok.line)
 
     def assignment_or_call(self):
-        name = self.eat("ID").value
-        if self.cur().type == "OP" and self.cur().value == "=":
-            self.eat("OP")
+        start = self.eat(ID)
+        name = start.value
+        tok = self.tok
+        if tok.type == OP and tok.value == "=":
+            self.advance()
             value = self.expr()
-            return Assign(name, value)
-        if self.cur().type == "LPAREN":
+            return Assign(name, value, start.line)
+        if tok.type == LPAREN:
             args = self.arguments()
-            return Call(name, args)
-        raise ParserError(f"Expected '=' or '(' after identifier at {self.cur().line}:{self.cur().col}")
+            return Call(name, args, start.line)
+        raise ParserError(f"Expected '=' or '(' after identifier at {tok.line}:{tok.col}")
 
     def arguments(self):
-        self.eat("LPAREN")
-        args = []
-        if self.cur().type != "RPAREN":
-            args.append(self.expr())
-            while self.match("COMMA"):
-                args.append(self.expr())
-        self.eat("RPAREN")
-        return args
+        return self.expr_list(LPAREN, RPAREN)
+
+    def expr_list(self, open_, close):
+        self.eat(open_)
+        items = []
+        if self.tok.type != close:
+            items.append(self.expr())
+            while self.match(COMMA):
+                items.append(self.expr())
+        self.eat(close)
+        return items
 
     def block(self):
-        self.eat("LBRACE")
+        self.eat(LBRACE)
         stmts = []
-        while self.cur().type != "RBRACE":
-            stmts.append(self.statement())
-        self.eat("RBRACE")
+        self.depth += 1
+        try:
+            while self.tok.type != RBRACE:
+                if self.recover:
+                    s = self.statement_or_recover()
+                    if s is not None:
+                        stmts.append(s)
+                else:
+                    stmts.append(self.statement())
+        finally:
+            self.depth -= 1
+        self.eat(RBRACE)
         return stmts
 
     # ---------------- Expressions ----------------
-    def expr(self):
-        return self.equality()
-
-    def equality(self):
-        node = self.comparison()
-        while self.cur().type == "OP" and self.cur().value in ("==", "!="):
-            op = self.eat("OP").value
-            right = self.comparison()
-            node = BinaryOp(node, op, right)
-        return node
-
-    def comparison(self):
-        node = self.term()
-        while self.cur().type == "OP" and self.cur().value in ("<", ">", "<=", ">="):
-            op = self.eat("OP").value
-            right = self.term()
-            node = BinaryOp(node, op, right)
-        return node
-
-    def term(self):
-        node = self.factor()
-        while self.cur().type == "OP" and self.cur().value in ("+", "-"):
-            op = self.eat("OP").value
-            right = self.factor()
-            node = BinaryOp(node, op, right)
-        return node
-
-    def factor(self):
+    def expr(self, min_prec=1):
+        # precedence climbing over BINARY_PRECEDENCE
         node = self.unary()
-        while self.cur().type == "OP" and self.cur().value in ("*", "/"):
-            op = self.eat("OP").value
-            right = self.unary()
-            node = BinaryOp(node, op, right)
-        return node
+        prec_of = BINARY_PRECEDENCE.get
+        while True:
+            tok = self.tok
+            if tok.type != OP:
+                return node
+            prec = prec_of(tok.value)
+            if prec is None or prec < min_prec:
+                return node
+            self.advance()
+            node = BinaryOp(node, tok.value, self.expr(prec + 1))
 
     def unary(self):
-        tok = self.cur()
-        if tok.type == "OP" and tok.value in ("-", "!"):
-            op = self.eat("OP").value
-            right = self.unary()
-            return UnaryOp(op, right)
+        tok = self.tok
+        if tok.type == OP and tok.value in PREFIX_OPS:
+            self.advance()
+            return UnaryOp(tok.value, self.unary())
         return self.primary()
 
     def primary(self):
-        tok = self.cur()
-        if tok.type == "NUMBER":
-            return Literal(self.eat("NUMBER").value)
-        if tok.type == "STRING":
-            return Literal(self.eat("STRING").value)
-        if tok.type == "BOOLEAN":
-            return Literal(self.eat("BOOLEAN").value)
-        if tok.type == "ID":
-            return Var(self.eat("ID").value)
-        if tok.type == "LPAREN":
-            self.eat("LPAREN")
+        tok = self.tok
+        t = tok.type
+        if t == ID:
+            self.advance()
+            if self.tok.type == LPAREN:
+                node = Call(tok.value, self.arguments(), tok.line)
+            else:
+                node = Var(tok.value)
+        elif t == NUMBER or t == STRING or t == BOOLEAN:
+            self.advance()
+            node = Literal(tok.value)
+        elif t == LPAREN:
+            self.advance()
             node = self.expr()
-            self.eat("RPAREN")
-            return node
-        raise ParserError(f"Unexpected token {tok} at {tok.line}:{tok.col}")
+            self.eat(RPAREN)
+        elif t == LBRACKET:
+            node = ArrayLiteral(self.expr_list(LBRACKET, RBRACKET))
+        else:
+            raise ParserError(f"Unexpected token {tok} at {tok.line}:{tok.col}")
+        # indexing binds tighter than any operator: -a[0] is -(a[0])
+        while self.tok.type == LBRACKET:
+            self.advance()
+            node = Index(node, self.expr())
+            self.eat(RBRACKET)
+        return node
@@ -0,0 +1,205 @@
+import json
+from time import perf_counter
+
+from .interpreter import Interpreter, RETURNED
+
+# Line / function / loop profiler for the tree engine. It is a subclass that
+# wraps the statement handlers at construction time, so the plain Interpreter
+# carries no profiling code at all and costs nothing when it is off.
+
+# cap on trace events kept for --profile-trace; later ones are dropped
+MAX_TRACE_EVENTS = 1_000_000
+
+
+class Stat:
+    __slots__ = ("count", "inclusive", "exclusive", "iterations", "active")
+
+    def __init__(self):
+        self.count = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+        self.iterations = 0
+        # how many activations are on the stack; recursion only adds the
+        # outermost one to `inclusive`
+        self.active = 0
+
+
+class StatTable:
+    # Exclusive time is relative to the same table: a line's excludes the
+    # lines nested in it, a function's the functions it calls.
+    def __init__(self):
+        self.stats = {}
+        self._child = [0.0]
+
+    def enter(self, key):
+        st = self.stats.get(key)
+        if st is None:
+            st = self.stats[key] = Stat()
+        st.active += 1
+        self._child.append(0.0)
+        return st
+
+    def leave(self, st, elapsed):
+        child = self._child.pop()
+        self._child[-1] += elapsed
+        st.count += 1
+        st.exclusive += elapsed - child
+        st.active -= 1
+        if not st.active:
+            st.inclusive += elapsed
+
+
+class ProfilingInterpreter(Interpreter):
+    def __init__(self, quicken=True, trace=False, **options):
+        super().__init__(quicken, **options)
+        self.lines = StatTable()
+        self.calls = StatTable()
+        self.loops = StatTable()
+        # (name, category, start, duration) for calls and loops
+        self.events = [] if trace else None
+        self.dropped = 0
+        self.started = perf_counter()
+        self.elapsed = 0.0
+        for cls, handler in list(self._stmt_handlers.items()):
+            self._stmt_handlers[cls] = self._timed(handler)
+        for cls, handler in list(self._gen_stmt_handlers.items()):
+            self._gen_stmt_handlers[cls] = self._timed_gen(handler)
+
+    def run(self, program, path=None):
+        self.started = perf_counter()
+        try:
+            super().run(program, path)
+        finally:
+            self.elapsed = perf_counter() - self.started
+
+    def _timed(self, handler):
+        lines = self.lines
+
+        def run(node):
+            st = lines.enter(node.line)
+            start = perf_counter()
+            try:
+                return handler(node)
+            finally:
+                lines.leave(st, perf_counter() - start)
+        return run
+
+    def _timed_gen(self, handler):
+        # the time a statement spends suspended in calls is part of its
+        # inclusive time, as in the recursive case
+        lines = self.lines
+
+        def run(node):
+            st = lines.enter(node.line)
+            start = perf_counter()
+            try:
+                return (yield from handler(node))
+            finally:
+                lines.leave(st, perf_counter() - start)
+        return run
+
+    def _event(self, name, category, start, elapsed):
+        if len(self.events) < MAX_TRACE_EVENTS:
+            self.events.append((name, category, start, elapsed))
+        else:
+            self.dropped += 1
+
+    # --------------- calls and loops ---------------
+    def _call_start(self, fn):
+        return self.calls.enter((fn.name, fn.line)), perf_counter()
+
+    def _call_done(self, fn, st, start):
+        elapsed = perf_counter() - start
+        self.calls.leave(st, elapsed)
+        if self.events is not None:
+            self._event(f"fff {fn.name}", "call", start, elapsed)
+
+    def _run_leaf(self, frame):
+        st, start = self._call_start(frame.fn)
+        try:
+            return super()._run_leaf(frame)
+        finally:
+            self._call_done(frame.fn, st, start)
+
+    def _gen_body(self, frame):
+        st, start = self._call_start(frame.fn)
+        try:
+            return (yield from super()._gen_body(frame))
+        finally:
+            self._call_done(frame.fn, st, start)
+
+    def _loop(self, node):
+        st = self.loops.enter(node.line)
+        return st, perf_counter()
+
+    def _loop_done(self, node, st, start, iterations):
+        elapsed = perf_counter() - start
+        st.iterations += iterations
+        self.loops.leave(st, elapsed)
+        if self.events is not None:
+            self._event(f"while @{node.line}", "loop", start, elapsed)
+
+    def _exec_while(self, node):
+        st, start = self._loop(node)
+        exec_stmt = self.exec_stmt
+        eval_expr = self.eval_expr
+        cond = node.cond
+        body = node.body
+        n = 0
+        try:
+            while eval_expr(cond):
+                n += 1
+                for s in body:
+                    if exec_stmt(s) is RETURNED:
+                        return RETURNED
+        finally:
+            self._loop_done(node, st, start, n)
+
+    def _gen_while(self, node):
+        st, start = self._loop(node)
+        cond = node.cond
+        body = node.body
+        n = 0
+        try:
+            while (yield from self._gen_expr(cond)) if cond.calls else self.eval_expr(cond):
+                n += 1
+                if (yield from self._gen_block(body)) is RETURNED:
+                    return RETURNED
+        finally:
+            self._loop_done(node, st, start, n)
+
+    # --------------- output ---------------
+    def report(self, limit=20):
+        total = self.elapsed or 1e-9
+        out = [f"[Damavand profile] total {self.elapsed * 1000:.2f} ms"]
+
+        def table(title, header, table, label, extra=None):
+            rows = sorted(table.stats.items(), key=lambda kv: kv[1].exclusive,
+                          reverse=True)[:limit]
+            if not rows:
+                return
+            out.append("")
+            out.append(f"{title:<28}{header}{'incl ms':>12}{'excl ms':>12}{'excl %':>8}")
+            for key, st in rows:
+                cols = f"{st.count:>10}"
+                if extra:
+                    cols += f"{extra(st):>12}"
+                out.append(f"  {label(key):<26}{cols}{st.inclusive * 1000:12.2f}"
+                           f"{st.exclusive * 1000:12.2f}{st.exclusive / total * 100:7.1f}%")
+
+        table("Functions", f"{'calls':>10}", self.calls,
+              lambda k: f"{k[0]} (line {k[1]})")
+        table("Loops", f"{'entries':>10}{'iterations':>12}", self.loops,
+              lambda k: f"while at line {k}", lambda st: st.iterations)
+        table("Lines", f"{'count':>10}", self.lines, lambda k: f"line {k}")
+        return "\n".join(out)
+
+    def write_trace(self, path):
+        # Chrome trace event format; also opens in speedscope and Perfetto
+        events = [
+            {"name": name, "cat": cat, "ph": "X", "pid": 1, "tid": 1,
+             "ts": (start - self.started) * 1e6, "dur": elapsed * 1e6}
+            for name, cat, start, elapsed in self.events or ()
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
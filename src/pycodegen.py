@@ -0,0 +1,171 @@
+import sys
+import math
+
+from .dam_ast import *
+from .compiler import CompileError
+from .interpreter import RuntimeErrorEx
+from .arrays import make_array, index
+from .natives import BUILTINS
+from .output import StreamSink
+
+# Translates a Program into Python source, so CPython's own eval loop runs
+# it. Variables stay in one dict `G` to keep the tree-walker's semantics:
+# unset names read as None, and a call overlays its params on a snapshot of
+# G that is rolled back when it returns.
+
+INDENT = "    "
+
+BINARY_OPS = {"+", "-", "*", "/", "==", "!=", "<", ">", "<=", ">="}
+
+
+class PyCodeGen:
+    def __init__(self):
+        self.lines = []
+        self.depth = 0
+        self.fn_count = 0
+
+    def generate(self, program: Program):
+        self.line("def __dam_main__(G, F, _check, _print, _array, _index):")
+        self.block(program.statements)
+        return "\n".join(self.lines) + "\n"
+
+    # --------------- helpers ---------------
+    def line(self, text):
+        self.lines.append(INDENT * self.depth + text)
+
+    def block(self, stmts):
+        self.depth += 1
+        self.statements(stmts)
+        self.depth -= 1
+
+    def statements(self, stmts):
+        if not stmts:
+            self.line("pass")
+        for s in stmts:
+            self.stmt(s)
+
+    # --------------- statements ---------------
+    def stmt(self, node):
+        if isinstance(node, FuncDef):
+            pyname = f"_dam_{node.name}_{self.fn_count}"
+            self.fn_count += 1
+            args = [f"_a{i}" for i in range(len(node.params))]
+            self.line(f"def {pyname}({', '.join(args)}):")
+            self.depth += 1
+            self.line("_saved = dict(G)")
+            self.line("try:")
+            self.depth += 1
+            for p, a in zip(node.params, args):
+                self.line(f"G[{p!r}] = {a}")
+            self.statements(node.body)
+            self.depth -= 1
+            self.line("finally:")
+            self.depth += 1
+            self.line("G.clear()")
+            self.line("G.update(_saved)")
+            self.depth -= 2
+            self.line(f"F[{node.name!r}] = {pyname}")
+        elif isinstance(node, Call):
+            self.line(self.expr(node))
+        elif isinstance(node, If):
+            self.line(f"if {self.expr(node.cond)}:")
+            self.block(node.then_branch)
+            if node.else_branch:
+                self.line("else:")
+                self.block(node.else_branch)
+        elif isinstance(node, While):
+            self.line(f"while {self.expr(node.cond)}:")
+            self.block(node.body)
+        elif isinstance(node, Print):
+            self.line(f"_print({self.expr(node.expr)})")
+        elif isinstance(node, Assign):
+            self.line(f"G[{node.name!r}] = {self.expr(node.expr)}")
+        elif isinstance(node, Return):
+            # the finally of the enclosing def still rolls G back
+            self.line("return" if node.expr is None else f"return {self.expr(node.expr)}")
+        else:
+            raise CompileError(f"Unknown statement {type(node)}")
+
+    # --------------- expressions ---------------
+    def expr(self, node):
+        if isinstance(node, Literal):
+            value = node.value
+            if isinstance(value, float) and not math.isfinite(value):
+                # repr() gives a bare inf/nan, which isn't a Python name
+                return f"float({repr(value)!r})"
+            return repr(value)
+        if isinstance(node, Var):
+            return f"G.get({node.name!r})"
+        if isinstance(node, UnaryOp):
+            if node.op == "-": return f"(-{self.expr(node.expr)})"
+            if node.op == "!": return f"(not {self.expr(node.expr)})"
+            raise CompileError(f"Unknown unary {node.op}")
+        if isinstance(node, BinaryOp):
+            if node.op not in BINARY_OPS:
+                raise CompileError(f"Unknown op {node.op}")
+            return f"({self.expr(node.left)} {node.op} {self.expr(node.right)})"
+        if isinstance(node, Call):
+            # _check runs before the arguments, like Interpreter._call
+            args = ", ".join(self.expr(a) for a in node.args)
+            return f"_check({node.name!r}, {len(node.args)})({args})"
+        if isinstance(node, Index):
+            return f"_index({self.expr(node.target)}, {self.expr(node.index)})"
+        if isinstance(node, ArrayLiteral):
+            return f"_array([{', '.join(self.expr(item) for item in node.items)}])"
+        if isinstance(node, Hoisted):
+            k = repr(node.name)
+            return (f"(_h if (_h := G.get({k})) is not None "
+                    f"else (G.__setitem__({k}, (_h := {self.expr(node.expr)})) or _h))")
+        raise CompileError(f"Unknown expr {type(node)}")
+
+
+def generate_python(program: Program):
+    return PyCodeGen().generate(program)
+
+
+def compile_python(program: Program, filename="<damavand>"):
+    source = generate_python(program)
+    try:
+        return compile(source, filename, "exec")
+    except (SyntaxError, RecursionError) as e:
+        # e.g. CPython's limit on statically nested blocks
+        raise CompileError(f"Cannot compile to Python: {e}")
+
+
+# Damavand calls are Python calls here. Python-to-Python calls don't use
+# the C stack, so the limit can safely be raised for deep recursion.
+RECURSION_LIMIT = 200_000
+
+
+class PyCodeRunner:
+    def __init__(self, out=None):
+        self.globals = {}
+        self.functions = {}
+        # the output sink `_print` writes to (src/output.py)
+        self.out = out or StreamSink()
+
+    def _check(self, name, argc):
+        fn = self.functions.get(name)
+        if fn is not None:
+            params = fn.__code__.co_argcount
+        else:
+            native = BUILTINS.get(name)
+            if native is None:
+                raise RuntimeErrorEx(f"Undefined function {name}")
+            fn, params = native.fn, native.arity
+        if argc != params:
+            raise RuntimeErrorEx(f"Arg count mismatch for {name}")
+        return fn
+
+    def run(self, code):
+        namespace = {}
+        exec(code, namespace)
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, RECURSION_LIMIT))
+        try:
+            namespace["__dam_main__"](self.globals, self.functions, self._check, self.out.write,
+                                      make_array, index)
+        except RecursionError:
+            raise RuntimeErrorEx("Recursion too deep for the pycode engine")
+        finally:
+            sys.setrecursionlimit(limit)
@@ -0,0 +1,60 @@
+from .dam_ast import *
+from .resolver import DYNAMIC, UNSET
+
+# Quickening: once a BinaryOp/UnaryOp node has been evaluated QUICKEN_AFTER
+# times, the interpreter swaps in a closure specialized on the shape of its
+# operands. Literal operands become captured constants and Var operands read
+# their global/slot directly, so the hot path skips the recursive
+# eval_expr dispatch for both children. Closures take the interpreter as an
+# argument, so one AST can be shared by several Interpreter instances.
+#
+# Operand *types* are not specialized on: operator.add & co. already
+# dispatch on type in C, and a Python-level type guard costs more than the
+# operation it would protect.
+
+QUICKEN_AFTER = 8
+
+
+def var_loader(node):
+    name, slot = node.name, node.slot
+    if slot is None:
+        return lambda it: it.globals.get(name)
+    if slot == DYNAMIC:
+        return lambda it: it._lookup_dynamic(name)
+
+    def load(it):
+        v = it.frame.values[slot]
+        if v is UNSET:
+            return it._lookup_dynamic(name)
+        return v
+    return load
+
+
+def operand(node):
+    # (is_const, value or loader)
+    if isinstance(node, Literal):
+        return True, node.value
+    if isinstance(node, Var):
+        return False, var_loader(node)
+    return False, lambda it: it.eval_expr(node)
+
+
+def quicken_binary(node):
+    fn = node.fn
+    lc, l = operand(node.left)
+    rc, r = operand(node.right)
+    if lc and rc:
+        return lambda it: fn(l, r)
+    if rc:
+        return lambda it: fn(l(it), r)
+    if lc:
+        return lambda it: fn(l, r(it))
+    return lambda it: fn(l(it), r(it))
+
+
+def quicken_unary(node):
+    fn = node.fn
+    c, v = operand(node.expr)
+    if c:
+        return lambda it: fn(v)
+    return lambda it: fn(v(it))
@@ -0,0 +1,182 @@
+from .dam_ast import *
+from .operators import BINARY, UNARY
+from .natives import BUILTINS
+from .rope import concat
+
+# Slot annotations written onto Var/Assign nodes:
+#   None     top-level code, the name lives in Interpreter.globals
+#   >= 0     index into the current call frame
+#   DYNAMIC  not local to the function; looked up through the callers'
+#            frames and then the globals, which is what the old
+#            snapshot-and-overlay scoping made visible
+DYNAMIC = -1
+
+# marks a frame slot that has not been assigned yet in this call
+UNSET = object()
+
+
+class Resolver:
+    # Besides the slots, every statement and operator node gets `calls`:
+    # whether running it can reach a call of a fff. stmt() and expr() return
+    # it. A call of a builtin doesn't count unless a fff may take its name:
+    # one defined anywhere in the program, or in `shadowed`. With `preempt`
+    # every loop counts as calling too, so it runs as a generator that can
+    # pause (scheduler.py).
+    def __init__(self, shadowed=(), preempt=False):
+        self.shadowed = set(shadowed)
+        self.preempt = preempt
+
+    def resolve(self, program: Program):
+        self.shadowed |= defined_names(program.statements)
+        self.block(program.statements, None)
+        return program
+
+    def block(self, stmts, slots):
+        calls = False
+        for s in stmts:
+            calls |= self.stmt(s, slots)
+        return calls
+
+    # --------------- statements ---------------
+    def stmt(self, node, slots):
+        if isinstance(node, FuncDef):
+            self.func_def(node)
+            return False
+        if isinstance(node, Call):
+            return self.call(node, slots)
+        if isinstance(node, Import):
+            return True
+        if isinstance(node, If):
+            calls = self.expr(node.cond, slots)
+            calls |= self.block(node.then_branch, slots)
+            calls |= self.block(node.else_branch, slots)
+        elif isinstance(node, While):
+            calls = self.expr(node.cond, slots)
+            calls |= self.block(node.body, slots)
+            calls |= self.preempt
+        elif isinstance(node, (Print, Return)):
+            calls = node.expr is not None and self.expr(node.expr, slots)
+        elif isinstance(node, Assign):
+            calls = self.expr(node.expr, slots)
+            node.slot = None if slots is None else slots[node.name]
+            self.grown(node)
+        else:
+            return False
+        node.calls = calls
+        return calls
+
+    def grown(self, node):
+        # `s = s + ...`, `s = ... + s + ...`: a string grown in place, maybe
+        # in a loop; its + nodes build ropes. Chains with a number in them
+        # are counters and sums, which keep the plain operator.add.
+        chain = []
+        operands = []
+        e = node.expr
+        while isinstance(e, BinaryOp) and e.op == "+":
+            chain.append(e)
+            operands.append(e.right)
+            e = e.left
+        operands.append(e)
+        if not chain:
+            return
+        if not any(isinstance(o, Var) and o.name == node.name for o in operands):
+            return
+        if any(isinstance(o, Literal) and o.value.__class__ in (int, float) for o in operands):
+            return
+        for b in chain:
+            b.fn = concat
+
+    def func_def(self, node):
+        slots = {}
+        for p in node.params:
+            slots.setdefault(p, len(slots))
+        for name in assigned_names(node.body):
+            slots.setdefault(name, len(slots))
+        node.slots = slots
+        node.param_slots = [slots[p] for p in node.params]
+        node.leaf = not self.block(node.body, slots)
+
+    def call(self, node, slots):
+        nested = False
+        for a in node.args:
+            nested |= self.expr(a, slots)
+        node.nested = nested
+        node.builtin = BUILTINS.get(node.name)
+        node.calls = nested or node.builtin is None or node.name in self.shadowed
+        return node.calls
+
+    # --------------- expressions ---------------
+    def expr(self, node, slots):
+        if isinstance(node, Var):
+            if slots is None:
+                node.slot = None
+            else:
+                node.slot = slots.get(node.name, DYNAMIC)
+            return False
+        if isinstance(node, UnaryOp):
+            node.fn = UNARY.get(node.op)
+            node.calls = self.expr(node.expr, slots)
+            return node.calls
+        if isinstance(node, BinaryOp):
+            node.fn = BINARY.get(node.op)
+            left = self.expr(node.left, slots)
+            node.calls = self.expr(node.right, slots) or left
+            return node.calls
+        if isinstance(node, Call):
+            return self.call(node, slots)
+        if isinstance(node, Index):
+            target = self.expr(node.target, slots)
+            node.calls = self.expr(node.index, slots) or target
+            return node.calls
+        if isinstance(node, ArrayLiteral):
+            calls = False
+            for item in node.items:
+                calls |= self.expr(item, slots)
+            node.calls = calls
+            return calls
+        if isinstance(node, Hoisted):
+            self.expr(node.expr, slots)
+            node.slot = None if slots is None else slots[node.name]
+        return False
+
+
+def assigned_names(stmts):
+    # names written by a function body, not counting nested fff bodies
+    names = []
+    for s in stmts:
+        if isinstance(s, Assign):
+            names.append(s.name)
+        elif isinstance(s, If):
+            names += assigned_names(s.then_branch)
+            names += assigned_names(s.else_branch)
+        elif isinstance(s, While):
+            names += assigned_names(s.body)
+    return names
+
+
+def defined_names(stmts):
+    # names of every fff in stmts, nested ones included
+    names = set()
+    for s in stmts:
+        if isinstance(s, FuncDef):
+            names.add(s.name)
+            names |= defined_names(s.body)
+        elif isinstance(s, If):
+            names |= defined_names(s.then_branch)
+            names |= defined_names(s.else_branch)
+        elif isinstance(s, While):
+            names |= defined_names(s.body)
+    return names
+
+
+def resolve(program: Program, shadowed=(), preempt=False):
+    return Resolver(shadowed, preempt).resolve(program)
+
+
+def resolve_statement(stmt, shadowed=(), preempt=False):
+    # one statement at a time, so fffs further on can't be seen: `shadowed`
+    # should hold the ones defined so far
+    resolver = Resolver(shadowed, preempt)
+    resolver.shadowed |= defined_names([stmt])
+    resolver.stmt(stmt, None)
+    return stmt
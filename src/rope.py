@@ -0,0 +1,108 @@
+from itertools import islice
+
+# Strings built up piece by piece, `s = s + "..."` or `t = "(" + t + ")"` in a
+# loop, would copy the whole string on every step. The resolver gives the +
+# nodes of such assignments concat() instead of operator.add, and once the
+# string is ROPE_MIN characters long concat() returns a Rope: the pieces
+# are kept in lists and only joined when the value is looked at (printed,
+# compared, indexed...), so building it is linear.
+#
+# A Rope is immutable like any string. The piece lists are shared: a Rope
+# only owns the first `nfront` / `nback` entries, and extending one whose
+# list has already grown past that (another Rope extended it first) copies
+# its own part first, so every step is amortized O(1) in the common case.
+
+# shorter results stay plain strings; copying them is cheaper than a Rope
+ROPE_MIN = 256
+
+
+class Rope:
+    # `front` holds the prepended pieces in reverse order, `back` the
+    # appended ones in order
+    __slots__ = ("front", "nfront", "back", "nback", "length", "flat")
+
+    def __init__(self, front, nfront, back, nback, length):
+        self.front = front
+        self.nfront = nfront
+        self.back = back
+        self.nback = nback
+        self.length = length
+        self.flat = None
+
+    def append(self, s):
+        back = self.back
+        if len(back) != self.nback:
+            back = back[:self.nback]
+        back.append(s)
+        return Rope(self.front, self.nfront, back, self.nback + 1, self.length + len(s))
+
+    def prepend(self, s):
+        front = self.front
+        if len(front) != self.nfront:
+            front = front[:self.nfront]
+        front.append(s)
+        return Rope(front, self.nfront + 1, self.back, self.nback, self.length + len(s))
+
+    def __str__(self):
+        flat = self.flat
+        if flat is None:
+            flat = self.flat = ("".join(reversed(self.front[:self.nfront]))
+                                + "".join(islice(self.back, self.nback)))
+        return flat
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __len__(self):
+        return self.length
+
+    def __bool__(self):
+        return self.length > 0
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __add__(self, other):
+        return concat(self, other)
+
+    def __radd__(self, other):
+        return concat(other, self)
+
+    def __mul__(self, other):
+        return str(self) * other
+
+    __rmul__ = __mul__
+
+    def __getitem__(self, i):
+        return str(self)[i]
+
+    # another Rope on the right flattens itself when Python reflects these
+    def __eq__(self, other): return str(self) == other
+    def __ne__(self, other): return str(self) != other
+    def __lt__(self, other): return str(self) < other
+    def __gt__(self, other): return str(self) > other
+    def __le__(self, other): return str(self) <= other
+    def __ge__(self, other): return str(self) >= other
+
+
+def concat(a, b):
+    # a + b, building a Rope for long strings
+    ca = a.__class__
+    cb = b.__class__
+    if ca is Rope:
+        if cb is str:
+            return a.append(b)
+        if cb is Rope:
+            return a.append(str(b))
+        return str(a) + b
+    if cb is Rope:
+        if ca is str:
+            return b.prepend(a)
+        return a + str(b)
+    if ca is str and cb is str and len(a) + len(b) >= ROPE_MIN:
+        return Rope([], 0, [a, b], 2, len(a) + len(b))
+    return a + b
+
+
+def is_string(v):
+    return isinstance(v, (str, Rope))
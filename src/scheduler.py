@@ -0,0 +1,222 @@
+import sys
+import argparse
+from collections import deque
+from time import perf_counter
+
+from .interpreter import Interpreter, RuntimeErrorEx, RETURNED
+from .resolver import resolve
+from .output import CaptureSink
+from .main import error_text, load_program
+from .batch import expand
+
+# Many programs in one process, taking turns. A Task is an Interpreter whose
+# program can stop after a number of steps and carry on later: it is resolved
+# with `preempt`, which makes every loop run as a generator (interpreter.py),
+# and its loops and calls spend `fuel`. When that runs out a loop yields
+# PAUSE, or the driver stops before entering a call, and step() returns with
+# the task's generators left as they are for the next one.
+#
+# A step is a loop iteration or a call. What runs between two steps is
+# straight-line code no longer than the program, so step budgets bound the
+# work, builtins aside: one range() or repeat() can take long, and only the
+# time quota notices, after the turn.
+#
+# The Scheduler runs its tasks round-robin, `quantum` steps a turn, so an
+# endless loop only ever holds the others up for one turn at a time. A task
+# that goes over its step budget or its time quota is stopped with an error.
+
+DEFAULT_QUANTUM = 1000
+
+# what a loop yields to hand control back to the scheduler
+PAUSE = object()
+
+
+class QuotaExceeded(RuntimeErrorEx):
+    pass
+
+
+class Task(Interpreter):
+    preempt = True
+
+    def __init__(self, program, name=None, max_steps=None, time_limit=None, path=None,
+                 **options):
+        super().__init__(**options)
+        self.name = name
+        self.max_steps = max_steps
+        self.time_limit = time_limit
+        # steps used and seconds run so far
+        self.steps = 0
+        self.seconds = 0.0
+        self.fuel = 0
+        self.done = False
+        # error_text() of what stopped the program, if something did
+        self.error = None
+        # imports are relative to `path`, as for run()
+        self._enter(path)
+        resolve(program, self._shadowed(), preempt=True)
+        # the generator of every call in progress, innermost last, as in _drive()
+        self.running = [self._gen_block(program.statements)]
+
+    def step(self, budget):
+        # runs the program for at most `budget` steps; True once it has ended
+        if self.max_steps is not None:
+            budget = min(budget, self.max_steps - self.steps)
+        self.fuel = budget
+        start = perf_counter()
+        try:
+            self.done = self._resume()
+        finally:
+            self.steps += budget - self.fuel
+            self.seconds += perf_counter() - start
+        if not self.done:
+            if self.max_steps is not None and self.steps >= self.max_steps:
+                raise QuotaExceeded(f"Step budget of {self.max_steps} used up")
+            if self.time_limit is not None and self.seconds >= self.time_limit:
+                raise QuotaExceeded(f"Time quota of {self.time_limit:g} s used up")
+        return self.done
+
+    def _resume(self):
+        running = self.running
+        frames = self.frames
+        value = None
+        while True:
+            try:
+                frame = running[-1].send(value)
+            except StopIteration:
+                running.pop()
+                if not running:
+                    return True
+                value = frames.pop().result
+                self.frame = frames[-1] if frames else None
+                continue
+            if frame is PAUSE:
+                return False
+            frames.append(frame)
+            self.frame = frame
+            running.append(self._gen_body(frame))
+            value = None
+            self.fuel -= 1
+            if self.fuel <= 0:
+                return False
+
+    def stop(self, error=None):
+        # ends the program where it is
+        for gen in reversed(self.running):
+            gen.close()
+        self.running = []
+        del self.frames[:]
+        self.frame = None
+        self.done = True
+        self.error = error
+
+    def _gen_while(self, node):
+        # Interpreter._gen_while, spending a step per iteration
+        cond = node.cond
+        body = node.body
+        exec_stmt = self.exec_stmt
+        gen_stmt = self._gen_stmt
+        while (yield from self._gen_expr(cond)) if cond.calls else self.eval_expr(cond):
+            self.fuel -= 1
+            if self.fuel <= 0:
+                yield PAUSE
+            for s in body:
+                if ((yield from gen_stmt(s)) if s.calls else exec_stmt(s)) is RETURNED:
+                    return RETURNED
+
+
+class Scheduler:
+    def __init__(self, quantum=DEFAULT_QUANTUM, max_steps=None, time_limit=None):
+        if quantum < 1:
+            raise ValueError("quantum must be at least 1")
+        self.quantum = quantum
+        # defaults for the tasks added
+        self.max_steps = max_steps
+        self.time_limit = time_limit
+        self.ready = deque()
+
+    def add(self, program, name=None, **options):
+        # a Task for `program`, run from the next turn on; its output is
+        # captured unless `out` says otherwise
+        options.setdefault("out", CaptureSink())
+        options.setdefault("max_steps", self.max_steps)
+        options.setdefault("time_limit", self.time_limit)
+        task = Task(program, name, **options)
+        self.ready.append(task)
+        return task
+
+    def run(self):
+        # takes turns until every task has ended, yielding each as it does
+        ready = self.ready
+        quantum = self.quantum
+        while ready:
+            task = ready.popleft()
+            try:
+                if not task.step(quantum):
+                    ready.append(task)
+                    continue
+            except Exception as e:
+                # one failing program doesn't stop the others
+                task.stop(error_text(e))
+            yield task
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m src.scheduler")
+    ap.add_argument("programs", nargs="+", metavar="program",
+                    help="programs, directories or glob patterns, all run in this process")
+    ap.add_argument("--quantum", type=int, default=DEFAULT_QUANTUM, metavar="N",
+                    help=f"steps (loop iterations and calls) a program runs per turn "
+                         f"(default: {DEFAULT_QUANTUM})")
+    ap.add_argument("--max-steps", type=int, metavar="N",
+                    help="stop a program after N steps (default: no limit)")
+    ap.add_argument("--time-limit", type=float, metavar="SECONDS",
+                    help="stop a program after it has run this long (default: no limit)")
+    ap.add_argument("--no-cache", dest="use_cache", action="store_false",
+                    help="always re-parse, don't read or write the program cache")
+    args = ap.parse_args(argv)
+    if args.quantum < 1:
+        ap.error("--quantum must be at least 1")
+    files = expand(args.programs)
+    if not files:
+        print("[Damavand Error] No programs to run", file=sys.stderr)
+        return 1
+    start = perf_counter()
+    scheduler = Scheduler(args.quantum, args.max_steps, args.time_limit)
+    tasks = []
+    for path in files:
+        try:
+            tasks.append(scheduler.add(load_program(path, args.use_cache), path, path=path))
+        except OSError as e:
+            tasks.append(f"[Damavand Error] Cannot read {path}: {e.strerror}")
+        except Exception as e:
+            tasks.append(error_text(e))
+    for _ in scheduler.run():
+        pass
+    elapsed = perf_counter() - start
+    failed = 0
+    for path, task in zip(files, tasks):
+        error = task if isinstance(task, str) else task.error
+        if len(files) > 1:
+            print(f"==> {path} <==")
+        if not isinstance(task, str):
+            sys.stdout.write(task.out.getvalue())
+        if error is not None:
+            failed += 1
+            sys.stdout.flush()
+            print(error, file=sys.stderr)
+            sys.stderr.flush()
+    sys.stdout.flush()
+    print(f"\n[Damavand scheduler] {len(files)} programs in {elapsed:.2f} s "
+          f"({len(files) / elapsed:.1f} programs/s), {failed} failed", file=sys.stderr)
+    for path, task in zip(files, tasks):
+        if isinstance(task, str):
+            print(f"  {'-':>10} ms  {'-':>10} steps  FAILED  {path}", file=sys.stderr)
+        else:
+            status = "FAILED" if task.error is not None else "ok"
+            print(f"  {task.seconds * 1000:10.2f} ms  {task.steps:>10} steps  {status:<6}  "
+                  f"{path}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import asyncio
+import argparse
+import multiprocessing
+from collections import OrderedDict
+
+from .lexer import Lexer
+from .parser import Parser
+from .interpreter import Interpreter
+from .compiler import compile_program
+from .vm import VM
+from .pycodegen import compile_python, PyCodeRunner
+from .optimizer import optimize
+from .modules import link
+from .dam_ast import Import
+from .cache import cache_key
+from .output import LineSink
+from .main import error_text
+from .client import DEFAULT_SOCKET
+
+# Interpreter daemon: an asyncio service on a Unix-domain socket that runs
+# programs on a pool of warm worker processes (the protocol is described in
+# src/client.py). Workers have everything imported already and keep the
+# programs they have compiled, keyed by a hash of the source, so a request
+# for a program seen before costs only its execution.
+#
+# Each request gets a worker to itself; when all of them are busy requests
+# wait, up to `max_pending` of them, and past that are turned away. A
+# program that runs past its timeout, or whose client goes away, has its
+# worker killed and replaced.
+
+DEFAULT_TIMEOUT = 30.0
+# compiled programs kept per worker
+PROGRAM_CACHE_SIZE = 256
+ENGINES = ("tree", "vm", "pycode")
+# longest request line (the source is in it) accepted
+MAX_REQUEST = 64 << 20
+
+
+# --------------- worker side ---------------
+class _PipeStream:
+    # what _work's LineSink writes to: batches of lines go to the server as
+    # they fill up
+    def __init__(self, conn):
+        self.conn = conn
+
+    def write(self, text):
+        self.conn.send(("out", text))
+
+    def flush(self):
+        pass
+
+
+def _compile(source, engine, optimize_ast, path):
+    # -> the program, and whether it can be kept: the vm and pycode engines
+    # get the modules it imports linked in, which may change before its next run
+    ast = Parser(Lexer(source).tokenize()).parse()
+    if optimize_ast:
+        ast, _ = optimize(ast)
+    keep = engine == "tree" or not any(isinstance(s, Import) for s in ast.statements)
+    if engine == "vm":
+        return compile_program(link(ast, path)), keep
+    if engine == "pycode":
+        return compile_python(link(ast, path)), keep
+    # resolving and quickening leave the AST shareable between Interpreters
+    return ast, keep
+
+
+def _execute(job, programs, out):
+    source = job.get("source")
+    path = job.get("path")
+    if source is None:
+        with open(path, "r", encoding="utf-8") as f:
+            source = f.read()
+    engine = job["engine"]
+    key = (cache_key(source), engine, job["optimize"])
+    program = programs.get(key)
+    if program is None:
+        program, keep = _compile(source, engine, job["optimize"], path)
+        if keep:
+            programs[key] = program
+            if len(programs) > PROGRAM_CACHE_SIZE:
+                programs.popitem(last=False)
+    else:
+        programs.move_to_end(key)
+    if engine == "vm":
+        VM(out).run(program)
+    elif engine == "pycode":
+        PyCodeRunner(out).run(program)
+    else:
+        Interpreter(out=out).run(program, path)
+
+
+def _work(conn):
+    # a worker process: runs jobs from `conn` until it is closed
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    programs = OrderedDict()
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        start = time.perf_counter()
+        out = LineSink(_PipeStream(conn), lines=64, seconds=0.05)
+        status = 0
+        try:
+            _execute(job, programs, out)
+        except OSError as e:
+            out.close()
+            conn.send(("error", f"[Damavand Error] Cannot read {job['path']}: {e.strerror}"))
+            status = 1
+        except Exception as e:
+            out.close()
+            conn.send(("error", error_text(e)))
+            status = 1
+        else:
+            out.close()
+        conn.send(("done", status, time.perf_counter() - start))
+
+
+# --------------- server side ---------------
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_work, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    async def recv(self):
+        # the next message, without blocking the event loop while waiting
+        conn = self.conn
+        if not conn.poll():
+            loop = asyncio.get_running_loop()
+            ready = loop.create_future()
+            fd = conn.fileno()
+            loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+            try:
+                await ready
+            finally:
+                loop.remove_reader(fd)
+        return conn.recv()
+
+
+class Server:
+    def __init__(self, path=DEFAULT_SOCKET, workers=None, timeout=DEFAULT_TIMEOUT,
+                 max_timeout=None, max_pending=None):
+        self.path = path
+        self.nworkers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        # what a request may ask for at most
+        self.max_timeout = max_timeout or timeout
+        self.max_pending = max_pending if max_pending is not None else 64 * self.nworkers
+        self.pending = 0
+        self.served = 0
+        # workers start from a process that has the interpreter imported
+        # but none of the server's sockets or event loop
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self.ctx = multiprocessing.get_context("forkserver")
+            self.ctx.set_forkserver_preload([__name__])
+        else:
+            self.ctx = multiprocessing.get_context()
+        self.idle = None
+
+    async def serve(self, ready=None):
+        # runs until SIGINT/SIGTERM; `ready` is set once the socket accepts
+        self._claim_socket()
+        self.idle = asyncio.Queue()
+        for _ in range(self.nworkers):
+            self.idle.put_nowait(_Worker(self.ctx))
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        server = await asyncio.start_unix_server(self.handle, self.path, limit=MAX_REQUEST)
+        try:
+            if ready is not None:
+                ready.set()
+            await stop.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            while not self.idle.empty():
+                self.idle.get_nowait().kill()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def _claim_socket(self):
+        # a socket file nobody answers on is left over from a crash
+        if not os.path.exists(self.path):
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            try:
+                s.connect(self.path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.path)
+                return
+        raise RuntimeError(f"A server is already running on {self.path}")
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                line = None
+            job, problem = self._job(line) if line is not None else (None, "Request too large")
+            if problem is not None:
+                await self._reply(writer, {"error": f"[Damavand Error] {problem}"},
+                                  {"done": True, "status": 1, "seconds": 0.0})
+            elif self.pending >= self.max_pending:
+                await self._reply(writer, {"error": "[Damavand Error] Server busy, try again"},
+                                  {"done": True, "status": 1, "seconds": 0.0})
+            else:
+                await self._run(job, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _job(self, line):
+        # (job, None) or (None, what's wrong with the request)
+        try:
+            req = json.loads(line)
+        except ValueError:
+            return None, "Request is not JSON"
+        if not isinstance(req, dict) or ("source" in req) == ("path" in req):
+            return None, "Request needs either \"source\" or \"path\""
+        source, path = req.get("source"), req.get("path")
+        if not isinstance(source if path is None else path, str):
+            return None, "\"source\" and \"path\" must be strings"
+        engine = req.get("engine", "tree")
+        if engine not in ENGINES:
+            return None, f"Unknown engine {engine!r}"
+        timeout = req.get("timeout", self.timeout)
+        if not isinstance(timeout, (int, float)) or timeout <= 0:
+            return None, "\"timeout\" must be a positive number"
+        job = {"engine": engine, "optimize": bool(req.get("optimize", False))}
+        if path is None:
+            job["source"] = source
+        else:
+            job["path"] = path
+        return (job, min(timeout, self.max_timeout)), None
+
+    async def _reply(self, writer, *replies):
+        writer.write(b"".join(json.dumps(r).encode() + b"\n" for r in replies))
+        await writer.drain()
+
+    async def _run(self, job, writer):
+        job, timeout = job
+        self.pending += 1
+        try:
+            worker = await self.idle.get()
+        finally:
+            self.pending -= 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        healthy = False
+        try:
+            worker.conn.send(job)
+            while True:
+                msg = await asyncio.wait_for(worker.recv(), max(deadline - loop.time(), 0))
+                if msg[0] == "out":
+                    await self._reply(writer, {"out": msg[1]})
+                elif msg[0] == "error":
+                    await self._reply(writer, {"error": msg[1]})
+                else:
+                    healthy = True
+                    self.served += 1
+                    await self._reply(writer, {"done": True, "status": msg[1], "seconds": msg[2]})
+                    return
+        except asyncio.TimeoutError:
+            await self._reply(writer, {"error": f"[Damavand Error] Timed out after {timeout:g} s"},
+                              {"done": True, "status": 1, "seconds": timeout})
+        except ConnectionError:
+            # the client went away; nobody wants the rest of the output
+            pass
+        except (EOFError, OSError):
+            await self._reply(writer, {"error": "[Damavand Error] The worker died"},
+                              {"done": True, "status": 1, "seconds": 0.0})
+        finally:
+            if not healthy:
+                worker.kill()
+                worker = _Worker(self.ctx)
+            self.idle.put_nowait(worker)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m src.server")
+    ap.add_argument("--socket", default=DEFAULT_SOCKET, metavar="PATH",
+                    help=f"where to listen (default: {DEFAULT_SOCKET})")
+    ap.add_argument("--workers", type=int, default=0, metavar="N",
+                    help="worker processes, i.e. programs run at once (default or 0: one per CPU)")
+    ap.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, metavar="SECONDS",
+                    help=f"default time limit per program (default: {DEFAULT_TIMEOUT:g})")
+    ap.add_argument("--max-timeout", type=float, metavar="SECONDS",
+                    help="the longest time limit a request may ask for (default: --timeout)")
+    ap.add_argument("--max-pending", type=int, metavar="N",
+                    help="requests allowed to wait for a worker before new ones are "
+                         "turned away (default: 64 per worker)")
+    args = ap.parse_args(argv)
+    if args.workers < 0 or args.timeout <= 0:
+        ap.error("--workers must be 0 or more and --timeout positive")
+    server = Server(args.socket, args.workers, args.timeout, args.max_timeout, args.max_pending)
+    try:
+        asyncio.run(server.serve())
+    except RuntimeError as e:
+        print(f"[Damavand Error] {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
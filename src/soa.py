@@ -0,0 +1,209 @@
+from array import array
+from .dam_ast import *
+from .lexer import Token
+
+# Struct-of-arrays storage for the token stream and the AST. Instead of one
+# Python object per token or node, every field lives in a typed array and
+# strings/numbers are kept once in an interned value table. Both containers
+# hand out ordinary Token / node objects on demand, one at a time, so the
+# Parser and Interpreter consume them unchanged.
+
+
+class ValueTable:
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def intern(self, value):
+        # keep 1, 1.0 and True apart: they are equal as dict keys
+        key = (type(value), value)
+        i = self._index.get(key)
+        if i is None:
+            i = self._index[key] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+# ---------------- tokens ----------------
+class TokenArrays:
+    def __init__(self, tokens=()):
+        self.kinds = array("B")
+        self.lines = array("I")
+        self.cols = array("I")
+        self.vals = array("I")
+        self.table = ValueTable()
+        self.extend(tokens)
+
+    def extend(self, tokens):
+        intern = self.table.intern
+        for t in tokens:
+            self.kinds.append(t.type)
+            self.lines.append(t.line)
+            self.cols.append(t.col)
+            self.vals.append(intern(t.value))
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, i):
+        return Token(self.kinds[i], self.table.values[self.vals[i]],
+                     self.lines[i], self.cols[i])
+
+    def __iter__(self):
+        values = self.table.values
+        for kind, val, line, col in zip(self.kinds, self.vals, self.lines, self.cols):
+            yield Token(kind, values[val], line, col)
+
+
+# ---------------- AST ----------------
+# Node kinds and what their three int fields hold. "list" fields point into
+# AstArrays.lists, where a list is stored as its length followed by items.
+(
+    K_FUNCDEF,   # name, params (list of values, then a list of pragmas right
+                 # after it), body (list of nodes)
+    K_CALL,      # name, args (list of nodes)
+    K_IF,        # cond, then (list), else (list)
+    K_WHILE,     # cond, body (list)
+    K_PRINT,     # expr
+    K_ASSIGN,    # name, expr
+    K_VAR,       # name
+    K_LITERAL,   # value
+    K_BINARY,    # left, op, right
+    K_UNARY,     # op, expr
+    K_HOISTED,   # expr, name
+    K_RETURN,    # expr, or -1 for a bare return
+    K_INDEX,     # target, index
+    K_ARRAY,     # items (list of nodes)
+    K_IMPORT,    # path
+) = range(15)
+
+
+class AstArrays:
+    def __init__(self, statements=()):
+        self.kinds = array("B")
+        self.f0 = array("i")
+        self.f1 = array("i")
+        self.f2 = array("i")
+        self.lines = array("I")     # source line of statements, 0 otherwise
+        self.lists = array("i")
+        self.roots = array("i")
+        self.table = ValueTable()
+        self.extend(statements)
+
+    def extend(self, statements):
+        # statements can be a generator such as Parser.statements(), so only
+        # one top-level statement exists as objects at a time
+        for s in statements:
+            self.roots.append(self.encode(s))
+
+    def __len__(self):
+        return len(self.roots)
+
+    def statements(self):
+        for root in self.roots:
+            yield self.decode(root)
+
+    def to_program(self):
+        return Program(list(self.statements()))
+
+    # --------------- encoding ---------------
+    def _node(self, kind, a=0, b=0, c=0, line=0):
+        self.kinds.append(kind)
+        self.f0.append(a)
+        self.f1.append(b)
+        self.f2.append(c)
+        self.lines.append(line)
+        return len(self.kinds) - 1
+
+    def _list(self, items):
+        at = len(self.lists)
+        self.lists.append(len(items))
+        self.lists.extend(items)
+        return at
+
+    def encode(self, node):
+        v = self.table.intern
+        if isinstance(node, FuncDef):
+            params = self._list([v(p) for p in node.params])
+            self._list([v(p) for p in node.pragmas])
+            return self._node(K_FUNCDEF, v(node.name), params,
+                              self._list([self.encode(s) for s in node.body]), node.line)
+        if isinstance(node, Call):
+            return self._node(K_CALL, v(node.name),
+                              self._list([self.encode(a) for a in node.args]), 0, node.line)
+        if isinstance(node, If):
+            return self._node(K_IF, self.encode(node.cond),
+                              self._list([self.encode(s) for s in node.then_branch]),
+                              self._list([self.encode(s) for s in node.else_branch]), node.line)
+        if isinstance(node, While):
+            return self._node(K_WHILE, self.encode(node.cond),
+                              self._list([self.encode(s) for s in node.body]), 0, node.line)
+        if isinstance(node, Print):
+            return self._node(K_PRINT, self.encode(node.expr), 0, 0, node.line)
+        if isinstance(node, Assign):
+            return self._node(K_ASSIGN, v(node.name), self.encode(node.expr), 0, node.line)
+        if isinstance(node, Var):
+            return self._node(K_VAR, v(node.name))
+        if isinstance(node, Literal):
+            return self._node(K_LITERAL, v(node.value))
+        if isinstance(node, BinaryOp):
+            return self._node(K_BINARY, self.encode(node.left), v(node.op),
+                              self.encode(node.right))
+        if isinstance(node, UnaryOp):
+            return self._node(K_UNARY, v(node.op), self.encode(node.expr))
+        if isinstance(node, Hoisted):
+            return self._node(K_HOISTED, self.encode(node.expr), v(node.name))
+        if isinstance(node, Return):
+            expr = -1 if node.expr is None else self.encode(node.expr)
+            return self._node(K_RETURN, expr, 0, 0, node.line)
+        if isinstance(node, Index):
+            return self._node(K_INDEX, self.encode(node.target), self.encode(node.index))
+        if isinstance(node, ArrayLiteral):
+            return self._node(K_ARRAY, self._list([self.encode(i) for i in node.items]))
+        if isinstance(node, Import):
+            return self._node(K_IMPORT, v(node.path), 0, 0, node.line)
+        raise TypeError(f"Cannot encode {type(node)}")
+
+    # --------------- decoding ---------------
+    def _items(self, at):
+        n = self.lists[at]
+        return self.lists[at + 1:at + 1 + n]
+
+    def decode(self, i):
+        kind, a, b, c = self.kinds[i], self.f0[i], self.f1[i], self.f2[i]
+        line = self.lines[i]
+        values = self.table.values
+        nodes = lambda at: [self.decode(j) for j in self._items(at)]
+        if kind == K_FUNCDEF:
+            pragmas = [values[p] for p in self._items(b + 1 + self.lists[b])]
+            return FuncDef(values[a], [values[p] for p in self._items(b)], nodes(c), line,
+                           pragmas)
+        if kind == K_CALL:
+            return Call(values[a], nodes(b), line)
+        if kind == K_IF:
+            return If(self.decode(a), nodes(b), nodes(c), line)
+        if kind == K_WHILE:
+            return While(self.decode(a), nodes(b), line)
+        if kind == K_PRINT:
+            return Print(self.decode(a), line)
+        if kind == K_ASSIGN:
+            return Assign(values[a], self.decode(b), line)
+        if kind == K_VAR:
+            return Var(values[a])
+        if kind == K_LITERAL:
+            return Literal(values[a])
+        if kind == K_BINARY:
+            return BinaryOp(self.decode(a), values[b], self.decode(c))
+        if kind == K_UNARY:
+            return UnaryOp(values[a], self.decode(b))
+        if kind == K_HOISTED:
+            return Hoisted(self.decode(a), values[b])
+        if kind == K_RETURN:
+            return Return(None if a < 0 else self.decode(a), line)
+        if kind == K_INDEX:
+            return Index(self.decode(a), self.decode(b))
+        if kind == K_ARRAY:
+            return ArrayLiteral(nodes(a))
+        if kind == K_IMPORT:
+            return Import(values[a], line)
+        raise TypeError(f"Bad node kind {kind}")
@@ -0,0 +1,152 @@
+from .compiler import *
+from .interpreter import RuntimeErrorEx
+from .operators import BINARY
+from .arrays import make_array, index
+from .natives import BUILTINS
+from .output import StreamSink
+
+# indexed by opcode, ADD..GE
+BINARY_FUNCS = [None] * (GE + 1)
+for _sym, _op in BINARY_OPS.items():
+    BINARY_FUNCS[_op] = BINARY[_sym]
+
+
+class VM:
+    def __init__(self, out=None):
+        self.globals = {}
+        self.functions = {}
+        # the output sink PRINT writes to (src/output.py)
+        self.out = out or StreamSink()
+        # one (code, consts, names, stack, pc, saved globals) per call in
+        # progress; calls never recurse into _exec
+        self.frames = []
+
+    def run(self, code: CodeObject):
+        frames = self.frames
+        base = len(frames)
+        try:
+            self._exec(code)
+        except BaseException:
+            # same scoping as Interpreter: params overlay a snapshot of the
+            # globals, and everything written during a call is rolled back,
+            # also when it is cut short by an error
+            if len(frames) > base:
+                saved = frames[base][5]
+                del frames[base:]
+                self.globals.clear()
+                self.globals.update(saved)
+            raise
+
+    def _exec(self, co):
+        code = co.code
+        consts = co.consts
+        names = co.names
+        g = self.globals
+        frames = self.frames
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        binops = BINARY_FUNCS
+        write = self.out.write
+        pc = 0
+        # Branches are ordered roughly by how often loop bodies hit them.
+        while True:
+            op = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+            if op == LOAD_NAME:
+                push(g.get(names[arg]))
+            elif op == LOAD_CONST:
+                push(consts[arg])
+            elif op == STORE_NAME:
+                g[names[arg]] = pop()
+            elif op == BINARY_NAME_CONST:
+                op, name, value = consts[arg]
+                push(binops[op](g.get(name), value))
+            elif op == BINARY_NAME_NAME:
+                op, left, right = consts[arg]
+                push(binops[op](g.get(left), g.get(right)))
+            elif op == JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op <= GE:
+                r = pop()
+                stack[-1] = binops[op](stack[-1], r)
+            elif op == PRINT:
+                write(pop())
+            elif op == NEG:
+                stack[-1] = -stack[-1]
+            elif op == NOT:
+                stack[-1] = not stack[-1]
+            elif op == POP:
+                pop()
+            elif op == CHECK_CALL:
+                name, argc = consts[arg]
+                fn = self.functions.get(name)
+                if fn is None:
+                    native = BUILTINS.get(name)
+                    if native is None:
+                        raise RuntimeErrorEx(f"Undefined function {name}")
+                    fn = native.fn
+                    params = native.arity
+                else:
+                    params = len(fn.params)
+                if argc != params:
+                    raise RuntimeErrorEx(f"Arg count mismatch for {name}")
+                push(fn)
+            elif op == CALL:
+                if arg:
+                    args = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    args = ()
+                fn = pop()
+                if fn.__class__ is not Function:
+                    # a builtin runs right here
+                    push(fn(*args))
+                    continue
+                frames.append((code, consts, names, stack, pc, dict(g)))
+                g.update(zip(fn.params, args))
+                co = fn.code
+                code = co.code
+                consts = co.consts
+                names = co.names
+                stack = []
+                push = stack.append
+                pop = stack.pop
+                pc = 0
+            elif op == RETURN_VALUE:
+                value = pop()
+                code, consts, names, stack, pc, saved = frames.pop()
+                g.clear()
+                g.update(saved)
+                push = stack.append
+                pop = stack.pop
+                push(value)
+            elif op == DEF_FUNC:
+                fn = consts[arg]
+                self.functions[fn.name] = fn
+            elif op == JUMP_IF_NOT_NONE:
+                # keeps the value when jumping, drops the None otherwise
+                if stack[-1] is not None:
+                    pc = arg
+                else:
+                    pop()
+            elif op == INDEX:
+                i = pop()
+                stack[-1] = index(stack[-1], i)
+            elif op == BUILD_ARRAY:
+                if arg:
+                    items = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    items = []
+                push(make_array(items))
+            elif op == DUP:
+                push(stack[-1])
+            elif op == HALT:
+                return
+            else:
+                raise RuntimeErrorEx(f"Bad opcode {op}")